@@ -0,0 +1,101 @@
+"""Load balancer simulation: synthetic fleets, greedy vs random vs power-of-two-choices"""
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ServerLoadBalancer
+
+
+def make_fleet(rng, servers):
+    fleet = []
+    for i in range(servers):
+        fleet.append({
+            'hash': f"node{i}",
+            'latency': rng.lognormvariate(math.log(80), 0.6),    # idle RTT, ms
+            'loss': rng.choice((0.0, 0.0, 0.0, 0.01, 0.03, 0.2)),
+            'capacity': rng.choice((50, 100, 200, 400)),          # users before saturation
+            'bandwidth': rng.choice((100e6, 500e6, 1e9)),
+        })
+    return fleet
+
+
+def simulate(strategy, fleet, users, rounds, seed):
+    rng = random.Random(seed)
+    balancer = ServerLoadBalancer(rng=random.Random(seed))
+    for server in fleet:                       # one initial probe each
+        balancer.observe_latency(server['hash'], server['latency'])
+
+    experienced, overloaded, peaks = [], 0, []
+    for round_ in range(rounds):
+        if strategy == 'greedy':
+            best = balancer.rank(fleet)[0]
+            picks = [best] * users
+        elif strategy == 'random':
+            picks = [rng.choice(fleet) for _ in range(users)]
+        else:
+            picks = [balancer.choose(fleet) for _ in range(users)]
+
+        load = {}
+        for server in picks:
+            load[server['hash']] = load.get(server['hash'], 0) + 1
+
+        for server in fleet:
+            users_on = load.get(server['hash'], 0)
+            utilization = users_on / server['capacity']
+            latency = server['latency'] / max(0.05, 1 - min(utilization, 0.95))
+            loss = min(1.0, server['loss'] + max(0.0, utilization - 1) / max(utilization, 1))
+            # Fleet-wide measurements: one probe and the sessions of this round
+            if rng.random() < loss:
+                balancer.observe_loss(server['hash'])
+            else:
+                balancer.observe_latency(server['hash'], latency)
+            if users_on:
+                balancer.observe_throughput(server['hash'], server['bandwidth'] / users_on)
+                failed = sum(rng.random() < loss for _ in range(min(users_on, 20)))
+                balancer.observe_session(server['hash'], failed < 10)
+            if round_ >= rounds // 3:
+                experienced.extend([latency] * users_on)
+                if utilization > 1:
+                    overloaded += users_on
+                peaks.append(utilization)
+
+    measured = users * (rounds - rounds // 3)
+    experienced.sort()
+    return {
+        'mean': statistics.fmean(experienced),
+        'p95': experienced[int(len(experienced) * 0.95)],
+        'overloaded': overloaded / measured,
+        'peak': max(peaks),
+    }
+
+
+def main(servers=50, users=3000, rounds=30):
+    rng = random.Random(7)
+    fleet = make_fleet(rng, servers)
+    capacity = sum(s['capacity'] for s in fleet)
+    print(f"fleet:  {servers} servers, capacity {capacity} users, {users} users, {rounds} rounds")
+    for strategy in ('greedy', 'random', 'p2c'):
+        started = time.perf_counter()
+        result = simulate(strategy, fleet, users, rounds, seed=11)
+        print(f"{strategy:7} latency mean {result['mean']:7.1f} ms, p95 {result['p95']:7.1f} ms, "
+              f"users on overloaded servers {result['overloaded'] * 100:5.1f}%, "
+              f"peak utilization {result['peak']:5.1f}x  ({time.perf_counter() - started:.1f} s)")
+
+    balancer = ServerLoadBalancer(rng=random.Random(1))
+    candidates = [{'hash': f"n{i}"} for i in range(1000)]
+    for c in candidates:
+        balancer.observe_latency(c['hash'], rng.uniform(20, 400))
+    started = time.perf_counter()
+    picks = 2000
+    for _ in range(picks):
+        balancer.choose(candidates)
+    print(f"choose: {(time.perf_counter() - started) / picks * 1e6:.0f} us per pick among {len(candidates)} servers")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Control API under load: many concurrent clients issuing requests, then event fan-out"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+
+from main import ControlServer
+
+
+async def client(path, requests, latencies):
+    reader, writer = await asyncio.open_unix_connection(path)
+    for i in range(requests):
+        started = time.perf_counter()
+        writer.write(json.dumps({'jsonrpc': '2.0', 'id': i, 'method': 'status'}).encode() + b'\n')
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - started)
+        assert reply['id'] == i and reply['result']['connected'] is False
+    writer.close()
+
+
+async def subscriber(path, expected, arrivals, ready):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(b'{"jsonrpc": "2.0", "id": 1, "method": "subscribe", "params": {"events": ["stats"]}}\n')
+    await reader.readline()
+    ready.release()
+    for _ in range(expected):
+        event = json.loads(await reader.readline())['params']
+        arrivals.append(time.time() - event['time'])
+    writer.close()
+
+
+async def load(path, clients, requests):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(client(path, requests, latencies) for _ in range(clients)))
+    return time.perf_counter() - started, latencies
+
+
+async def fan_out(server, path, subscribers, events):
+    arrivals, ready = [], asyncio.Semaphore(0)
+    tasks = [asyncio.ensure_future(subscriber(path, events, arrivals, ready)) for _ in range(subscribers)]
+    for _ in range(subscribers):
+        await ready.acquire()
+    started = time.perf_counter()
+    for i in range(events):
+        # Published from another thread, like the stats sampler
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: server.publish('stats', rx_bps=i * 1e3, tx_bps=i * 1e2, latency_ms=None))
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, arrivals
+
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))]
+
+
+def main(clients=200, requests=50, subscribers=500, events=40):
+    path = os.path.join(tempfile.mkdtemp(), 'control.sock')
+    server = ControlServer(path)
+    server.register('status', lambda: {'connected': False, 'config': None}, blocking=False)
+    server.start()
+    process = psutil.Process()
+    cpu = process.cpu_times()
+
+    elapsed, latencies = asyncio.run(load(path, clients, requests))
+    total = clients * requests
+    print(f"requests: {clients} clients x {requests} = {total:,} in {elapsed:.2f} s "
+          f"({total / elapsed:,.0f} req/s), p50 {statistics.median(latencies) * 1e3:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1e3:.2f} ms")
+
+    elapsed, arrivals = asyncio.run(fan_out(server, path, subscribers, events))
+    delivered = len(arrivals)
+    print(f"events:   {events} events to {subscribers} subscribers = {delivered:,} deliveries in {elapsed:.2f} s, "
+          f"delay p50 {statistics.median(arrivals) * 1e3:.1f} ms, p99 {percentile(arrivals, 0.99) * 1e3:.1f} ms, "
+          f"dropped {server.stats['dropped']}")
+
+    used = process.cpu_times()
+    print(f"cpu:      {used.user + used.system - cpu.user - cpu.system:.2f} s for server and clients together")
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
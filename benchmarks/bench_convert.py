@@ -0,0 +1,64 @@
+"""Config converter: bulk conversion of a 10k-node subscription and cached re-render"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ConfigConverter, parse_config_link
+
+
+def make_configs(count):
+    links = []
+    for i in range(count):
+        if i % 3 == 0:
+            links.append(f"vless://{uuid.UUID(int=i)}@n{i}.example.net:443?type=ws&security=tls"
+                         f"&sni=n{i}.example.net&path=%2Fws#Node%20{i}")
+        elif i % 3 == 1:
+            links.append(f"trojan://secret{i}@n{i}.example.net:443?type=grpc&security=tls"
+                         f"&serviceName=svc#Node%20{i}")
+        else:
+            links.append(f"vless://{uuid.UUID(int=i)}@n{i}.example.net:443?type=tcp&security=reality"
+                         f"&sni=www.example.com&fp=chrome&pbk=KEY{i}&sid=ab&flow=xtls-rprx-vision#Node%20{i}")
+    return [parse_config_link(link) for link in links]
+
+
+def main(count=10_000):
+    configs = make_configs(count)
+    cache_dir = tempfile.mkdtemp()
+
+    serial = ConfigConverter(cache_dir=cache_dir, max_workers=1)
+    for fmt in ('xray', 'sing-box', 'link'):
+        start = time.perf_counter()
+        results = serial.convert_many(configs, fmt)
+        elapsed = time.perf_counter() - start
+        assert all(results)
+        print(f"{fmt:9s} serial:   {elapsed:6.2f} s  ({count / elapsed:,.0f} nodes/s)")
+
+    parallel = ConfigConverter(cache_dir=cache_dir)
+    start = time.perf_counter()
+    parallel.convert_many(configs, 'xray')
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    parallel.convert_many(configs, 'xray')
+    warm = time.perf_counter() - start
+    print(f"xray      parallel: {warm:6.2f} s  ({parallel.max_workers} workers; "
+          f"first call incl. pool start {first:.2f} s)")
+    parallel.close()
+
+    rules = [{'type': 'field', 'ip': ['10.0.0.0/8', '192.168.0.0/16'], 'outboundTag': 'direct'}]
+    start = time.perf_counter()
+    serial.render_file(configs[0], 'xray', socks_port=10808, routing_rules=rules)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    serial.render_file(configs[0], 'xray', socks_port=10808, routing_rules=rules)
+    cached = time.perf_counter() - start
+    print(f"render_file: first {cold * 1e6:.0f} us, reconnect (cached) {cached * 1e6:.0f} us")
+    shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
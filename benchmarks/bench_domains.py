@@ -0,0 +1,63 @@
+"""Domain matcher: build/load time and lookup rate on a geosite-sized list"""
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import DomainMatcher
+
+TLDS = ['ru', 'com', 'net', 'org', 'su', 'рф', 'io', 'de']
+
+
+def random_label(rng, low=3, high=12):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def main(count=300_000, lookups=300_000):
+    rng = random.Random(3)
+    domains = [f"{random_label(rng)}.{rng.choice(TLDS)}" for _ in range(count)]
+    rules = {
+        'direct': [f"domain:{d}" for d in domains[:count // 2]] + [f"full:{d}" for d in domains[count // 2:]],
+        'block': ['keyword:ads-tracker', 'regexp:^telemetry[0-9]+\\.'],
+    }
+    cache_dir = tempfile.mkdtemp()
+
+    start = time.perf_counter()
+    matcher = DomainMatcher.compile(rules, cache_dir=cache_dir)
+    build_time = time.perf_counter() - start
+    matcher.close()
+
+    start = time.perf_counter()
+    matcher = DomainMatcher.compile(rules, cache_dir=cache_dir)
+    load_time = time.perf_counter() - start
+    size = os.path.getsize(matcher.path)
+
+    suffix_rules, full_rules = domains[:count // 2], domains[count // 2:]
+    queries = []
+    for _ in range(lookups):
+        roll = rng.random()
+        if roll < 0.3:
+            queries.append(f"cdn.{rng.choice(suffix_rules)}")
+        elif roll < 0.4:
+            queries.append(rng.choice(full_rules))
+        else:
+            queries.append(f"{random_label(rng)}.{random_label(rng)}.{rng.choice(TLDS)}")
+
+    start = time.perf_counter()
+    hits = sum(1 for q in queries if matcher.match(q))
+    lookup_time = time.perf_counter() - start
+
+    print(f"rules:        {count} domains, file {size / 1e6:.1f} MB")
+    print(f"build:        {build_time:.2f} s   cached load: {load_time * 1000:.1f} ms")
+    print(f"lookups:      {lookups / lookup_time:,.0f}/s ({hits} hits)")
+    matcher.close()
+    shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Resource governor driven by injected metrics: scenarios, CPU-cap control loop, rate cap, live budgets"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ConfigValidator, ResourceGovernor
+
+
+class FakeMetrics:
+    """Scripted readings; fields not given keep their last value"""
+
+    def __init__(self, **reading):
+        self.reading = {'cpu_percent': 10.0, 'process_percent': 1.0, 'battery_percent': None,
+                        'on_battery': False, 'metered': False}
+        self.reading.update(reading)
+
+    def set(self, **reading):
+        self.reading.update(reading)
+
+    def sample(self):
+        return dict(self.reading)
+
+
+class CountingValidator(ConfigValidator):
+    """Checks that only sleep, recording the peak number in flight"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.running = self.peak = 0
+        self.counter = threading.Lock()
+
+    def check(self, config):
+        with self.counter:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.01)
+        with self.counter:
+            self.running -= 1
+        return {'hash': config['hash'], 'ok': True, 'checked': time.time()}
+
+
+def scenarios():
+    metrics = FakeMetrics()
+    governor = ResourceGovernor(metrics, cpu_cap=15.0, metered_cap_bps=256e3)
+    steps = [
+        ("idle, plugged in", {}),
+        ("machine busy (92% CPU)", {'cpu_percent': 92.0}),
+        ("load gone", {'cpu_percent': 20.0}),
+        ("on battery, 60%", {'on_battery': True, 'battery_percent': 60}),
+        ("battery 15%", {'battery_percent': 15}),
+        ("plugged in, metered link", {'on_battery': False, 'metered': True}),
+        ("unmetered again", {'metered': False}),
+    ]
+    print(f"{'scenario':26s} {'level':8s} {'factor':>6s} {'workers':>7s} {'sample s':>8s} "
+          f"{'heavy':>5s} {'rate cap':>9s}  reasons")
+    for label, change in steps:
+        metrics.set(**change)
+        for _ in range(10):       # let additive increase settle
+            governor.update()
+        state = governor.snapshot()
+        rate = f"{state['rate_bps'] / 1e3:.0f} kbps" if state['rate_bps'] else '-'
+        print(f"{label:26s} {state['level']:8s} {state['factor']:6.2f} {governor.budget(64):7d} "
+              f"{governor.stretch(0.25, maximum=1.0):8.2f} {str(state['heavy_allowed']):>5s} {rate:>9s}  "
+              f"{', '.join(state['reasons']) or '-'}")
+
+
+def control_loop(cap=15.0, per_worker=0.5, base=1.0, rounds=30):
+    """Own CPU modelled as base + per_worker x workers; the factor should settle where that meets cap"""
+    metrics = FakeMetrics()
+    governor = ResourceGovernor(metrics, cpu_cap=cap)
+    trace = []
+    for _ in range(rounds):
+        workers = governor.budget(64)
+        metrics.set(process_percent=base + per_worker * workers)
+        governor.update()
+        trace.append(workers)
+    tail = trace[-10:]
+    settled = base + per_worker * sum(tail) / len(tail)
+    print(f"cpu cap:   workers {trace[:8]} ... {tail}; own CPU settles at {settled:.1f}% "
+          f"(cap {cap:.0f}%, unconstrained would be {base + per_worker * 64:.0f}%)")
+
+
+def rate_cap(cap_bps=1e6, total=256 * 1024, chunk=16 * 1024):
+    governor = ResourceGovernor(FakeMetrics(), net_cap_bps=cap_bps)
+    governor.update()
+    started = time.perf_counter()
+    for _ in range(total // chunk):
+        governor.spend(chunk)
+    elapsed = time.perf_counter() - started
+    print(f"rate cap:  {total // 1024} KiB in {elapsed:.2f} s = {total * 8 / elapsed / 1e3:.0f} kbps "
+          f"(cap {cap_bps / 1e3:.0f} kbps, 1 s of burst credit)")
+
+
+def deferral():
+    metrics = FakeMetrics(metered=True)
+    governor = ResourceGovernor(metrics, interval=0.05)
+    governor.update()
+    governor.start()
+    threading.Timer(0.3, metrics.set, kwargs={'metered': False}).start()
+    started = time.perf_counter()
+    allowed = governor.defer_heavy()
+    print(f"deferral:  heavy job waited {time.perf_counter() - started:.2f} s for the metered link to clear "
+          f"(allowed={allowed}, deferred={governor.snapshot()['deferred']})")
+    governor.stop()
+
+
+def live_budget(configs=2000):
+    metrics = FakeMetrics()
+    governor = ResourceGovernor(metrics)
+    validator = CountingValidator(max_workers=64, governor=governor)
+    items = [{'hash': str(i)} for i in range(configs)]
+    for label, change in (("unconstrained", {}), ("busy", {'cpu_percent': 95.0})):
+        metrics.set(**change)
+        for _ in range(10):
+            governor.update()
+        validator.peak = 0
+        started = time.perf_counter()
+        done = sum(1 for _ in validator.validate(items, use_cache=False))
+        print(f"validate:  {label:13s} {done} checks, peak {validator.peak:2d} in flight "
+              f"(budget {governor.budget(64)}), {time.perf_counter() - started:.2f} s")
+
+
+def main():
+    scenarios()
+    print()
+    control_loop()
+    rate_cap()
+    deferral()
+    live_budget()
+
+
+if __name__ == '__main__':
+    main()
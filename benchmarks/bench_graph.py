@@ -0,0 +1,42 @@
+"""Bandwidth graph: CPU cost of incremental updates at 4 Hz over a 10-minute window (needs a display)"""
+import os
+import random
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import BandwidthGraph
+
+
+def main(rate_hz=4, window=600, minutes=20):
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"skipped: no display ({e})")
+        return
+    graph = BandwidthGraph(root, window=window, width=window)
+    graph.pack()
+    root.update()
+
+    rng = random.Random(5)
+    steps = minutes * 60 * rate_hz
+    start = time.time()
+    cpu_started = time.process_time()
+    for i in range(steps):
+        graph.push(start + i / rate_hz, rx=rng.uniform(0, 8e7) * (1 + (i // 2000) % 3),
+                   tx=rng.uniform(0, 8e6))
+        root.update_idletasks()      # include Tk's own redraw of the damaged region
+    cpu = time.process_time() - cpu_started
+    items = len(graph.canvas.find_withtag("data"))
+
+    per_update = cpu / steps
+    print(f"updates:  {steps} ({minutes} min of samples at {rate_hz} Hz), {items} canvas items alive")
+    print(f"cost:     {per_update * 1e6:.0f} us CPU per update -> "
+          f"{per_update * rate_hz * 100:.3f}% of one core at {rate_hz} Hz")
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Shared HTTP client against a local TLS stand-in: fresh requests.get vs pooled keep-alive,
+TLS session resumption on new connections, and the retry budget against a failing endpoint"""
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import HTTPClient, RetryBudget
+
+PAYLOAD = b"vless://00000000-0000-0000-0000-000000000000@127.0.0.1:443#bench\n" * 64
+
+
+def make_certs(workdir):
+    """CA plus a localhost server certificate signed by it (openssl CLI)"""
+    def openssl(*args):
+        subprocess.run(['openssl', *args], cwd=workdir, check=True, capture_output=True)
+
+    openssl('req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=Bench CA',
+            '-keyout', 'ca.key', '-out', 'ca.pem')
+    openssl('req', '-newkey', 'rsa:2048', '-nodes', '-subj', '/CN=localhost',
+            '-keyout', 'server.key', '-out', 'server.csr')
+    with open(os.path.join(workdir, 'san.ext'), 'w') as f:
+        f.write("subjectAltName=DNS:localhost,IP:127.0.0.1\n")
+    openssl('x509', '-req', '-in', 'server.csr', '-CA', 'ca.pem', '-CAkey', 'ca.key', '-CAcreateserial',
+            '-days', '1', '-extfile', 'san.ext', '-out', 'server.pem')
+    return os.path.join(workdir, 'ca.pem'), os.path.join(workdir, 'server.pem'), os.path.join(workdir, 'server.key')
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.startswith('/down'):
+            self.server.failures += 1
+            body, status = b"unavailable", 503
+        else:
+            body, status = PAYLOAD, 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cert, key):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(cert, key)
+        self.connections = 0
+        self.failures = 0
+
+    def get_request(self):
+        sock, addr = super().get_request()
+        self.connections += 1
+        # Headers and body go out as separate writes; don't let Nagle hold the second for an ACK
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self.context.wrap_socket(sock, server_side=True), addr
+
+
+def timed(label, server, count, fetch):
+    before = server.connections
+    started = time.perf_counter()
+    for _ in range(count):
+        response = fetch()
+        assert response.status_code == 200 and len(response.content) == len(PAYLOAD)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed / count * 1000:7.2f} ms/request  "
+          f"{server.connections - before:4d} connections")
+    return elapsed / count
+
+
+def main(count=200):
+    workdir = tempfile.mkdtemp()
+    ca, cert, key = make_certs(workdir)
+    server = TLSServer(cert, key)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"https://localhost:{server.server_address[1]}/sub"
+
+    fresh = timed("requests.get per call", server, count, lambda: requests.get(url, verify=ca, timeout=5))
+
+    client = HTTPClient(cafile=ca)
+    pooled = timed("HTTPClient keep-alive", server, count, lambda: client.get(url))
+
+    # Every request on a new connection: only TLS resumption helps
+    def reconnect(client):
+        client.adapter.poolmanager.clear()
+        return client.get(url)
+
+    cold = HTTPClient(cafile=ca)
+    cold.context.sessions = type('NoCache', (dict,), {'__setitem__': lambda *args: None})()
+    full = timed("new connection, full handshake", server, count, lambda: reconnect(cold))
+    resumed = timed("new connection, resumed session", server, count, lambda: reconnect(client))
+
+    host = client.host_metrics()['localhost']
+    print(f"\nkeep-alive: {fresh / pooled:.1f}x faster than requests.get; "
+          f"resumption: {full / resumed:.2f}x faster handshake-bound requests")
+    print(f"metrics: {host['requests']} requests, {host['connections']} connections, "
+          f"{host['reused']} reused, TLS {host['tls_full']} full / {host['tls_resumed']} resumed, "
+          f"{host['latency_ms']} ms EWMA")
+
+    # 100 calls to an endpoint that always fails: 3 attempts each would be 200 retries
+    flaky = HTTPClient(cafile=ca, backoff=0.001, budget=RetryBudget(ratio=0.1, reserve=10))
+    before = server.failures
+    for _ in range(100):
+        flaky.get(url.replace('/sub', '/down'))
+    down = flaky.host_metrics()['localhost']
+    print(f"\nfailing endpoint: 100 calls -> {server.failures - before} server hits, "
+          f"{down['retries']} retries (budget reserve 10, unbudgeted would be 200)")
+
+    server.shutdown()
+    for c in (client, cold, flaky):
+        c.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
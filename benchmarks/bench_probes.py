@@ -0,0 +1,91 @@
+"""UDP probe engine against impaired local echo servers: accuracy and concurrency"""
+import heapq
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+
+from main import UDPEchoServer, UDPProbeEngine
+
+
+class ImpairedEcho(UDPEchoServer):
+    """Echo with random loss and a uniform 0..jitter extra delay (which also reorders)"""
+
+    def __init__(self, loss=0.0, delay_ms=5.0, jitter_ms=0.0, seed=0):
+        super().__init__()
+        self.loss = loss
+        self.delay = delay_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rng = random.Random(seed)
+        self.queue = []
+        self.ready = threading.Condition()
+        threading.Thread(target=self._sender, daemon=True).start()
+
+    def reply(self, data, addr):
+        if self.rng.random() < self.loss:
+            return
+        due = time.monotonic() + self.delay + self.rng.uniform(0, self.jitter)
+        with self.ready:
+            heapq.heappush(self.queue, (due, data, addr))
+            self.ready.notify()
+
+    def _sender(self):
+        while True:
+            with self.ready:
+                while not self.queue:
+                    self.ready.wait()
+                due, data, addr = self.queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.ready.wait(wait)
+                    continue
+                heapq.heappop(self.queue)
+            try:
+                self.sock.sendto(data, addr)
+            except OSError:
+                return
+
+
+def main(targets_per_server=25):
+    profiles = [(0.0, 0.0), (0.02, 2.0), (0.05, 10.0), (0.10, 30.0), (0.30, 60.0)]   # (loss, jitter ms)
+    servers = [ImpairedEcho(loss, 5.0, jitter, seed=i).start() for i, (loss, jitter) in enumerate(profiles)]
+    targets = [((i, n), '127.0.0.1', server.port)
+               for i, server in enumerate(servers) for n in range(targets_per_server)]
+
+    engine = UDPProbeEngine(count=50, interval=0.02, timeout=0.5)
+    process = psutil.Process()
+    cpu = process.cpu_times()
+    started = time.perf_counter()
+    results = engine.probe_many(targets)
+    elapsed = time.perf_counter() - started
+    used = process.cpu_times()
+    busy = used.user + used.system - cpu.user - cpu.system
+
+    sequential = len(targets) * (engine.count * engine.interval)
+    print(f"probed:  {len(targets)} targets x {engine.count} packets in {elapsed:.2f} s "
+          f"(sequential >= {sequential:.0f} s), {busy:.2f} s CPU incl. echo servers")
+    for i, (loss, jitter) in enumerate(profiles):
+        group = [results[(i, n)] for n in range(targets_per_server)]
+        measured_loss = sum(r['loss'] for r in group) / len(group)
+        measured_jitter = sum(r['jitter_ms'] for r in group) / len(group)
+        reordered = sum(r['reordered'] for r in group)
+        # |difference| of two uniform(0, j) delays averages j / 3
+        print(f"  loss {loss:4.0%} jitter 0..{jitter:4.0f} ms -> measured loss {measured_loss:5.1%}, "
+              f"RFC 3550 jitter {measured_jitter:5.2f} ms (expect ~{jitter / 3:5.2f}), reordered {reordered}")
+
+    silent = UDPProbeEngine(count=5, interval=0.01, timeout=0.3).probe('127.0.0.1', 9)
+    print(f"no echo (refused): loss {silent['loss']:.0%}, error={silent['error']!r}")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sink:
+        sink.bind(('127.0.0.1', 0))         # bound, never answers: what most servers do on port 7
+        dropped = UDPProbeEngine(count=5, interval=0.01, timeout=0.3).probe('127.0.0.1', sink.getsockname()[1])
+    print(f"no echo (dropped): loss {dropped['loss']:.0%}, error={dropped['error']!r}")
+
+
+if __name__ == '__main__':
+    main()
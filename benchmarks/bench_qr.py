@@ -0,0 +1,51 @@
+"""QR codes: bulk export of a subscription-sized config set and cached re-render"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import QRCodec, parse_config_link
+
+
+def make_configs(count):
+    configs = []
+    for i in range(count):
+        link = (f"vless://{uuid.UUID(int=i)}@node{i}.example.net:443"
+                f"?type=ws&security=tls&sni=node{i}.example.net&path=%2Fws#Node%20{i}")
+        configs.append(parse_config_link(link))
+    return configs
+
+
+def main(count=1000):
+    configs = make_configs(count)
+    codec = QRCodec(cache_size=count)
+    directory = tempfile.mkdtemp()
+
+    start = time.perf_counter()
+    written, skipped = codec.export(configs, directory)
+    export_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codec.render(configs[0])
+    cached_time = time.perf_counter() - start
+
+    serial = QRCodec(cache_size=0)
+    start = time.perf_counter()
+    for config in configs[:50]:
+        serial.render(config)
+    serial_per = (time.perf_counter() - start) / 50
+
+    print(f"export:       {written} images ({skipped} skipped) in {export_time:.2f} s "
+          f"with {codec.max_workers} workers (pool start included)")
+    print(f"serial:       {serial_per * 1000:.1f} ms/image -> {serial_per * count:.2f} s for {count}")
+    print(f"cached:       {cached_time * 1e6:.0f} us to reopen a share dialog image")
+    codec.close()
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
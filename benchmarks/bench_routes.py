@@ -0,0 +1,70 @@
+"""Route-list compile time and CIDR trie lookup rate on a 50k-prefix list"""
+import ipaddress
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import RouteListCompiler
+
+
+def synthetic_list(count, seed=7):
+    """Domestic-style list: clustered IPv4 prefixes with overlaps, plus some IPv6"""
+    rng = random.Random(seed)
+    lines = ['# synthetic route list']
+    for _ in range(count):
+        if rng.random() < 0.05:
+            lines.append(f"2a0{rng.randrange(10)}:{rng.randrange(65536):x}::/{rng.choice([29, 32, 48])}")
+            continue
+        base = rng.choice([5, 31, 37, 46, 77, 78, 79, 81, 85, 87, 91, 95, 109, 176, 178, 185, 188, 194, 212, 213])
+        prefix = rng.choice([16, 18, 20, 22, 22, 23, 24, 24, 24])
+        address = (base << 24) | rng.getrandbits(24)
+        lines.append(str(ipaddress.ip_network((address, prefix), strict=False)))
+    return '\n'.join(lines)
+
+
+def main(count=50_000, lookups=200_000):
+    source = synthetic_list(count)
+    cache_dir = tempfile.mkdtemp()
+    compiler = RouteListCompiler(cache_dir=cache_dir)
+
+    start = time.perf_counter()
+    compiled = compiler.compile(source)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiler.compile(source)
+    cached_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tries = compiler.build_trie(compiled)
+    trie_time = time.perf_counter() - start
+
+    rng = random.Random(1)
+    addresses = [rng.getrandbits(32) for _ in range(lookups)]
+    trie = tries[4]
+    start = time.perf_counter()
+    hits = sum(1 for address in addresses if trie.lookup(address))
+    lookup_time = time.perf_counter() - start
+
+    # Cross-check against the standard library on a sample
+    networks = [ipaddress.ip_network(c) for c in compiled['v4']]
+    reference = list(ipaddress.collapse_addresses(
+        ipaddress.ip_network(line, strict=False)
+        for line in source.splitlines()[1:] if ':' not in line))
+    assert networks == reference, "aggregation differs from ipaddress.collapse_addresses"
+
+    print(f"input prefixes:   {count}")
+    print(f"aggregated:       {len(compiled['v4'])} IPv4 + {len(compiled['v6'])} IPv6")
+    print(f"compile:          {compile_time * 1000:.0f} ms (cached reload {cached_time * 1000:.1f} ms)")
+    print(f"trie build:       {trie_time * 1000:.0f} ms")
+    print(f"lookups:          {lookups / lookup_time:,.0f}/s ({hits} hits)")
+    shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Auto-connect rule evaluation: incremental update() per network event vs re-checking every rule"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import AutoConnectRuleEngine
+
+
+def make_rules(count, seed=0):
+    """A realistic mix: exact and wildcard SSIDs, interfaces, time windows and latency ranges"""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        conditions = {}
+        kind = i % 5
+        if kind == 0:
+            conditions['ssid'] = [f"Net-{rng.randrange(count)}", f"Net-{rng.randrange(count)}"]
+        elif kind == 1:
+            conditions['ssid'] = [f"Cafe-{i}*"]
+            conditions['interface'] = ['wlan*']
+        elif kind == 2:
+            start = rng.randrange(24)
+            conditions['time'] = f"{start:02d}:00-{(start + rng.randrange(1, 12)) % 24:02d}:30"
+            conditions['days'] = rng.sample(range(7), 5)
+        elif kind == 3:
+            conditions['latency_above'] = rng.randrange(50, 400)
+        else:
+            conditions['interface'] = [f"eth{i % 4}"]
+            conditions['latency_below'] = rng.randrange(30, 150)
+        rules.append((f"rule-{i}", rng.randrange(10), json.dumps(conditions),
+                      rng.choice(AutoConnectRuleEngine.ACTIONS), 'best'))
+    return rules
+
+
+def events(count, seed=1):
+    """Network events as the monitors emit them: mostly latency samples, some SSID and clock changes"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.6:
+            out.append({'latency': float(rng.randrange(20, 500))})
+        elif roll < 0.8:
+            out.append({'ssid': f"Net-{rng.randrange(500)}", 'interface': rng.choice(['wlan0', 'eth0', 'eth1'])})
+        else:
+            minute = i % (7 * 24 * 60)
+            out.append({'clock': (minute // 1440, minute % 1440)})
+    return out
+
+
+def full_scan(engine, inputs):
+    """What a non-incremental engine does per event: evaluate every predicate of every rule"""
+    matched = 0
+    for rule in engine.rules.values():
+        if all(engine._evaluate(predicate, inputs.get(key)) for key, predicate in rule.predicates.items()):
+            matched += 1
+    return matched
+
+
+def bench(count, event_count=5000):
+    workdir = tempfile.mkdtemp()
+    try:
+        engine = AutoConnectRuleEngine(os.path.join(workdir, 'rules.db'))
+        engine.conn.executemany(
+            "INSERT INTO auto_connect_rules (name, priority, conditions, action, target) VALUES (?, ?, ?, ?, ?)",
+            make_rules(count))
+        engine.conn.commit()
+        start = time.perf_counter()
+        engine.reload()
+        reload_ms = (time.perf_counter() - start) * 1e3
+
+        stream = events(event_count)
+        fired = 0
+        start = time.perf_counter()
+        for change in stream:
+            fired += engine.update(**change) is not None
+        incremental = (time.perf_counter() - start) / event_count
+
+        start = time.perf_counter()
+        for _ in range(200):
+            engine.update(**stream[-1])      # same values again: nothing to re-evaluate
+        unchanged = (time.perf_counter() - start) / 200
+
+        inputs = {}
+        start = time.perf_counter()
+        for change in stream:
+            inputs.update(change)
+            full_scan(engine, inputs)
+        scanned = (time.perf_counter() - start) / event_count
+        engine.close()
+    finally:
+        shutil.rmtree(workdir)
+    print(f"{count:5d} rules: reload {reload_ms:6.1f} ms, update {incremental * 1e6:6.1f} us/event "
+          f"(unchanged input {unchanged * 1e6:4.1f} us), full scan {scanned * 1e6:7.1f} us/event "
+          f"= {scanned / incremental:4.1f}x; {fired} rules fired")
+
+
+def main():
+    for count in (100, 500, 2000):
+        bench(count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Per-keystroke latency of ServerSearchIndex on 100k synthetic entries"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ServerSearchIndex
+
+COUNTRIES = ['Germany', 'Netherlands', 'Finland', 'USA', 'Japan', 'Turkey',
+             'Kazakhstan', 'Poland', 'France', 'Sweden', 'Latvia', 'Singapore']
+PROTOCOLS = ['vless', 'vmess', 'trojan', 'shadowsocks', 'hysteria2', 'openvpn']
+TAGS = ['reality', 'grpc', 'ws', 'streaming', 'gaming', 'premium', 'free']
+
+
+def build_entries(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        country = rng.choice(COUNTRIES)
+        yield i, {
+            'name': f"{country} {rng.choice(['Node', 'Edge', 'Fast', 'Pro'])} {i}",
+            'country': country,
+            'protocol': rng.choice(PROTOCOLS),
+            'address': f"n{i}.{country.lower()}.example.net",
+            'tags': rng.sample(TAGS, 2),
+        }
+
+
+def main(count=100_000):
+    index = ServerSearchIndex()
+
+    start = time.perf_counter()
+    index.add_many(build_entries(count))
+    build_time = time.perf_counter() - start
+    print(f"Indexed {len(index)} entries in {build_time:.2f}s")
+
+    timings = []
+    for query in ('netherlands vless', 'kazakstan', '#reality fin', 'singapore edge 99'):
+        typed = ''
+        for char in query:
+            typed += char
+            start = time.perf_counter()
+            page = index.first_page(typed)
+            elapsed = (time.perf_counter() - start) * 1000
+            timings.append(elapsed)
+            print(f"  {typed!r:24} {len(page):3} hits  {elapsed:7.2f} ms")
+
+    start = time.perf_counter()
+    for key in range(0, 1000):
+        index.remove(key)
+    print(f"Removed 1000 entries in {(time.perf_counter() - start) * 1000:.1f} ms")
+    timings.sort()
+    print(f"Keystrokes: median {timings[len(timings) // 2]:.2f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms, worst {timings[-1]:.2f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
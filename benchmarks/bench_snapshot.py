@@ -0,0 +1,93 @@
+"""Time-to-interactive: cold start from SQLite vs warm start from the session snapshot.
+
+Runs the client's own startup steps (store, snapshot restore) without
+creating the Tk window, then times the first search, which is when the
+search index is restored or built. Each launch runs in a fresh interpreter.
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def boot(directory, save):
+    import main
+    main.DB_DIR = directory
+    client = main.AdvancedVPNClient.__new__(main.AdvancedVPNClient)
+    client.logger = logging.getLogger('KingzVPNPro')
+    client.search_index = main.ServerSearchIndex()
+    client.current_config = None
+
+    started = time.perf_counter()
+    client.setup_database()
+    client.snapshot = main.SessionSnapshot(os.path.join(directory, 'session.snap')).open()
+    client.setup_config_store()
+    client.load_balancer = main.ServerLoadBalancer()
+    client.restore_snapshot()
+    client.load_data()
+    interactive = time.perf_counter() - started
+    began = time.perf_counter()
+    assert client.search_servers('node 1234')
+    indexed = time.perf_counter() - began
+
+    saved = None
+    if save:
+        client.ip_info = {'ip': '203.0.113.7', 'checked': time.time()}
+        began = time.perf_counter()
+        client.save_snapshot()
+        saved = time.perf_counter() - began
+    print(json.dumps({'interactive': interactive, 'indexed': indexed, 'saved': saved,
+                      'configs': len(client.configs), 'fresh': client.snapshot_fresh}))
+
+
+def baseline(directory):
+    """Startup before snapshots: load every row, then index synchronously"""
+    import main
+    started = time.perf_counter()
+    store = main.ConfigStore(os.path.join(directory, 'vpn_client.db'))
+    index = main.ServerSearchIndex()
+    for config in store.all():
+        index.add(('config', config['hash']), config)
+    print(json.dumps({'interactive': time.perf_counter() - started}))
+
+
+def launch(*args):
+    output = subprocess.run([sys.executable, __file__, *args], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(count=20000):
+    directory = tempfile.mkdtemp()
+    if len(sys.argv) > 1:
+        if sys.argv[1] == '--boot':
+            boot(sys.argv[2], sys.argv[3] == 'save')
+        else:
+            baseline(sys.argv[2])
+        return
+
+    import main as app
+    store = app.ConfigStore(os.path.join(directory, 'vpn_client.db'))
+    store.add_many([app.parse_config_link(f"vless://id{i}@n{i}.example.net:443?security=tls#Node {i}")
+                    for i in range(count)])
+    store.close()
+
+    before = launch('--baseline', directory)
+    print(f"before:  {before['interactive'] * 1000:6.0f} ms to interactive ({count} configs, sync index)")
+    cold = launch('--boot', directory, 'save')
+    print(f"cold:    {cold['interactive'] * 1000:6.0f} ms to interactive, first search "
+          f"{cold['indexed'] * 1000:.0f} ms (index built); snapshot written in {cold['saved'] * 1000:.0f} ms "
+          f"({os.path.getsize(os.path.join(directory, 'session.snap')) / 1e6:.1f} MB)")
+    warm = launch('--boot', directory, 'save')
+    assert warm['fresh']
+    print(f"warm:    {warm['interactive'] * 1000:6.0f} ms to interactive, first search "
+          f"{warm['indexed'] * 1000:.0f} ms (index restored); unchanged snapshot rewritten in {warm['saved'] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Server switch latency: cold start vs pre-warmed standby, using a fake tunnel binary"""
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import (ConfigConverter, ConfigValidator, DNSCache, FastSwitcher, SocksFront, TunnelProcess,
+                  parse_config_link)
+
+COMMAND = [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_tunnel.py'), 'run', '-c', '{config}']
+ACTIVE_PORT = 21808
+FRONT_PORT = 21807
+
+
+def start_endpoint():
+    """Local stand-in for the remote VPN servers"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(64)
+
+    def accept():
+        while True:
+            conn, _ = server.accept()
+            conn.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def main(rounds=5):
+    port = start_endpoint()
+    configs = [parse_config_link(f"vless://id{i}@127.0.0.1:{port}?type=tcp#Server{i}") for i in range(2)]
+    converter = ConfigConverter(cache_dir=tempfile.mkdtemp())
+
+    cold = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        path = converter.render_file(configs[i % 2], socks_port=ACTIVE_PORT)
+        tunnel = TunnelProcess(COMMAND, configs[i % 2], path, socks_port=ACTIVE_PORT).start()
+        assert tunnel.wait_ready()
+        cold.append((time.perf_counter() - started) * 1000)
+        tunnel.stop()
+
+    dns_cache = DNSCache()
+    switcher = FastSwitcher(COMMAND, dns_cache, ConfigValidator(resolver=dns_cache), converter,
+                            standby_port=ACTIVE_PORT + 1)
+    # Tunnels move between internal ports; clients only ever use the front's
+    front = SocksFront(FRONT_PORT).start()
+    active = None
+    warm = []
+    backends = []
+    for i in range(rounds):
+        standby = switcher.prepare(configs[i % 2], active_port=active.socks_port if active else ACTIVE_PORT)
+        started = time.perf_counter()
+        taken = switcher.take(configs[i % 2])
+        assert taken['process'] and taken['process'].wait_ready(0)
+        front.retarget(taken['process'].socks_port)
+        if active:
+            active.stop()
+        active = taken['process']
+        warm.append((time.perf_counter() - started) * 1000)
+        backends.append(active.socks_port)
+        # The fake tunnel accepts and closes: EOF through the front means it was relayed
+        with socket.create_connection(('127.0.0.1', FRONT_PORT), timeout=2) as client:
+            assert client.recv(1) == b''
+    if active:
+        active.stop()
+    front.stop()
+    assert front.stats['connections'] == rounds and front.stats['refused'] == 0
+
+    print(f"cold switch: median {statistics.median(cold):8.1f} ms")
+    print(f"warm switch: median {statistics.median(warm):8.1f} ms")
+    print(f"front port:  {FRONT_PORT} throughout; tunnels on {sorted(set(backends))}, "
+          f"{front.stats['connections']}/{rounds} relayed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Traffic history: a week of 1 s samples, memory use, range queries and persistence"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+
+from main import NUMPY_AVAILABLE, TimeSeriesStore
+
+
+def main(days=7):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'traffic.tsdb')
+    rng = random.Random(1)
+
+    process = psutil.Process()
+    store = TimeSeriesStore(path)
+    baseline = process.memory_info().rss
+
+    now = time.time()
+    start = now - days * 86400 + 1
+    samples = days * 86400
+    checkpoints = {}
+    began = time.perf_counter()
+    for i in range(samples):
+        store.record(start + i, rx_bps=rng.uniform(0, 5e7), tx_bps=rng.uniform(0, 5e6),
+                     latency_ms=rng.uniform(20, 200) if i % 5 == 0 else None)
+        if i % 86400 == 0:
+            checkpoints[i // 86400] = process.memory_info().rss - baseline
+    record_time = time.perf_counter() - began
+    grown = process.memory_info().rss - baseline
+
+    print(f"record:   {samples:,} samples in {record_time:.1f} s ({samples / record_time:,.0f}/s)")
+    print(f"memory:   {store.nbytes() / 1024:.0f} KB of buffers; "
+          f"RSS growth at each day: {', '.join(f'{v / 1024:.0f}' for v in checkpoints.values())} KB, "
+          f"end {grown / 1024:.0f} KB")
+
+    for label, seconds in (('10 min', 600), ('1 day', 86400), ('1 week', 7 * 86400)):
+        began = time.perf_counter()
+        for _ in range(100):
+            times, values = store.query('rx_bps', now - seconds, now)
+        elapsed = (time.perf_counter() - began) / 100
+        print(f"query {label:7s}: {len(times):5d} points in {elapsed * 1e6:7.0f} us "
+              f"({'numpy' if NUMPY_AVAILABLE else 'pure python'})")
+
+    began = time.perf_counter()
+    store.save()
+    saved = time.perf_counter() - began
+    began = time.perf_counter()
+    TimeSeriesStore(path)
+    loaded = time.perf_counter() - began
+    print(f"persist:  {os.path.getsize(path) / 1024:.0f} KB file, save {saved * 1000:.1f} ms, "
+          f"load {loaded * 1000:.1f} ms")
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
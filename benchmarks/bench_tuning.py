@@ -0,0 +1,61 @@
+"""MTU discovery against a size-limited echo, then the tuning grid over a modelled loopback tunnel"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import (ConfigConverter, ThroughputTester, TuningStore, TunnelTuner, UDPEchoServer,
+                  discover_path_mtu, format_rate, parse_config_link)
+
+COMMAND = [sys.executable, os.path.join(ROOT, 'benchmarks', 'loopback_tunnel.py'), 'run', '-c', '{config}']
+
+
+class MTULimitedEcho(UDPEchoServer):
+    """Echo that silently drops datagrams whose IPv4 packet would exceed path_mtu (a PMTU black hole)"""
+
+    def __init__(self, path_mtu):
+        super().__init__()
+        self.path_mtu = path_mtu
+        self.received = 0
+
+    def reply(self, data, addr):
+        self.received += 1
+        if len(data) + 28 <= self.path_mtu:
+            super().reply(data, addr)
+
+
+def main(path_mtu=1400):
+    os.environ['PATH_MTU'] = str(path_mtu)
+    echo = MTULimitedEcho(path_mtu).start()
+    started = time.perf_counter()
+    mtu, probed = discover_path_mtu('127.0.0.1', echo.port, timeout=0.1)
+    print(f"discovery: path MTU {mtu} (true {path_mtu}, probed={probed}) in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms, {echo.received} probes")
+
+    workdir = tempfile.mkdtemp()
+    store = TuningStore(os.path.join(workdir, 'tuning.db'))
+    tester = ThroughputTester('http://speed.test/__down', duration=1.0, warmup=0.2)
+    tuner = TunnelTuner(COMMAND, ConfigConverter(cache_dir=workdir), store, tester,
+                        socks_port=24100, echo_port=echo.port)
+    config = parse_config_link("vless://id@127.0.0.1:20000?type=tcp#Tuned")
+
+    started = time.perf_counter()
+    result = tuner.tune(config, 'bench-net')
+    elapsed = time.perf_counter() - started
+    print(f"grid:      {len(result['results'])} combinations in {elapsed:.1f} s")
+    for bps, params in sorted(result['results'], key=lambda item: -item[0]):
+        print(f"  mss {params['mssfix']:4d} buffers {params['rcvbuf']:6d} -> {format_rate(bps)}")
+    default = tuner.measure(config, None)
+    print(f"best:      {result['best']} at {format_rate(result['throughput_bps'])} "
+          f"(untuned {format_rate(default)}, x{result['throughput_bps'] / max(default, 1):.1f})")
+    print(f"stored:    {store.get(config['hash'], 'bench-net') == result['best']}, "
+          f"{len(store.for_network('bench-net'))} entry for bench-net")
+    store.close()
+    echo.stop()
+
+
+if __name__ == '__main__':
+    main()
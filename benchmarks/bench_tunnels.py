@@ -0,0 +1,81 @@
+"""Multi-tunnel mode: dozens of concurrent fake tunnels, supervisor overhead, scheduling and restarts"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import psutil
+
+from main import ConfigConverter, TunnelPool, TunnelScheduler, TunnelSlot, parse_config_link
+
+COMMAND = [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_tunnel.py'), 'run', '-c', '{config}']
+
+
+def connect_probe(slot):
+    started = time.perf_counter()
+    with socket.create_connection(('127.0.0.1', slot.port), timeout=1):
+        pass
+    return (time.perf_counter() - started) * 1000
+
+
+def wait_for(predicate, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.05)
+
+
+def main(tunnels=32, idle=10, tasks=5000):
+    configs = [parse_config_link(f"vless://id{i}@127.0.0.1:{20000 + i}?type=tcp#Node{i}") for i in range(tunnels)]
+    pool = TunnelPool(COMMAND, ConfigConverter(cache_dir=tempfile.mkdtemp()), base_port=23000,
+                      probe=connect_probe, tick=0.25, sample_every=1.0, min_interval=0.5, max_interval=2.0)
+    process = psutil.Process()
+    threads_before = threading.active_count()
+
+    started = time.perf_counter()
+    for config in configs:
+        pool.add(config)
+    wait_for(lambda: len(pool.healthy()) == tunnels)
+    print(f"startup:   {tunnels} tunnels up in {time.perf_counter() - started:.2f} s")
+
+    slot = next(iter(pool.slots.values()))
+    print(f"state:     {sys.getsizeof(slot)} bytes per TunnelSlot (__slots__, no __dict__: "
+          f"{not hasattr(slot, '__dict__')}), {threading.active_count() - threads_before} threads "
+          f"for {tunnels} tunnels")
+
+    cpu = process.cpu_times()
+    time.sleep(idle)
+    used = process.cpu_times()
+    busy = used.user + used.system - cpu.user - cpu.system
+    probes = sum(s.probes for s in pool.slots.values())
+    print(f"supervise: {busy / idle * 100:.2f}% of one core over {idle} s ({probes} probes, "
+          f"{busy / idle / tunnels * 1e3:.2f} ms CPU per tunnel-second)")
+
+    scheduler = TunnelScheduler(pool)
+    started = time.perf_counter()
+    results = list(scheduler.run(range(tasks), lambda slot, task: time.sleep(0.001) or slot.id, concurrency=32))
+    elapsed = time.perf_counter() - started
+    spread = Counter(result for _, result in results)
+    print(f"schedule:  {tasks} tasks in {elapsed:.2f} s over {len(spread)} tunnels, "
+          f"per tunnel min {min(spread.values())} / max {max(spread.values())}")
+
+    victim = pool.slots[1]
+    victim.tunnel.process.kill()
+    started = time.perf_counter()
+    wait_for(lambda: victim.state == 'down')
+    wait_for(lambda: victim.state == 'up')
+    print(f"restart:   killed tunnel back up in {time.perf_counter() - started:.2f} s "
+          f"(backoff 2 s, restarts={victim.restarts})")
+
+    pool.stop()
+
+
+if __name__ == '__main__':
+    main()
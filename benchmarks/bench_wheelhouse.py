@@ -0,0 +1,68 @@
+"""Offline wheelhouse: lock, verify and install local wheels with --no-index (no network needed)"""
+import base64
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import DependencyManager
+
+
+def record_hash(data):
+    return 'sha256=' + base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b'=').decode()
+
+
+def make_wheel(directory, index):
+    """Minimal pure-Python wheel kvbench_pkg<index>-1.0"""
+    module = f"kvbench_pkg{index}"
+    dist_info = f"{module}-1.0.dist-info"
+    files = {
+        f"{module}/__init__.py": f"VALUE = {index}\n".encode(),
+        f"{dist_info}/METADATA": f"Metadata-Version: 2.1\nName: kvbench-pkg{index}\nVersion: 1.0\n".encode(),
+        f"{dist_info}/WHEEL": b"Wheel-Version: 1.0\nGenerator: bench\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+    }
+    record = ''.join(f"{name},{record_hash(data)},{len(data)}\n" for name, data in files.items())
+    files[f"{dist_info}/RECORD"] = (record + f"{dist_info}/RECORD,,\n").encode()
+    path = os.path.join(directory, f"{module}-1.0-py3-none-any.whl")
+    with zipfile.ZipFile(path, 'w') as wheel:
+        for name, data in files.items():
+            wheel.writestr(name, data)
+    return path
+
+
+def main(count=8):
+    workdir = tempfile.mkdtemp()
+    manager = DependencyManager()
+    manager.wheelhouse = os.path.join(workdir, 'wheelhouse')
+    os.makedirs(manager.wheelhouse)
+    wheels = [make_wheel(manager.wheelhouse, i) for i in range(count)]
+    manager.create_requirements_file(manager.wheelhouse_lock())
+
+    start = time.perf_counter()
+    problems = manager.verify_wheelhouse()
+    print(f"verify:   {len(problems)} problems in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for workers in (None, 1, 4):
+        target = os.path.join(workdir, f"site-{workers}")
+        start = time.perf_counter()
+        success, failures = manager.install_from_wheelhouse(max_workers=workers, target=target)
+        elapsed = time.perf_counter() - start
+        installed = sum(os.path.isdir(os.path.join(target, f"kvbench_pkg{i}")) for i in range(count))
+        label = f"{workers} worker(s)" if workers else "default workers"
+        print(f"install:  {installed}/{count} offline with {label} in {elapsed:.2f} s "
+              f"({'ok' if success else failures})")
+
+    with open(wheels[0], 'ab') as f:
+        f.write(b'tampered')
+    success, failures = manager.install_from_wheelhouse(target=os.path.join(workdir, 'site-tampered'))
+    print(f"tampered: install refused={not success} ({failures[0][1] if failures else ''})")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Stand-in for the tunnel binary: `fake_tunnel.py run -c CONFIG`
+
+Reads the SOCKS inbound port from an xray-style config, sleeps for
+FAKE_TUNNEL_STARTUP seconds (default 0.3) to mimic handshake/bootstrap
+cost, then accepts and closes connections until terminated.
+"""
+import json
+import os
+import socket
+import sys
+import time
+
+
+def main():
+    config_path = sys.argv[sys.argv.index('-c') + 1]
+    with open(config_path, encoding='utf-8') as f:
+        port = json.load(f)['inbounds'][0]['port']
+
+    time.sleep(float(os.environ.get('FAKE_TUNNEL_STARTUP', '0.3')))
+
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(64)
+    print(f"fake tunnel listening on {port}", flush=True)
+    while True:
+        conn, _ = server.accept()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Stand-in tunnel with a modelled path: `loopback_tunnel.py run -c CONFIG`
+
+Serves SOCKS5 on the xray config's inbound port and answers every request
+with a paced byte stream. The rate follows the config's sockopt the way a
+real path would:
+
+  * an MSS (tcpMaxSeg, default 1460) whose packets exceed PATH_MTU
+    (default 1400) black-holes full-size segments, so throughput collapses;
+  * the receive window (tcpWindowClamp, default 128 KiB) caps the rate at
+    window / RTT_MS (default 50);
+  * LINK_MBPS (default 200) is the ceiling, scaled by header efficiency.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+
+def target_rate(sockopt):
+    path_mtu = int(os.environ.get('PATH_MTU', '1400'))
+    rtt = float(os.environ.get('RTT_MS', '50')) / 1000
+    link = float(os.environ.get('LINK_MBPS', '200')) * 1e6
+    mss = sockopt.get('tcpMaxSeg') or 1460
+    window = sockopt.get('tcpWindowClamp') or 131072
+    rate = min(link, window * 8 / rtt) * mss / (mss + 40 + 60)    # TCP/IP + tunnel headers
+    if mss + 40 > path_mtu:
+        rate *= 0.02        # only retransmitted small segments get through
+    return rate
+
+
+def serve(conn, rate):
+    with conn:
+        conn.recv(3)
+        conn.sendall(b'\x05\x00')
+        request = conn.recv(262)
+        conn.sendall(b'\x05\x00\x00\x01' + bytes(6))
+        if len(request) < 4:
+            return
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return
+            data += chunk
+        conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n\r\n')
+        block = bytes(16384)
+        started = time.perf_counter()
+        sent = 0
+        try:
+            while True:
+                conn.sendall(block)
+                sent += len(block)
+                ahead = sent * 8 / rate - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        except OSError:
+            return
+
+
+def main():
+    config_path = sys.argv[sys.argv.index('-c') + 1]
+    with open(config_path, encoding='utf-8') as f:
+        config = json.load(f)
+    port = config['inbounds'][0]['port']
+    sockopt = config['outbounds'][0].get('streamSettings', {}).get('sockopt', {})
+    rate = target_rate(sockopt)
+
+    time.sleep(float(os.environ.get('FAKE_TUNNEL_STARTUP', '0.1')))
+
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(16)
+    print(f"loopback tunnel on {port} at {rate / 1e6:.1f} Mbit/s", flush=True)
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve, args=(conn, rate), daemon=True).start()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,551 @@
+"""Benchmark suite for the client's hot paths, with JSON results and baseline comparison.
+
+    python benchmarks/suite.py                          # run everything, print a table
+    python benchmarks/suite.py --only 'sqlite*' --repeat 5
+    python benchmarks/suite.py --json results.json --baseline benchmarks/baseline.json
+    python benchmarks/suite.py --save-baseline benchmarks/baseline.json
+
+Datasets are generated from fixed seeds and every network dependency is a
+local stand-in (HTTP subscription server, TCP listeners, UDP echo, the fake
+tunnel binary), so runs are reproducible offline. Each case runs --repeat
+times and reports the median of every metric. Metrics ending in _per_s are
+higher-is-better, all others lower-is-better; with --baseline any metric
+worse than the baseline by more than --tolerance is a regression and the
+exit status is 1. The startup and notification cases need a display: an
+existing $DISPLAY, or Xvfb if it is installed (they are skipped otherwise).
+The bench_*.py scripts next to this file are deeper single-topic studies.
+"""
+import argparse
+import contextlib
+import fnmatch
+import gzip
+import http.server
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from queue import Queue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import psutil
+
+import main as app
+
+FAKE_TUNNEL = [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_tunnel.py'), 'run', '-c', '{config}']
+CASES = {}
+
+
+class Skip(Exception):
+    """Raised by a case that cannot run here (no display, no pip, ...)"""
+
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+def lower_is_better(metric):
+    return not metric.endswith('_per_s')
+
+
+# ===== DATASETS AND STAND-INS =====
+def make_links(count, seed=0):
+    """Deterministic share links over the supported schemes"""
+    rng = random.Random(seed)
+    links = []
+    for i in range(count):
+        host = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        port = rng.choice([443, 8443, 2053, 80])
+        kind = i % 4
+        if kind == 0:
+            links.append(f"vless://{rng.getrandbits(64):016x}@{host}:{port}?type=ws&security=tls#DE%20Node%20{i}")
+        elif kind == 1:
+            links.append(f"trojan://pw{i}@{host}:{port}?security=tls&sni=n{i}.example.net#NL%20Node%20{i}")
+        elif kind == 2:
+            links.append(f"hysteria2://auth{i}@{host}:{port}?obfs=salamander#US%20Node%20{i}")
+        else:
+            vmess = {'v': '2', 'ps': f"JP Node {i}", 'add': host, 'port': str(port), 'id': f"{i:08x}",
+                     'net': 'tcp', 'tls': 'tls'}
+            links.append('vmess://' + app.base64.b64encode(json.dumps(vmess).encode()).decode())
+    return links
+
+
+class SubscriptionServer:
+    """Local HTTP subscription endpoint (base64 payload, ETag, optional gzip)"""
+
+    def __init__(self, payload):
+        body = payload.encode()
+        etag = f'"{app.config_hash(payload)}"'
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                data = body
+                self.send_response(200)
+                if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                    data = gzip.compress(body, 1)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/sub"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def tcp_listeners(count):
+    """Listening sockets that never accept: the kernel completes handshakes from the backlog"""
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(4096)
+        sockets.append(sock)
+    return sockets
+
+
+def shell_client(directory):
+    """AdvancedVPNClient without Tk: just the state the non-UI code paths touch"""
+    app.DB_DIR = directory
+    client = app.AdvancedVPNClient.__new__(app.AdvancedVPNClient)
+    client.logger = logging.getLogger('KingzVPNPro')
+    client.connection_history = []
+    client.configs = []
+    client.configs_lock = threading.Lock()
+    client.current_config = None
+    client.is_connected = False
+    client.events = {name: threading.Event() for name in ('stats_stop', 'monitor_stop', 'scan_stop')}
+    client.active_threads = {}
+    client.stats_queue = Queue(maxsize=50)
+    client.load_balancer = app.ServerLoadBalancer()
+    client.governor = app.ResourceGovernor(interval=3600)
+    client.setup_database()
+    return client
+
+
+def cpu_seconds(process):
+    times = process.cpu_times()
+    return times.user + times.system
+
+
+# ===== CASES =====
+@case('import.subscription')
+def bench_import(workdir, count=10_000):
+    """import_config path: fetch a 10k-node subscription from a local server, parse and store it"""
+    links = make_links(count)
+    payload = app.base64.b64encode('\n'.join(links).encode()).decode()
+    server = SubscriptionServer(payload)
+    store = app.ConfigStore(os.path.join(workdir, 'import.db'))
+    try:
+        updater = app.SubscriptionUpdater(store, threading.Event())
+        sub = {'url': server.url, 'interval': 3600, 'failures': 0}
+        started = time.perf_counter()
+        updater.refresh(sub)
+        first = time.perf_counter() - started
+        stored = len(store.all())
+        started = time.perf_counter()
+        updater.refresh(sub)
+        again = time.perf_counter() - started
+
+        started = time.perf_counter()
+        parsed = [c for c in map(app.parse_config_link, app.iter_share_links('\n'.join(links))) if c]
+        paste = time.perf_counter() - started
+    finally:
+        store.close()
+        server.close()
+    assert stored == count and len(parsed) == count, (stored, len(parsed))
+    return {
+        'refresh_ms': first * 1000,
+        'refresh_per_s': count / first,
+        'not_modified_ms': again * 1000,
+        'paste_parse_per_s': count / paste,
+    }
+
+
+@case('sqlite.history')
+def bench_history(workdir, count=2000):
+    """record_connection and record_probes against the client's own schema"""
+    client = shell_client(workdir)
+    configs = client.configs = [app.parse_config_link(link) for link in make_links(200, seed=1)]
+    try:
+        started = time.perf_counter()
+        for i in range(count):
+            client.record_connection(configs[i % len(configs)], i % 5 != 0, duration=i)
+        single = time.perf_counter() - started
+
+        rows = [(c['hash'], 20, 19, 42.0, 1.5, 0) for c in configs]
+        started = time.perf_counter()
+        for _ in range(count // 100):
+            client.record_probes(rows)
+        batched = time.perf_counter() - started
+
+        started = time.perf_counter()
+        client.load_balancer_history()
+        read = time.perf_counter() - started
+        seeded = len(client.load_balancer.stats)
+    finally:
+        client.db_conn.close()
+    return {
+        'connection_write_ms': single / count * 1000,
+        'connection_writes_per_s': count / single,
+        'probe_rows_per_s': len(rows) * (count // 100) / batched,
+        'history_read_ms': read * 1000,
+        'seeded_servers': seeded,
+    }
+
+
+@case('prober.tcp_fanout')
+def bench_tcp_fanout(workdir, count=2000, listeners=16):
+    """ConfigValidator fan-out: schema, resolve and connect checks against local listeners"""
+    sockets = tcp_listeners(listeners)
+    try:
+        configs = [app.parse_config_link(f"vless://id{i}@127.0.0.1:{sockets[i % listeners].getsockname()[1]}"
+                                         f"?type=tcp#Local{i}") for i in range(count)]
+        validator = app.ConfigValidator(max_workers=64, timeout=2.0, resolver=app.DNSCache())
+        process = psutil.Process()
+        cpu = cpu_seconds(process)
+        started = time.perf_counter()
+        alive = sum(1 for verdict in validator.validate(configs, use_cache=False) if verdict['ok'])
+        elapsed = time.perf_counter() - started
+        busy = cpu_seconds(process) - cpu
+    finally:
+        for sock in sockets:
+            sock.close()
+    assert alive == count, alive
+    return {
+        'checks_per_s': count / elapsed,
+        'total_ms': elapsed * 1000,
+        'cpu_ms_per_check': busy / count * 1000,
+    }
+
+
+@case('prober.udp_fanout')
+def bench_udp_fanout(workdir, targets=200):
+    """UDPProbeEngine: packet trains to many targets on one event loop"""
+    echo = app.UDPEchoServer().start()
+    try:
+        engine = app.UDPProbeEngine(count=10, interval=0.01, timeout=0.3)
+        started = time.perf_counter()
+        results = engine.probe_many([(i, '127.0.0.1', echo.port) for i in range(targets)])
+        elapsed = time.perf_counter() - started
+    finally:
+        echo.stop()
+    loss = sum(r['loss'] for r in results.values()) / len(results)
+    return {
+        'total_ms': elapsed * 1000,
+        'targets_per_s': targets / elapsed,
+        'loss': loss,
+    }
+
+
+@case('tunnel.connect')
+def bench_tunnel_connect(workdir, rounds=5):
+    """Render a config and bring up the (fake) tunnel binary until its SOCKS port answers"""
+    os.environ.setdefault('FAKE_TUNNEL_STARTUP', '0.05')
+    converter = app.ConfigConverter(cache_dir=os.path.join(workdir, 'render'))
+    config = app.parse_config_link("vless://id@127.0.0.1:20000?type=tcp&security=tls#Tunnel")
+    timings = []
+    try:
+        for i in range(rounds):
+            started = time.perf_counter()
+            path = converter.render_file(config, 'xray', socks_port=24500 + i)
+            tunnel = app.TunnelProcess(FAKE_TUNNEL, config, path, socks_port=24500 + i, capture=False).start()
+            ready = tunnel.wait_ready()
+            timings.append(time.perf_counter() - started)
+            tunnel.stop()
+            assert ready
+    finally:
+        converter.close()
+    return {'connect_ms': statistics.median(timings) * 1000}
+
+
+@case('stats.sampling')
+def bench_stats(workdir, seconds=2.0, interval=0.01):
+    """The stats sampler loop (net counters, time series, balancer, queue) at 100 Hz"""
+    client = shell_client(workdir)
+    client.traffic_data = app.TimeSeriesStore(os.path.join(workdir, 'traffic.tsdb'))
+    client.watchdog = type('Watchdog', (), {'stats': {'probes': 0, 'last_latency_ms': None}})()
+    process = psutil.Process()
+    try:
+        cpu = cpu_seconds(process)
+        client.start_stats_sampler(interval=interval, save_every=3600)
+        time.sleep(seconds)
+        client.events['stats_stop'].set()
+        client.active_threads['stats'].join()
+        busy = cpu_seconds(process) - cpu
+    finally:
+        client.db_conn.close()
+    expected = seconds / interval
+    return {
+        'cpu_ms_per_sample': busy / expected * 1000,
+        'cpu_percent_at_4hz': busy / expected * 4 * 100,
+    }
+
+
+@case('dependencies.check')
+def bench_dependency_check(workdir):
+    """DependencyManager check phase as run at launch: system check, package probes, pip lookup"""
+    manager = app.DependencyManager()
+    packages = list(manager.required_packages) + list(manager.optional_packages)
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        manager.check_system_requirements()
+        present = sum(manager.is_package_installed(package) for package in packages)
+        checked = time.perf_counter()
+        manager.get_install_command()
+        probed = time.perf_counter()
+    return {
+        'package_check_ms': (checked - started) * 1000,
+        'pip_lookup_ms': (probed - checked) * 1000,
+        'packages_present': present,
+    }
+
+
+@case('dependencies.install')
+def bench_dependency_install(workdir, count=6):
+    """DependencyManager install phase: verify and install a local wheelhouse offline"""
+    from bench_wheelhouse import make_wheel
+    manager = app.DependencyManager()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not manager.get_install_command():
+            raise Skip("pip not available")
+        manager.wheelhouse = os.path.join(workdir, 'wheelhouse')
+        os.makedirs(manager.wheelhouse, exist_ok=True)
+        for i in range(count):
+            make_wheel(manager.wheelhouse, i)
+        manager.create_requirements_file(manager.wheelhouse_lock())
+        started = time.perf_counter()
+        problems = manager.verify_wheelhouse()
+        verify = time.perf_counter() - started
+        started = time.perf_counter()
+        success, failures = manager.install_from_wheelhouse(target=os.path.join(workdir, 'site'))
+        install = time.perf_counter() - started
+    assert not problems and success, (problems, failures)
+    return {'verify_ms': verify * 1000, 'install_ms': install * 1000}
+
+
+# ===== DISPLAY CASES (child processes) =====
+def child_startup(directory):
+    for name in ('DB_DIR', 'CONFIG_DIR', 'LOG_DIR', 'CACHE_DIR'):
+        setattr(app, name, os.path.join(directory, name.lower()))
+        os.makedirs(getattr(app, name), exist_ok=True)
+    started = time.perf_counter()
+    client = app.AdvancedVPNClient(auto_install_deps=False)
+    constructed = time.perf_counter()
+    client.app.update()
+    drawn = time.perf_counter()
+
+    burst = 200
+    began = time.perf_counter()
+    for i in range(burst):
+        client.show_notification(f"Notification {i}", ("info", "success", "warning", "error")[i % 4])
+    client.app.update()
+    notified = time.perf_counter() - began
+
+    client.cleanup()
+    client.app.destroy()
+    print(json.dumps({'construct': constructed - started, 'first_frame': drawn - started,
+                      'burst': burst, 'notified': notified}))
+
+
+class VirtualDisplay:
+    """$DISPLAY if set, else a private Xvfb server"""
+
+    def __init__(self):
+        self.process = None
+        self.display = os.environ.get('DISPLAY')
+
+    def __enter__(self):
+        if self.display:
+            return self
+        xvfb = shutil.which('Xvfb')
+        if not xvfb:
+            raise Skip("no display and Xvfb not installed")
+        number = next(n for n in range(99, 199) if not os.path.exists(f"/tmp/.X11-unix/X{n}"))
+        self.process = subprocess.Popen([xvfb, f":{number}", '-screen', '0', '1280x800x24', '-nolisten', 'tcp'],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            if time.monotonic() > deadline or self.process.poll() is not None:
+                raise Skip("Xvfb did not start")
+            time.sleep(0.05)
+        self.display = f":{number}"
+        return self
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+
+
+_startup_cache = {}
+
+
+def run_startup(workdir):
+    """One client launch per repeat, shared by the startup and notification cases"""
+    key = workdir
+    if key not in _startup_cache:
+        with VirtualDisplay() as display:
+            env = dict(os.environ, DISPLAY=display.display)
+            output = subprocess.run([sys.executable, __file__, '--child-startup', workdir], env=env,
+                                    capture_output=True, text=True, timeout=120)
+            if output.returncode != 0:
+                raise RuntimeError(output.stderr.strip()[-500:])
+            _startup_cache[key] = json.loads(output.stdout.strip().splitlines()[-1])
+    return _startup_cache[key]
+
+
+@case('client.startup')
+def bench_startup(workdir):
+    """AdvancedVPNClient construction and first drawn frame, in a fresh interpreter"""
+    result = run_startup(workdir)
+    return {'construct_ms': result['construct'] * 1000, 'first_frame_ms': result['first_frame'] * 1000}
+
+
+@case('client.notifications')
+def bench_notifications(workdir):
+    """A burst of show_notification calls until Tk has drawn them"""
+    result = run_startup(workdir)
+    return {'burst_ms': result['notified'] * 1000,
+            'notifications_per_s': result['burst'] / result['notified']}
+
+
+# ===== RUNNER =====
+def run_case(name, repeat):
+    runs = []
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix='kvbench-')
+        try:
+            runs.append(CASES[name](workdir))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    metrics = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+    return {'metrics': metrics, 'runs': len(runs),
+            'spread': {metric: (min(run[metric] for run in runs), max(run[metric] for run in runs))
+                       for metric in runs[0]}}
+
+
+def environment():
+    commit = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """(case, metric, baseline, current, change) for every metric worse than tolerance"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name, {}).get('metrics')
+        if not old or 'metrics' not in result:
+            continue
+        for metric, value in result['metrics'].items():
+            reference = old.get(metric)
+            if not reference or metric in ('loss', 'packages_present', 'seeded_servers'):
+                continue        # counts and ratios are reported, not judged
+            change = (value - reference) / abs(reference)
+            worse = change > tolerance if lower_is_better(metric) else change < -tolerance
+            if worse:
+                regressions.append((name, metric, reference, value, change))
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--child-startup':
+        child_startup(sys.argv[2])
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--only', action='append', help="case name pattern (repeatable)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare against this results file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument('--save-baseline', help="write results here as the new baseline")
+    parser.add_argument('--list', action='store_true')
+    args = parser.parse_args()
+
+    names = [name for name in CASES if not args.only or any(fnmatch.fnmatch(name, p) for p in args.only)]
+    if args.list:
+        for name in names:
+            print(f"{name:24s} {CASES[name].__doc__}")
+        return 0
+
+    results = {}
+    for name in names:
+        started = time.perf_counter()
+        try:
+            result = run_case(name, args.repeat)
+        except Skip as e:
+            results[name] = {'skipped': str(e)}
+            print(f"{name:24s} skipped: {e}")
+            continue
+        except Exception as e:
+            results[name] = {'error': f"{e.__class__.__name__}: {e}"}
+            print(f"{name:24s} ERROR {e.__class__.__name__}: {e}")
+            continue
+        results[name] = result
+        summary = ', '.join(f"{metric} {value:,.2f}" for metric, value in result['metrics'].items())
+        print(f"{name:24s} {summary}  ({time.perf_counter() - started:.1f} s)")
+
+    report = {'environment': environment(), 'repeat': args.repeat, 'results': results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+
+    status = 1 if any('error' in result for result in results.values()) else 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        env = baseline.get('environment', {})
+        print(f"\nbaseline: {args.baseline} (commit {env.get('commit')}, {env.get('cpus')} CPUs, "
+              f"tolerance {args.tolerance:.0%})")
+        for name, metric, reference, value, change in regressions:
+            print(f"  REGRESSION {name} {metric}: {reference:,.2f} -> {value:,.2f} ({change:+.0%})")
+        if regressions:
+            status = 1
+        else:
+            print("  no regressions")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
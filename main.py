@@ -2,8 +2,17 @@ import sys
 import os
 import subprocess
 import importlib
+try:
+    import importlib.metadata
+except ImportError:  # Python 3.7: pinning falls back to bare names
+    pass
 import platform
 import time
+import re
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # ===== IMPROVED DEPENDENCY INSTALLATION SYSTEM =====
@@ -35,11 +44,20 @@ class DependencyManager:
             'ifaddr': 'ifaddr',
             'scapy': 'scapy',
             'dnspython': 'dns',
+            'pyzbar': 'pyzbar',
+            'numpy': 'numpy',
             'aiohttp': 'aiohttp',
+            'httpx': 'httpx',
+            'h2': 'h2',
         }
         
         self.install_log = []
         
+        # Local wheel cache for offline installs (see build_wheelhouse)
+        self.wheelhouse = os.environ.get('KINGZVPN_WHEELHOUSE') or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'wheelhouse'
+        )
+        
     def check_system_requirements(self):
         """Check system compatibility"""
         system = platform.system()
@@ -177,6 +195,14 @@ class DependencyManager:
         if not pip_cmd:
             print("❌ Error: Could not find pip. Please install pip first.")
             return False
+        
+        # A verified wheelhouse makes the install independent of PyPI
+        if os.path.exists(self.wheelhouse_lock()):
+            print(f"📦 Installing offline from wheelhouse: {self.wheelhouse}")
+            success, failures = self.install_from_wheelhouse()
+            for item, error in failures:
+                print(f"   • {item}: {error}")
+            return success
             
         # Update pip first (but don't fail if it doesn't work)
         print("🔄 Checking pip version...")
@@ -270,27 +296,36 @@ class DependencyManager:
         return len(failed_packages) == 0
     
     def create_requirements_file(self, filename='requirements.txt'):
-        """Create requirements.txt file"""
+        """Create requirements.txt file (pinned; with hashes when a wheelhouse exists)"""
         try:
+            locked = self.lock_wheelhouse_entries()
             with open(filename, 'w', encoding='utf-8') as f:
                 f.write("# KingzVPN Pro - Requirements\n")
                 f.write("# Generated automatically\n")
                 f.write(f"# Python {platform.python_version()}\n")
                 f.write(f"# System: {platform.system()}\n\n")
                 
+                if locked:
+                    # Full dependency closure, usable with --require-hashes
+                    f.write(f"# Locked from wheelhouse ({len(locked)} distributions)\n")
+                    for name, version, hashes in locked:
+                        f.write(f"{name}=={version} " + ' '.join(f"--hash=sha256:{h}" for h in hashes) + "\n")
+                    print(f"✅ Requirements file created: {filename}")
+                    return True
+                
                 f.write("# Required packages\n")
                 for pkg in self.required_packages.keys():
-                    f.write(f"{pkg}\n")
+                    f.write(f"{self._pinned(pkg)}\n")
                 
                 # Add platform-specific packages
                 if platform.system() == 'Windows':
                     f.write("\n# Windows-specific packages\n")
                     for pkg in self.windows_packages.keys():
-                        f.write(f"{pkg}\n")
+                        f.write(f"{self._pinned(pkg)}\n")
                 
                 f.write("\n# Optional packages\n")
                 for pkg in self.optional_packages.keys():
-                    f.write(f"#{pkg}\n")
+                    f.write(f"#{self._pinned(pkg)}\n")
             
             print(f"✅ Requirements file created: {filename}")
             return True
@@ -298,6 +333,223 @@ class DependencyManager:
         except Exception as e:
             print(f"❌ Failed to create requirements file: {e}")
             return False
+    
+    # === OFFLINE WHEELHOUSE ===
+    @staticmethod
+    def _canonical(name):
+        return re.sub(r'[-_.]+', '-', name).lower()
+    
+    @staticmethod
+    def _pinned(package):
+        """package==installed_version, or the bare name when not installed"""
+        try:
+            return f"{package}=={importlib.metadata.version(package)}"
+        except Exception:
+            return package
+    
+    @staticmethod
+    def _sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def wheelhouse_lock(self):
+        return os.path.join(self.wheelhouse, 'requirements.lock')
+    
+    def wheelhouse_files(self):
+        """{(name, version): [wheel paths]} for every wheel in the wheelhouse"""
+        files = {}
+        if not os.path.isdir(self.wheelhouse):
+            return files
+        for filename in sorted(os.listdir(self.wheelhouse)):
+            if not filename.endswith('.whl'):
+                continue
+            name, version = filename.split('-')[:2]
+            files.setdefault((self._canonical(name), version), []).append(
+                os.path.join(self.wheelhouse, filename)
+            )
+        return files
+    
+    def lock_wheelhouse_entries(self, max_workers=4):
+        """[(name, version, [sha256, ...])] for the wheelhouse, hashed in parallel"""
+        files = self.wheelhouse_files()
+        paths = [path for group in files.values() for path in group]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            hashes = dict(zip(paths, executor.map(self._sha256, paths)))
+        return [(name, version, sorted(hashes[path] for path in group))
+                for (name, version), group in sorted(files.items())]
+    
+    def read_wheelhouse_lock(self):
+        """Parse requirements.lock into [(name, version, set of hashes, line)]"""
+        entries = []
+        with open(self.wheelhouse_lock(), encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                spec, *options = line.split()
+                name, _, version = spec.partition('==')
+                hashes = {o.split(':', 1)[1] for o in options if o.startswith('--hash=sha256:')}
+                entries.append((self._canonical(name), version, hashes, line))
+        return entries
+    
+    def build_wheelhouse(self, include_optional=False, max_workers=4, timeout=600):
+        """Download/build wheels for all packages (and their dependencies), then lock them.
+        
+        Each package builds into its own staging directory, so parallel pip
+        processes never write the same shared dependency at once. One offline
+        `pip wheel` over the staged wheels then resolves a single consistent
+        closure, and the wheelhouse is replaced by exactly that closure: no
+        stale versions are left behind to be locked.
+        Needs network once; afterwards installs run with --no-index.
+        """
+        pip_cmd = self.get_install_command()
+        if not pip_cmd:
+            return False, [("pip", "Could not find pip")]
+        os.makedirs(self.wheelhouse, exist_ok=True)
+        
+        packages = list(self.required_packages)
+        if platform.system() == 'Windows':
+            packages += list(self.windows_packages)
+        if include_optional:
+            packages += list(self.optional_packages)
+        
+        staging = tempfile.mkdtemp(prefix='.build-', dir=self.wheelhouse)
+        
+        def run(cmd):
+            try:
+                subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=timeout)
+                return None
+            except subprocess.TimeoutExpired:
+                return f"Timeout (>{timeout}s)"
+            except subprocess.CalledProcessError as e:
+                return e.stderr.strip()[-200:]
+        
+        def build(package):
+            wheel_dir = os.path.join(staging, self._canonical(package))
+            return package, run(pip_cmd + ['wheel', '--wheel-dir', wheel_dir, '--quiet', package])
+        
+        try:
+            print(f"📦 Building wheelhouse for {len(packages)} packages in {self.wheelhouse}...")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                failures = [(pkg, error) for pkg, error in executor.map(build, packages) if error]
+            for pkg, error in failures:
+                self.install_log.append(f"❌ Wheel build failed: {pkg}: {error}")
+                print(f"   ❌ {pkg}: {error}")
+            
+            built = [pkg for pkg in packages if pkg not in dict(failures)]
+            if not built:
+                return False, failures
+            closure = os.path.join(staging, 'closure')
+            cmd = pip_cmd + ['wheel', '--no-index', '--wheel-dir', closure, '--quiet']
+            for pkg in built:
+                cmd += ['--find-links', os.path.join(staging, self._canonical(pkg))]
+            error = run(cmd + built)
+            if error:
+                # Leave the previous wheelhouse and lock as they were
+                self.install_log.append(f"❌ Wheelhouse closure failed: {error}")
+                print(f"   ❌ closure: {error}")
+                return False, failures + [("closure", error)]
+            
+            resolved = {filename for filename in os.listdir(closure) if filename.endswith('.whl')}
+            for filename in os.listdir(self.wheelhouse):
+                if filename.endswith('.whl') and filename not in resolved:
+                    os.remove(os.path.join(self.wheelhouse, filename))
+            for filename in resolved:
+                os.replace(os.path.join(closure, filename), os.path.join(self.wheelhouse, filename))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        
+        self.create_requirements_file(self.wheelhouse_lock())
+        return not failures, failures
+    
+    def verify_wheelhouse(self, max_workers=4):
+        """Check every locked distribution is present and matches its hashes. Returns problems"""
+        try:
+            entries = self.read_wheelhouse_lock()
+        except OSError as e:
+            return [f"No wheelhouse lock: {e}"]
+        files = self.wheelhouse_files()
+        problems = []
+        to_hash = []
+        for name, version, hashes, _ in entries:
+            paths = files.get((name, version))
+            if not paths:
+                problems.append(f"{name}=={version}: wheel missing")
+            else:
+                to_hash.extend((name, version, hashes, path) for path in paths)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            digests = executor.map(self._sha256, [item[3] for item in to_hash])
+            for (name, version, hashes, path), digest in zip(to_hash, digests):
+                if digest not in hashes:
+                    problems.append(f"{name}=={version}: hash mismatch for {os.path.basename(path)}")
+        return problems
+    
+    def install_from_wheelhouse(self, max_workers=None, target=None, timeout=300):
+        """Install the locked closure offline, split over up to max_workers parallel pip processes.
+        
+        Returns (success, [(requirement, error)]).
+        """
+        # pip is CPU-bound while unpacking: more processes than cores only adds start-up cost
+        max_workers = max_workers or min(4, os.cpu_count() or 1)
+        pip_cmd = self.get_install_command()
+        if not pip_cmd:
+            return False, [("pip", "Could not find pip")]
+        problems = self.verify_wheelhouse(max_workers)
+        if problems:
+            for problem in problems:
+                self.install_log.append(f"❌ Wheelhouse: {problem}")
+            return False, [("wheelhouse", problem) for problem in problems]
+        
+        pending = []
+        for name, version, _, line in self.read_wheelhouse_lock():
+            if target is None:
+                try:
+                    if importlib.metadata.version(name) == version:
+                        continue
+                except Exception:
+                    pass
+            pending.append((f"{name}=={version}", line))
+        if not pending:
+            print("🎉 Wheelhouse already installed")
+            return True, []
+        
+        # The lock holds the whole closure, so --no-deps shards can run side by side.
+        # pip start-up dominates for small wheels: one process per shard, not per wheel.
+        base_cmd = pip_cmd + ['install', '--no-index', '--find-links', self.wheelhouse,
+                              '--no-deps', '--require-hashes', '--disable-pip-version-check',
+                              '--no-warn-script-location', '--quiet']
+        if target:
+            base_cmd += ['--target', target]
+        
+        def install(shard):
+            requirement = ', '.join(req for req, _ in shard)
+            with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+                f.write(''.join(line + '\n' for _, line in shard))
+            try:
+                subprocess.run(base_cmd + ['-r', f.name], check=True, capture_output=True,
+                               text=True, timeout=timeout)
+                return requirement, None
+            except subprocess.TimeoutExpired:
+                return requirement, f"Timeout (>{timeout}s)"
+            except subprocess.CalledProcessError as e:
+                return requirement, e.stderr.strip()[-200:]
+            finally:
+                os.remove(f.name)
+        
+        print(f"📦 Installing {len(pending)} distributions offline...")
+        shards = [pending[i::max_workers] for i in range(min(max_workers, len(pending)))]
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            results = list(executor.map(install, shards))
+        failures = [(req, error) for req, error in results if error]
+        for req, error in results:
+            self.install_log.append(f"❌ Failed: {req}: {error}" if error else f"✅ Success: {req}")
+        failed = sum(len(shard) for shard, (_, error) in zip(shards, results) if error)
+        print(f"✅ Installed {len(pending) - failed}/{len(pending)} from wheelhouse")
+        return not failures, failures
 
 # ===== ENHANCED VPN CLIENT WITH BETTER DEPENDENCY HANDLING =====
 import customtkinter as ctk
@@ -319,21 +571,43 @@ import sys
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, List, Any, Union, Tuple
 from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+from collections import Counter, OrderedDict, deque
+import io
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 import socket
+import errno
+import asyncio
+import stat
+import ipaddress
+import ssl
 import platform
 import webbrowser
+from urllib.parse import urlsplit, unquote, parse_qs, quote, urlencode
 import sqlite3
 import hashlib
+import heapq
+import zlib
+import struct
+import mmap
+import marshal
+from array import array
+import bisect
+import itertools
+import math
 import secrets
+import fnmatch
+import random
 import string
 import zipfile
 import tempfile
 import shutil
+import warnings
 
 # Import available libraries with fallbacks
 CRYPTO_AVAILABLE = False
@@ -343,6 +617,10 @@ PING3_AVAILABLE = False
 NETIFACES_AVAILABLE = False
 PYPERCLIP_AVAILABLE = False
 WIN32CLIPBOARD_AVAILABLE = False
+DNSPYTHON_AVAILABLE = False
+PYZBAR_AVAILABLE = False
+NUMPY_AVAILABLE = False
+HTTPX_AVAILABLE = False
 
 try:
     from cryptography.fernet import Fernet
@@ -396,8 +674,35 @@ try:
 except ImportError as e:
     print("❌ win32clipboard not available")
 
-# Disable urllib3 warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+try:
+    import dns.exception
+    import dns.resolver
+    DNSPYTHON_AVAILABLE = True
+    print("✅ dnspython available")
+except ImportError as e:
+    print("❌ dnspython not available")
+
+try:
+    from pyzbar.pyzbar import decode as pyzbar_decode
+    PYZBAR_AVAILABLE = True
+    print("✅ pyzbar available")
+except ImportError as e:
+    print("❌ pyzbar not available")
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+    print("✅ numpy available")
+except ImportError as e:
+    print("❌ numpy not available")
+
+try:
+    import httpx
+    import h2
+    HTTPX_AVAILABLE = True
+    print("✅ httpx (HTTP/2) available")
+except ImportError as e:
+    print("❌ httpx (HTTP/2) not available")
 
 # Setup app directories
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -412,180 +717,5392 @@ for d in [CONFIG_DIR, LOG_DIR, DB_DIR, CACHE_DIR]:
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
-class AdvancedVPNClient:
-    def __init__(self, auto_install_deps=True):
-        print("🚀 Initializing KingzVPN Pro...")
-        
-        # Initialize dependency manager
-        self.dep_manager = DependencyManager()
-        
-        # Check and install dependencies if needed
-        if auto_install_deps:
-            self.install_missing_dependencies()
-        
-        # Now initialize the main application
-        self.app = ctk.CTk()
-        self.setup_window()
-        
-        # Initialize all UI frames first
-        self.quick_connect_frame = None
-        self.configs_frame = None
-        self.speed_frame = None
-        self.settings_frame = None
-        self.tools_frame = None
-        self.deps_frame = None
-        self.main_content = None
-        self.sidebar = None
-        
-        self.configs = []
-        self.current_config = None
-        self.vpn_process = None
-        self.is_connected = False
-        
-        self.connection_lock = threading.Lock()
-        self.process_output = []
-        self.openvpn_config_path = CONFIG_DIR
+# ===== SERVER / CONFIG SEARCH INDEX =====
+class ServerSearchIndex:
+    """Incremental in-memory search index over servers and configs"""
 
-        # Enhanced events system
-        self.events = {
-            'stats_stop': Event(),
-            'monitor_stop': Event(),
-            'process_stop': Event(),
-            'scan_stop': Event(),
-            'update_stop': Event()
-        }
-        
-        self.active_threads = {}
-        self.stats_queue = Queue(maxsize=50)
-        
-        self.speed_widgets = {}
-        self.nav_buttons = {}
-        
-        # Performance optimization
-        self.last_stats_update = 0
-        self.stats_update_interval = 0.5
-        
-        # Enhanced functionality storage
-        self.network_devices = []
-        self.port_scan_results = []
-        self.traffic_data = []
-        self.connection_history = []
-        self.favorite_servers = []
-        self.auto_connect_rules = []
-        
-        self.setup_logging()
-        self.setup_database()
-        self.load_user_preferences()
-        
-        # Enhanced color scheme
-        self.colors = {
-            "primary": "#2b825b",
-            "secondary": "#2196F3", 
-            "success": "#4CAF50",
-            "warning": "#FF9800",
-            "danger": "#ff6b6b",
-            "dark_bg": "#1a1a1a",
-            "card_bg": "#2d2d2d",
-            "text_primary": "#ffffff",
-            "text_secondary": "#b0b0b0"
-        }
-        
-        self.load_data()
-        self.create_ui()
-        
-    def install_missing_dependencies(self):
-        """Install missing dependencies automatically"""
-        print("\n" + "=" * 50)
-        print("🔍 Checking dependencies...")
-        print("=" * 50)
-        
-        # First check system requirements
-        if not self.dep_manager.check_system_requirements():
-            print("❌ System requirements not met")
-            response = input("Continue anyway? (y/n): ")
-            if response.lower() not in ['y', 'yes']:
-                sys.exit(1)
-        
-        missing_packages = []
-        for pkg, import_name in self.dep_manager.required_packages.items():
-            if not self.dep_manager.is_package_installed(pkg):
-                missing_packages.append(pkg)
-        
-        # Check Windows packages
-        if platform.system() == 'Windows':
-            for pkg, import_name in self.dep_manager.windows_packages.items():
-                if not self.dep_manager.is_package_installed(pkg):
-                    missing_packages.append(pkg)
-        
-        if missing_packages:
-            print(f"❌ Missing {len(missing_packages)} packages: {', '.join(missing_packages)}")
-            print("\n💡 Some features may not work without these packages.")
-            
-            response = input("🤔 Install missing dependencies automatically? (y/n): ")
-            
-            if response.lower() in ['y', 'yes']:
-                print("🚀 Starting automatic installation...")
-                success = self.dep_manager.install_all_dependencies()
-                
-                if success:
-                    print("✅ All dependencies installed successfully!")
-                    print("🔄 Restarting application to load new dependencies...")
-                    time.sleep(2)
-                    os.execv(sys.executable, [sys.executable] + sys.argv)
-                else:
-                    print("❌ Some dependencies failed to install.")
-                    response = input("Continue anyway? (y/n): ")
-                    if response.lower() not in ['y', 'yes']:
-                        sys.exit(1)
-            else:
-                print("⚠️  Continuing with missing dependencies...")
-                print("💡 You can install dependencies later from the Dependencies tab.")
+    SEARCH_FIELDS = ('name', 'country', 'protocol', 'type', 'address')
+    NARROW_LIMIT = 2000
+    MAX_TRIGRAMS = 3
+
+    def __init__(self):
+        self.entries = {}      # doc id -> entry
+        self.texts = {}        # doc id -> normalized haystack
+        self.doc_ids = {}      # external key -> doc id
+        self.trigrams = {}     # trigram -> set of doc ids
+        self.prefixes = {}     # 1-2 char word prefix -> set of doc ids
+        self.tags = {}         # tag -> set of doc ids
+        self.doc_tags = {}     # doc id -> normalized tags it was indexed under
+        self.next_id = 0
+        self.lock = Lock()
+
+        # Last query result, reused when the user keeps typing
+        self._last_query = None
+        self._last_result = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def normalize(text):
+        """Lowercase and collapse whitespace"""
+        return ' '.join(str(text).lower().split())
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _haystack(self, entry):
+        parts = [entry.get(field) for field in self.SEARCH_FIELDS]
+        return self.normalize(' '.join(str(p) for p in parts if p))
+
+    def add(self, key, entry, tags=None):
+        """Add or replace a single entry"""
+        with self.lock:
+            if key in self.doc_ids:
+                self._remove_locked(key)
+
+            doc_id = self.next_id
+            self.next_id += 1
+
+            text = self._haystack(entry)
+            self.doc_ids[key] = doc_id
+            self.entries[doc_id] = entry
+            self.texts[doc_id] = text
+
+            for gram in self._trigrams(text):
+                self.trigrams.setdefault(gram, set()).add(doc_id)
+            for word in text.split():
+                for size in (1, 2):
+                    if len(word) >= size:
+                        self.prefixes.setdefault(word[:size], set()).add(doc_id)
+
+            doc_tags = {self.normalize(tag) for tag in (tags if tags is not None else entry.get('tags', ()))}
+            self.doc_tags[doc_id] = doc_tags
+            for tag in doc_tags:
+                self.tags.setdefault(tag, set()).add(doc_id)
+
+            self._last_query = None
+
+    def add_many(self, items):
+        """Add (key, entry) pairs"""
+        for key, entry in items:
+            self.add(key, entry)
+
+    def remove(self, key):
+        """Remove an entry by its external key"""
+        with self.lock:
+            removed = self._remove_locked(key)
+            self._last_query = None
+            return removed
+
+    def _remove_locked(self, key):
+        doc_id = self.doc_ids.pop(key, None)
+        if doc_id is None:
+            return False
+
+        text = self.texts.pop(doc_id)
+        self.entries.pop(doc_id)
+
+        for gram in self._trigrams(text):
+            self._discard(self.trigrams, gram, doc_id)
+        for word in text.split():
+            for size in (1, 2):
+                if len(word) >= size:
+                    self._discard(self.prefixes, word[:size], doc_id)
+        for tag in self.doc_tags.pop(doc_id, ()):
+            self._discard(self.tags, tag, doc_id)
+        return True
+
+    @staticmethod
+    def _discard(postings, token, doc_id):
+        bucket = postings.get(token)
+        if bucket is not None:
+            bucket.discard(doc_id)
+            if not bucket:
+                del postings[token]
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            for table in (self.entries, self.texts, self.doc_ids,
+                          self.trigrams, self.prefixes, self.tags, self.doc_tags):
+                table.clear()
+            self._last_query = None
+
+    # === QUERYING ===
+    @staticmethod
+    def _is_tag(term):
+        return term.startswith(('#', 'tag:'))
+
+    @staticmethod
+    def _tag(term):
+        return term.split(':', 1)[-1].lstrip('#')
+
+    def _candidates(self, term, within=None):
+        """Superset of doc ids containing term (confirmed later by _verify)"""
+        if self._is_tag(term):
+            bucket = self.tags.get(self._tag(term), ())
+        elif len(term) < 3:
+            bucket = self.prefixes.get(term, ())
         else:
-            print("✅ All dependencies are installed!")
-    
-    def setup_window(self):
-        self.app.title("KingzVPN Pro - Advanced VPN Client")
-        self.app.geometry("1200x800")
-        self.app.minsize(1000, 700)
-        
-        # Center window
-        self.app.update_idletasks()
-        screen_width = self.app.winfo_screenwidth()
-        screen_height = self.app.winfo_screenheight()
-        x = (screen_width - 1200) // 2
-        y = (screen_height - 800) // 2
-        self.app.geometry(f"1200x800+{x}+{y}")
-        
-        # Set window icon (if available)
-        try:
-            self.app.iconbitmap(default='icon.ico')
-        except:
-            pass
+            # The rarest few trigrams already cut the set down; the
+            # substring check removes whatever false positives remain
+            grams = sorted(self._trigrams(term), key=lambda g: len(self.trigrams.get(g, ())))
+            result = within
+            for gram in grams[:self.MAX_TRIGRAMS]:
+                bucket = self.trigrams.get(gram)
+                if not bucket:
+                    return set()
+                result = set(bucket) if result is None else result & bucket
+                if not result:
+                    break
+            return result
 
-    # === ENHANCED DEPENDENCY MANAGEMENT UI ===
-    def show_dependency_manager(self):
-        """Show enhanced dependency management dialog"""
-        dialog = ctk.CTkToplevel(self.app)
-        dialog.title("Dependency Manager")
-        dialog.geometry("700x500")
-        dialog.transient(self.app)
-        dialog.grab_set()
-        
-        # Title
-        title = ctk.CTkLabel(dialog, text="📦 Dependency Manager", 
-                           font=("Arial", 20, "bold"))
-        title.pack(pady=10)
-        
-        # System info
-        info_frame = ctk.CTkFrame(dialog)
-        info_frame.pack(fill="x", padx=20, pady=5)
-        
-        sys_info = f"Python {platform.python_version()} | {platform.system()} {platform.release()}"
-        ctk.CTkLabel(info_frame, text=sys_info, font=("Arial", 11)).pack(pady=5)
-        
-        # Status summary
-        summary_frame = ctk.CTkFrame(dialog)
-        summary_frame.pack(fill="x", padx=20, pady=5)
+        return set(bucket) if within is None else within.intersection(bucket)
+
+    def _verify(self, doc_id, terms):
+        text = self.texts.get(doc_id)
+        if text is None:
+            return False
+        for term in terms:
+            if self._is_tag(term):
+                if self._tag(term) not in self.doc_tags.get(doc_id, ()):
+                    return False
+            elif len(term) < 3:
+                if not (text.startswith(term) or f' {term}' in text):
+                    return False
+            elif term not in text:
+                return False
+        return True
+
+    def _fuzzy(self, terms, threshold=0.6):
+        """Rank entries sharing most trigrams with the query (typo tolerant)"""
+        grams = set()
+        for term in terms:
+            grams |= self._trigrams(term)
+        if len(grams) < 2:
+            return []
+
+        scores = Counter()
+        for gram in grams:
+            scores.update(self.trigrams.get(gram, ()))
+
+        needed = max(2, int(len(grams) * threshold))
+        hits = [doc_id for doc_id, score in scores.items() if score >= needed]
+        hits.sort(key=lambda doc_id: (-scores[doc_id], doc_id))
+        return hits
+
+    def _narrows(self, last, terms):
+        """True when everything terms match also matched the query last (terms extend it)"""
+        previous = last.split()
+        old, new = previous[-1], terms[len(previous) - 1]
+        if old == new:
+            return True
+        if self._is_tag(old) or self._is_tag(new):
+            return False    # tags match exactly: "#prem" -> "#premium" widens
+        # 1-2 chars match word prefixes, longer terms substrings anywhere: "fu" -> "fur" widens
+        return len(old) >= 3 or len(new) < 3
+
+    def _match(self, query, terms):
+        """Return (doc ids, exact) - exact sets are already verified"""
+        if not terms:
+            return set(self.entries), True
+
+        # Typing forward only narrows the previous (small, exact) result set
+        last = self._last_query
+        if last and self._last_result is not None and query.startswith(last) and self._narrows(last, terms):
+            return {d for d in self._last_result if self._verify(d, terms)}, True
+
+        result = None
+        for term in sorted(terms, key=len, reverse=True):
+            result = self._candidates(term, result)
+            if not result:
+                return set(), True
+
+        if len(result) <= self.NARROW_LIMIT:
+            return {d for d in result if self._verify(d, terms)}, True
+        return result, False
+
+    def search(self, query, page_size=50, fuzzy=True):
+        """Yield result pages (lists of entries) for a query"""
+        query = self.normalize(query)
+        terms = query.split()
+
+        with self.lock:
+            matches, exact = self._match(query, terms)
+            self._last_query = query
+            self._last_result = matches if exact and len(matches) <= self.NARROW_LIMIT else None
+
+            if exact and not matches and fuzzy:
+                ordered, exact = self._fuzzy(terms), True
+            else:
+                ordered = sorted(matches)
+            entries = self.entries
+            texts = self.texts
+
+        page = []
+        for doc_id in ordered:
+            # Large candidate sets are verified lazily, one page at a time
+            if not exact and not self._verify(doc_id, terms):
+                continue
+            entry = entries.get(doc_id)
+            if entry is None or doc_id not in texts:
+                continue
+            page.append(entry)
+            if len(page) == page_size:
+                yield page
+                page = []
+
+        if page or not ordered:
+            yield page
+
+    def first_page(self, query, page_size=50):
+        """Convenience: first result page only"""
+        return next(self.search(query, page_size), [])
+
+    # === SNAPSHOT ===
+    def export_state(self):
+        """Plain-data view of the index for SessionSnapshot (entries are stored by key)"""
+        with self.lock:
+            return {
+                'keys': [(doc_id, key) for key, doc_id in self.doc_ids.items()],
+                'texts': self.texts,
+                'trigrams': self.trigrams,
+                'prefixes': self.prefixes,
+                'tags': self.tags,
+                'next_id': self.next_id,
+            }
+
+    def restore_state(self, state, entries):
+        """Adopt an exported state. entries maps external key -> entry and must match it exactly"""
+        doc_entries, doc_ids = {}, {}
+        for doc_id, key in state['keys']:
+            entry = entries.get(key)
+            if entry is None:
+                return False
+            doc_entries[doc_id] = entry
+            doc_ids[key] = doc_id
+        if len(doc_ids) != len(entries):
+            return False
+
+        with self.lock:
+            if self.doc_ids:
+                return False
+            self.entries = doc_entries
+            self.doc_ids = doc_ids
+            self.texts = state['texts']
+            self.trigrams = state['trigrams']
+            self.prefixes = state['prefixes']
+            self.tags = state['tags']
+            self.next_id = state['next_id']
+            self._last_query = None
+        return True
+
+# ===== CONFIG LINKS AND STORE =====
+SUPPORTED_LINK_SCHEMES = ('vless', 'vmess', 'trojan', 'ss', 'hysteria2', 'hy2', 'tuic')
+PROTOCOL_ALIASES = {'ss': 'shadowsocks', 'hy2': 'hysteria2'}
+
+
+def config_hash(text):
+    """Content hash used to identify a config"""
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()[:32]
+
+
+def b64decode_padded(data):
+    """Decode (urlsafe) base64 that may be missing its padding"""
+    data = data.strip().replace('-', '+').replace('_', '/')
+    data += '=' * (-len(data) % 4)
+    return base64.b64decode(data)
+
+
+def country_from_name(name):
+    """Guess ISO country code from a flag emoji in the server name"""
+    letters = [chr(ord(ch) - 0x1F1E6 + ord('A')) for ch in name
+               if 0x1F1E6 <= ord(ch) <= 0x1F1FF]
+    return ''.join(letters[:2]) if len(letters) >= 2 else ''
+
+
+def parse_config_link(uri):
+    """Parse a share link (vless://, vmess://, ...) into a config dict"""
+    uri = uri.strip()
+    scheme, sep, rest = uri.partition('://')
+    scheme = scheme.lower()
+    if not sep or scheme not in SUPPORTED_LINK_SCHEMES:
+        return None
+
+    try:
+        if scheme == 'vmess':
+            data = json.loads(b64decode_padded(rest))
+            name = str(data.get('ps', ''))
+            address = data.get('add')
+            port = int(data.get('port', 0))
+            tags = [data.get('net'), data.get('tls')]
+        else:
+            parsed = urlsplit(uri)
+            address = parsed.hostname
+            port = parsed.port
+            if scheme == 'ss' and not address:
+                # Legacy form: ss://BASE64(method:password@host:port)#name
+                decoded = b64decode_padded(parsed.netloc).decode('utf-8')
+                host_part = decoded.rpartition('@')[2]
+                address, _, port = host_part.rpartition(':')
+                port = int(port)
+            name = unquote(parsed.fragment)
+            params = parse_qs(parsed.query)
+            tags = [params.get('type', [None])[0], params.get('security', [None])[0]]
+    except (ValueError, TypeError, UnicodeDecodeError, JSONDecodeError):
+        return None
+
+    if not address or not port:
+        return None
+
+    return {
+        'hash': config_hash(uri),
+        'uri': uri,
+        'protocol': PROTOCOL_ALIASES.get(scheme, scheme),
+        'name': name or f"{address}:{port}",
+        'address': address,
+        'port': int(port),
+        'country': country_from_name(name),
+        'tags': [t for t in tags if t and t != 'none'],
+    }
+
+
+def decode_subscription_payload(text):
+    """Split a subscription body (plain or base64) into share links"""
+    text = text.strip()
+    if '://' not in text:
+        try:
+            text = b64decode_padded(''.join(text.split())).decode('utf-8', 'ignore')
+        except ValueError:
+            return []
+    return [line.strip() for line in text.splitlines() if '://' in line]
+
+
+def node_key(config):
+    """Identity of a node inside its subscription (hash changes, key does not)"""
+    return f"{config['protocol']}|{config['address']}|{config['port']}|{config['name']}"
+
+
+class ConfigStore:
+    """SQLite-backed store of imported configs and subscriptions"""
+
+    COLUMNS = ('hash', 'subscription', 'node_key', 'name', 'protocol',
+               'address', 'port', 'country', 'tags', 'uri')
+
+    def __init__(self, db_path):
+        self.lock = Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS configs (
+                    hash TEXT PRIMARY KEY,
+                    subscription TEXT,
+                    node_key TEXT,
+                    name TEXT,
+                    protocol TEXT,
+                    address TEXT,
+                    port INTEGER,
+                    country TEXT,
+                    tags TEXT,
+                    uri TEXT,
+                    added DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    url TEXT PRIMARY KEY,
+                    interval INTEGER,
+                    etag TEXT,
+                    last_modified TEXT,
+                    payload_hash TEXT,
+                    last_checked REAL,
+                    failures INTEGER DEFAULT 0
+                )
+            ''')
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_configs_subscription ON configs (subscription)"
+            )
+            self.conn.commit()
+
+    def _row_to_config(self, row):
+        config = dict(zip(self.COLUMNS, row))
+        config['tags'] = [t for t in (config['tags'] or '').split(',') if t]
+        return config
+
+    def _config_row(self, config, subscription):
+        return (config['hash'], subscription, config.get('node_key') or node_key(config),
+                config['name'], config['protocol'], config['address'], config['port'],
+                config.get('country', ''), ','.join(config.get('tags', ())), config['uri'])
+
+    def fingerprint(self):
+        """Cheap change marker: row count, last rowid and rowid sum"""
+        with self.lock:
+            return tuple(self.conn.execute(
+                "SELECT count(*), max(rowid), total(rowid) FROM configs"
+            ).fetchone())
+
+    def all(self):
+        """Return every stored config"""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM configs ORDER BY added, rowid"
+            ).fetchall()
+        return [self._row_to_config(row) for row in rows]
+
+    def contains(self, hash_):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM configs WHERE hash = ?", (hash_,)
+            ).fetchone() is not None
+
+    def add_many(self, configs, subscription=None):
+        """Insert configs, skipping duplicates. Returns the ones added"""
+        added = []
+        with self.lock:
+            for config in configs:
+                cursor = self.conn.execute(
+                    f"INSERT OR IGNORE INTO configs ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    self._config_row(config, subscription)
+                )
+                if cursor.rowcount:
+                    added.append(config)
+            self.conn.commit()
+        return added
+
+    def by_subscription(self, subscription):
+        """Return the configs imported from one subscription"""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM configs WHERE subscription = ? ORDER BY added, rowid",
+                (subscription,)
+            ).fetchall()
+        return [self._row_to_config(row) for row in rows]
+
+    def remove(self, hash_):
+        with self.lock:
+            self.conn.execute("DELETE FROM configs WHERE hash = ?", (hash_,))
+            self.conn.commit()
+
+    def apply_delta(self, subscription, configs):
+        """Sync a subscription to configs touching only changed rows.
+
+        Returns (added, removed, changed) where changed holds (old, new) pairs.
+        """
+        incoming = {}
+        for config in configs:
+            key = node_key(config)
+            # Providers sometimes repeat identical names; keep them apart
+            suffix = 1
+            while key in incoming:
+                suffix += 1
+                key = f"{node_key(config)}#{suffix}"
+            config['node_key'] = key
+            incoming[key] = config
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM configs WHERE subscription = ?",
+                (subscription,)
+            ).fetchall()
+            existing = {row[2]: self._row_to_config(row) for row in rows}
+
+            added, removed, changed = [], [], []
+            for key, old in existing.items():
+                new = incoming.get(key)
+                if new is None:
+                    removed.append(old)
+                elif new['hash'] != old['hash']:
+                    changed.append((old, new))
+
+            for key, new in incoming.items():
+                if key not in existing:
+                    added.append(new)
+
+            self.conn.executemany(
+                "DELETE FROM configs WHERE hash = ?",
+                [(c['hash'],) for c in removed] + [(old['hash'],) for old, _ in changed]
+            )
+
+            inserted = []
+            for config in added + [new for _, new in changed]:
+                cursor = self.conn.execute(
+                    f"INSERT OR IGNORE INTO configs ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    self._config_row(config, subscription)
+                )
+                if cursor.rowcount:
+                    inserted.append(config['hash'])
+            self.conn.commit()
+
+        # Links already owned by another subscription are not re-added; a
+        # changed node whose new link is one of those is gone from this one
+        inserted = set(inserted)
+        added = [c for c in added if c['hash'] in inserted]
+        removed += [old for old, new in changed if new['hash'] not in inserted]
+        changed = [(old, new) for old, new in changed if new['hash'] in inserted]
+        return added, removed, changed
+
+    # === SUBSCRIPTIONS ===
+    def subscriptions(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, interval, etag, last_modified, payload_hash, last_checked, failures "
+                "FROM subscriptions"
+            ).fetchall()
+        keys = ('url', 'interval', 'etag', 'last_modified', 'payload_hash', 'last_checked', 'failures')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def save_subscription(self, sub):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO subscriptions "
+                "(url, interval, etag, last_modified, payload_hash, last_checked, failures) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sub['url'], sub['interval'], sub.get('etag'), sub.get('last_modified'),
+                 sub.get('payload_hash'), sub.get('last_checked'), sub.get('failures', 0))
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# ===== SUBSCRIPTION AUTO-REFRESH =====
+class SubscriptionUpdater:
+    """Background scheduler keeping subscriptions up to date"""
+
+    DEFAULT_INTERVAL = 6 * 3600
+    MIN_INTERVAL = 60
+    JITTER = 0.1
+    BACKOFF_BASE = 30
+    DEFER_DELAY = 300
+
+    def __init__(self, store, stop_event, on_delta=None, on_error=None, session=None, governor=None):
+        self.store = store
+        self.stop_event = stop_event
+        self.on_delta = on_delta
+        self.on_error = on_error
+        self.session = session or HTTPClient(timeout=30)
+        self.governor = governor
+        self.logger = logging.getLogger('KingzVPNPro')
+
+        self.subs = {sub['url']: sub for sub in store.subscriptions()}
+        self.due = []          # heap of (due time, url)
+        self.wake = Event()
+        self.lock = Lock()
+        self.thread = None
+
+        now = time.time()
+        for sub in self.subs.values():
+            last = sub.get('last_checked') or 0
+            self._schedule(sub, max(now, last + self._jittered(sub['interval'])))
+
+    def _schedule(self, sub, due):
+        # Only the latest entry per subscription is live; older ones are skipped
+        sub['next_due'] = due
+        heapq.heappush(self.due, (due, sub['url']))
+
+    def _jittered(self, interval):
+        return interval * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name='subscription-updater', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+
+    def add(self, url, interval=None, refresh_now=True):
+        """Register a subscription (or update its interval) and schedule it"""
+        interval = max(self.MIN_INTERVAL, int(interval or self.DEFAULT_INTERVAL))
+        with self.lock:
+            sub = self.subs.get(url) or {'url': url, 'failures': 0}
+            sub['interval'] = interval
+            self.subs[url] = sub
+            self.store.save_subscription(sub)
+            self._schedule(sub, time.time() if refresh_now else time.time() + self._jittered(interval))
+        self.wake.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                timeout = self.due[0][0] - time.time() if self.due else None
+
+            if timeout is None or timeout > 0:
+                self.wake.wait(timeout)
+                self.wake.clear()
+                continue
+
+            with self.lock:
+                due, url = heapq.heappop(self.due)
+                sub = self.subs.get(url)
+            if sub is None or sub.get('next_due') != due:
+                continue
+
+            # Metered link, battery or a busy machine: wait, but never past one extra interval
+            if self.governor is not None and not self.governor.heavy_allowed():
+                if time.time() - sub.setdefault('deferred_since', due) < sub['interval']:
+                    with self.lock:
+                        self._schedule(sub, time.time() + self.DEFER_DELAY)
+                    continue
+            sub.pop('deferred_since', None)
+
+            delay = self.refresh(sub)
+            if self.governor is not None:
+                delay = self.governor.stretch(delay, maximum=4 * delay)
+            with self.lock:
+                self._schedule(sub, time.time() + delay)
+
+    def refresh(self, sub):
+        """Fetch one subscription and apply the delta. Returns seconds until next run"""
+        headers = {'User-Agent': 'KingzVPN'}
+        if sub.get('etag'):
+            headers['If-None-Match'] = sub['etag']
+        if sub.get('last_modified'):
+            headers['If-Modified-Since'] = sub['last_modified']
+
+        try:
+            response = self.session.get(sub['url'], headers=headers, timeout=30)
+            sub['last_checked'] = time.time()
+            if self.governor is not None:
+                self.governor.spend(len(response.content), self.stop_event)
+
+            if response.status_code == 304:
+                self.logger.info(f"Subscription not modified: {sub['url']}")
+            else:
+                response.raise_for_status()
+                sub['etag'] = response.headers.get('ETag')
+                sub['last_modified'] = response.headers.get('Last-Modified')
+
+                # Provider-suggested interval, in hours
+                suggested = response.headers.get('profile-update-interval')
+                if suggested and suggested.isdigit():
+                    sub['interval'] = max(self.MIN_INTERVAL, int(suggested) * 3600)
+
+                payload_hash = config_hash(response.text)
+                if payload_hash != sub.get('payload_hash'):
+                    sub['payload_hash'] = payload_hash
+                    self.apply(sub['url'], response.text)
+
+            sub['failures'] = 0
+            self.store.save_subscription(sub)
+            return self._jittered(sub['interval'])
+
+        except Exception as e:
+            sub['failures'] = sub.get('failures', 0) + 1
+            self.store.save_subscription(sub)
+            delay = min(sub['interval'], self.BACKOFF_BASE * 2 ** (sub['failures'] - 1))
+            self.logger.warning(f"Subscription refresh failed ({sub['url']}): {e}; retry in {delay:.0f}s")
+            if self.on_error:
+                self.on_error(sub['url'], e)
+            return self._jittered(delay)
+
+    def apply(self, url, payload):
+        """Parse a payload and apply only the differences to the store"""
+        configs = [c for c in map(parse_config_link, decode_subscription_payload(payload)) if c]
+        added, removed, changed = self.store.apply_delta(url, configs)
+        self.logger.info(
+            f"Subscription {url}: +{len(added)} -{len(removed)} ~{len(changed)} ({len(configs)} nodes)"
+        )
+        if self.on_delta and (added or removed or changed):
+            self.on_delta(url, added, removed, changed)
+        return added, removed, changed
+
+# ===== DNS CACHE =====
+class DNSCache:
+    """In-process DNS cache honouring record TTLs, with parallel batch lookups"""
+
+    def __init__(self, nameservers=None, port=53, default_ttl=300, negative_ttl=30,
+                 min_ttl=5, timeout=3.0, max_workers=32):
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.min_ttl = min_ttl
+        self.max_workers = max_workers
+        self.cache = {}      # host -> (expires, addresses or None)
+        self.inflight = {}   # host -> Event set when the lookup finishes
+        self.lock = Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'errors': 0}
+
+        self.resolver = None
+        self.aaaa_pool = None
+        if DNSPYTHON_AVAILABLE:
+            self.resolver = dns.resolver.Resolver(configure=not nameservers)
+            if nameservers:
+                self.resolver.nameservers = list(nameservers)
+            self.resolver.port = port
+            self.resolver.lifetime = timeout
+            # AAAA runs here while the calling thread asks for A
+            self.aaaa_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dns-aaaa')
+
+    @staticmethod
+    def is_ip(host):
+        try:
+            ipaddress.ip_address(host)
+            return True
+        except ValueError:
+            return False
+
+    def _query(self, host, rdtype):
+        """One record type. Returns (addresses, ttl); any DNS error just means no answer"""
+        try:
+            answer = self.resolver.resolve(host, rdtype)
+        except dns.exception.DNSException:
+            return [], None
+        return [rdata.to_text() for rdata in answer], answer.rrset.ttl
+
+    def _lookup(self, host):
+        """Query the network. Returns (addresses, ttl)"""
+        if self.resolver is not None:
+            aaaa = self.aaaa_pool.submit(self._query, host, 'AAAA')
+            addresses, ttl = self._query(host, 'A')
+            v6_addresses, v6_ttl = aaaa.result()
+            # A timeout on one family keeps the other's answer
+            addresses += v6_addresses
+            ttls = [t for t in (ttl, v6_ttl) if t is not None]
+            if addresses:
+                return addresses, min(ttls)
+
+        # No dnspython, or DNS had nothing: the system resolver also honours /etc/hosts
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if not addresses:
+            raise socket.gaierror(socket.EAI_NONAME, f"No address for {host}")
+        return addresses, self.default_ttl
+
+    def resolve(self, host):
+        """Return addresses for host, from cache when fresh"""
+        if self.is_ip(host):
+            return [host]
+
+        while True:
+            with self.lock:
+                entry = self.cache.get(host)
+                if entry and entry[0] > time.monotonic():
+                    if entry[1] is None:
+                        self.metrics['negative_hits'] += 1
+                        raise socket.gaierror(socket.EAI_NONAME, f"No address for {host} (cached)")
+                    self.metrics['hits'] += 1
+                    return list(entry[1])
+
+                # Someone else is already asking; wait for their answer
+                pending = self.inflight.get(host)
+                if pending is None:
+                    self.inflight[host] = Event()
+                    self.metrics['misses'] += 1
+                    break
+            pending.wait()
+
+        try:
+            addresses, ttl = self._lookup(host)
+            with self.lock:
+                self.cache[host] = (time.monotonic() + max(self.min_ttl, ttl), addresses)
+            return list(addresses)
+        except Exception:
+            with self.lock:
+                self.metrics['errors'] += 1
+                self.cache[host] = (time.monotonic() + self.negative_ttl, None)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(host).set()
+
+    def resolve_many(self, hosts):
+        """Resolve many hostnames in parallel. Returns {host: addresses or None}"""
+        hosts = list(dict.fromkeys(hosts))
+        results = {}
+
+        def safe_resolve(host):
+            try:
+                return self.resolve(host)
+            except Exception:
+                return None
+
+        misses = []
+        for host in hosts:
+            with self.lock:
+                entry = self.cache.get(host)
+                fresh = entry is not None and entry[0] > time.monotonic()
+            if fresh or self.is_ip(host):
+                results[host] = safe_resolve(host)
+            else:
+                misses.append(host)
+
+        if misses:
+            workers = min(self.max_workers, len(misses))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dns') as pool:
+                for host, addresses in zip(misses, pool.map(safe_resolve, misses)):
+                    results[host] = addresses
+        return results
+
+    def sockaddr(self, host, port):
+        """First resolved (address, port) pair for a connect() call"""
+        return (self.resolve(host)[0], port)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.metrics)
+            stats['entries'] = len(self.cache)
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['negative_hits']) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def purge(self):
+        """Drop expired entries"""
+        now = time.monotonic()
+        with self.lock:
+            for host in [h for h, e in self.cache.items() if e[0] <= now]:
+                del self.cache[host]
+
+
+# ===== CONFIG VALIDATION =====
+class ConfigValidator:
+    """Parallel dry-run checker for imported configs with a TTL verdict cache"""
+
+    UDP_PROTOCOLS = ('hysteria2', 'tuic')
+    TLS_SECURITY = ('tls', 'reality', 'xtls')
+    CHECK_BYTES = 4096      # rough traffic of one check (handshakes), for the governor's rate cap
+
+    def __init__(self, max_workers=64, timeout=3.0, ttl=600, resolver=None, governor=None, tunnel_format=None):
+        self.resolver = resolver
+        self.governor = governor
+        self.tunnel_format = tunnel_format      # callable -> active format; ok then also means runnable
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.ttl = ttl
+        self.cache = {}  # config hash -> verdict
+        self.lock = Lock()
+        self.tls_context = ssl.create_default_context()
+        # Proxy endpoints routinely use self-signed or borrowed certificates;
+        # we only care that the handshake completes
+        self.tls_context.check_hostname = False
+        self.tls_context.verify_mode = ssl.CERT_NONE
+
+    @staticmethod
+    def schema_errors(config):
+        """Return a list of schema problems (empty if the config looks sane)"""
+        errors = []
+        for field in ('hash', 'protocol', 'address', 'port', 'uri'):
+            if not config.get(field):
+                errors.append(f"missing {field}")
+        port = config.get('port')
+        if port and not (isinstance(port, int) and 0 < port < 65536):
+            errors.append(f"bad port {port}")
+        return errors
+
+    @staticmethod
+    def sni_for(config):
+        """Server name to present during the TLS check"""
+        uri = config.get('uri', '')
+        try:
+            if uri.startswith('vmess://'):
+                data = json.loads(b64decode_padded(uri[8:]))
+                return data.get('sni') or data.get('host') or config['address']
+            params = parse_qs(urlsplit(uri).query)
+            return (params.get('sni') or params.get('host') or [config['address']])[0]
+        except (ValueError, JSONDecodeError):
+            return config.get('address')
+
+    def needs_tls(self, config):
+        if config.get('protocol') == 'trojan':
+            return True
+        return any(tag in self.TLS_SECURITY for tag in config.get('tags', ()))
+
+    def resolve(self, host, port):
+        if self.resolver is not None:
+            return self.resolver.sockaddr(host, port)
+        return socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4]
+
+    def check(self, config):
+        """Run schema -> format -> resolve -> connect -> TLS for one config"""
+        fmt = self.tunnel_format() if self.tunnel_format else None
+        verdict = {
+            'hash': config.get('hash'),
+            'name': config.get('name'),
+            'ok': False,
+            'stage': 'schema',
+            'error': None,
+            'latency_ms': None,
+            'format': fmt,
+            'checked': time.time(),
+        }
+
+        errors = self.schema_errors(config)
+        if errors:
+            verdict['error'] = ', '.join(errors)
+            return verdict
+
+        # A reachable port is no use if the tunnel binary cannot run the protocol
+        if fmt and not ConfigConverter.can_run(config, fmt):
+            verdict['stage'] = 'format'
+            verdict['error'] = f"{fmt} cannot run {config['protocol']} configs"
+            return verdict
+
+        try:
+            verdict['stage'] = 'resolve'
+            sockaddr = self.resolve(config['address'], config['port'])
+
+            # QUIC-based protocols have no TCP listener to probe
+            if config['protocol'] in self.UDP_PROTOCOLS:
+                verdict['ok'] = True
+                return verdict
+
+            verdict['stage'] = 'connect'
+            family = socket.AF_INET6 if ':' in sockaddr[0] else socket.AF_INET
+            start = time.perf_counter()
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(sockaddr)
+                verdict['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+                if self.needs_tls(config):
+                    verdict['stage'] = 'tls'
+                    with self.tls_context.wrap_socket(sock, server_hostname=self.sni_for(config)):
+                        pass
+            finally:
+                sock.close()
+
+            verdict['ok'] = True
+
+        except (OSError, ssl.SSLError, ValueError) as e:
+            verdict['error'] = str(e) or e.__class__.__name__
+
+        return verdict
+
+    def cached(self, hash_):
+        """Fresh cached verdict for a config hash, or None"""
+        with self.lock:
+            verdict = self.cache.get(hash_)
+        if verdict and time.time() - verdict['checked'] < self.ttl:
+            # Checked for another tunnel format: runnable may have changed
+            if self.tunnel_format and verdict.get('format') != self.tunnel_format():
+                return None
+            return verdict
+        return None
+
+    def validate(self, configs, use_cache=True, stop_event=None):
+        """Yield verdicts as they complete, at most max_workers in flight"""
+        pending = iter(configs)
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='validator') as pool:
+            in_flight = set()
+
+            def fill():
+                # Re-read the budget each time so a busy machine throttles a running pass
+                limit = self.governor.budget(self.max_workers) if self.governor else self.max_workers
+                while len(in_flight) < limit:
+                    config = next(pending, None)
+                    if config is None:
+                        return
+                    verdict = self.cached(config.get('hash')) if use_cache else None
+                    if verdict:
+                        finished.append(verdict)
+                    else:
+                        if self.governor is not None and not self.governor.spend(self.CHECK_BYTES, stop_event):
+                            return
+                        in_flight.add(pool.submit(self.check, config))
+
+            finished = []
+            fill()
+            while in_flight or finished:
+                yield from finished
+                finished.clear()
+                if stop_event is not None and stop_event.is_set():
+                    for future in in_flight:
+                        future.cancel()
+                    return
+                if not in_flight:
+                    fill()
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.discard(future)
+                    verdict = future.result()
+                    with self.lock:
+                        self.cache[verdict['hash']] = verdict
+                    finished.append(verdict)
+                fill()
+
+    def purge(self):
+        """Drop expired verdicts"""
+        now = time.time()
+        with self.lock:
+            for hash_ in [h for h, v in self.cache.items() if now - v['checked'] >= self.ttl]:
+                del self.cache[hash_]
+
+# ===== CONFIG FORMAT CONVERTER =====
+TUNNEL_SOCKS_PORT = 10808
+
+# Intermediate representation: one flat dict per node
+IR_FIELDS = ('protocol', 'name', 'address', 'port', 'uuid', 'password', 'method', 'flow',
+             'alter_id', 'cipher', 'network', 'path', 'host', 'service_name', 'security',
+             'sni', 'fingerprint', 'alpn', 'public_key', 'short_id', 'insecure',
+             'obfs', 'obfs_password', 'congestion', 'transport', 'ovpn')
+
+XRAY_TEMPLATE = string.Template(
+    '{"log": {"loglevel": "warning"}, '
+    '"inbounds": [{"tag": "socks", "listen": "127.0.0.1", "port": $socks_port, '
+    '"protocol": "socks", "settings": {"udp": true}}], '
+    '"outbounds": [$outbound, {"tag": "direct", "protocol": "freedom"}]$routing}'
+)
+SINGBOX_TEMPLATE = string.Template(
+    '{"log": {"level": "warn"}, '
+    '"inbounds": [{"type": "socks", "tag": "socks", "listen": "127.0.0.1", "listen_port": $socks_port}], '
+    '"outbounds": [$outbound, {"type": "direct", "tag": "direct"}], '
+    '"route": {"rules": $rules, "final": "proxy"}}'
+)
+
+
+# Protocols each tunnel format can run (render_ir raises for the rest)
+TUNNEL_PROTOCOLS = {
+    'xray': frozenset({'vless', 'vmess', 'trojan', 'shadowsocks'}),
+    'sing-box': frozenset({'vless', 'vmess', 'trojan', 'shadowsocks', 'hysteria2', 'tuic'}),
+    'ovpn': frozenset({'openvpn'}),
+}
+
+
+def _ir(**fields):
+    ir = dict.fromkeys(IR_FIELDS)
+    ir.update(fields)
+    ir['port'] = int(ir['port'] or 0)
+    ir['alter_id'] = int(ir['alter_id'] or 0)
+    ir['insecure'] = bool(ir['insecure'])
+    ir['security'] = ir['security'] or 'none'
+    ir['network'] = ir['network'] or 'tcp'
+    return ir
+
+
+def ir_from_link(uri, name=None):
+    """Share link -> IR (raises ValueError for unsupported or broken links)"""
+    uri = uri.strip()
+    scheme = uri.partition('://')[0].lower()
+    protocol = PROTOCOL_ALIASES.get(scheme, scheme)
+    if protocol not in ('vless', 'vmess', 'trojan', 'shadowsocks', 'hysteria2', 'tuic'):
+        raise ValueError(f"Unsupported link: {scheme}")
+
+    if protocol == 'vmess':
+        data = json.loads(b64decode_padded(uri[8:]))
+        return _ir(protocol='vmess', name=name or data.get('ps'), address=data.get('add'),
+                   port=data.get('port'), uuid=data.get('id'), alter_id=int(data.get('aid') or 0),
+                   cipher=data.get('scy') or 'auto', network=data.get('net'),
+                   path=data.get('path') or None, host=data.get('host') or None,
+                   service_name=data.get('path') if data.get('net') == 'grpc' else None,
+                   security=data.get('tls') or None, sni=data.get('sni') or None,
+                   fingerprint=data.get('fp') or None, alpn=data.get('alpn') or None)
+
+    parsed = urlsplit(uri)
+    params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+    secret = unquote(parsed.username or '')
+    fields = dict(
+        protocol=protocol, name=name or unquote(parsed.fragment) or None,
+        address=parsed.hostname, port=parsed.port,
+        network=params.get('type'), path=params.get('path'), host=params.get('host'),
+        service_name=params.get('serviceName'), security=params.get('security'),
+        sni=params.get('sni') or params.get('peer'), fingerprint=params.get('fp'),
+        alpn=params.get('alpn'), public_key=params.get('pbk'), short_id=params.get('sid'),
+        insecure=(params.get('allowInsecure') or params.get('insecure') or
+                  params.get('allow_insecure')) in ('1', 'true'),
+    )
+    if protocol == 'vless':
+        fields.update(uuid=secret, flow=params.get('flow'))
+    elif protocol == 'trojan':
+        fields.update(password=secret, security=fields['security'] or 'tls')
+    elif protocol == 'shadowsocks':
+        if parsed.password is not None:
+            method, password = secret, unquote(parsed.password)
+        else:
+            # SIP002 base64(method:password) or legacy base64(method:password@host:port)
+            decoded = b64decode_padded(secret or parsed.netloc).decode('utf-8')
+            creds, _, host_part = decoded.rpartition('@') if '@' in decoded else (decoded, '', '')
+            method, _, password = creds.partition(':')
+            if not fields['address'] and host_part:
+                host, _, port = host_part.rpartition(':')
+                fields.update(address=host, port=int(port))
+        fields.update(method=method, password=password)
+    elif protocol == 'hysteria2':
+        fields.update(password=secret, security='tls', obfs=params.get('obfs'),
+                      obfs_password=params.get('obfs-password'))
+    elif protocol == 'tuic':
+        fields.update(uuid=secret, password=unquote(parsed.password or ''), security='tls',
+                      congestion=params.get('congestion_control'))
+
+    if not fields['address'] or not fields['port']:
+        raise ValueError("Link has no server address")
+    return _ir(**fields)
+
+
+def ir_to_link(ir):
+    """IR -> share link"""
+    protocol = ir['protocol']
+    name = quote(ir['name'] or '', safe='')
+    host = f"[{ir['address']}]" if ':' in ir['address'] else ir['address']
+
+    if protocol == 'vmess':
+        data = {'v': '2', 'ps': ir['name'] or '', 'add': ir['address'], 'port': str(ir['port']),
+                'id': ir['uuid'], 'aid': str(ir['alter_id'] or 0), 'scy': ir['cipher'] or 'auto',
+                'net': ir['network'], 'type': 'none', 'host': ir['host'] or '',
+                'path': (ir['service_name'] if ir['network'] == 'grpc' else ir['path']) or '',
+                'tls': '' if ir['security'] == 'none' else ir['security'],
+                'sni': ir['sni'] or '', 'alpn': ir['alpn'] or '', 'fp': ir['fingerprint'] or ''}
+        return 'vmess://' + base64.b64encode(json.dumps(data, ensure_ascii=False).encode('utf-8')).decode()
+
+    params = {'type': ir['network'], 'security': ir['security'], 'sni': ir['sni'],
+              'fp': ir['fingerprint'], 'alpn': ir['alpn'], 'pbk': ir['public_key'],
+              'sid': ir['short_id'], 'host': ir['host'], 'path': ir['path'],
+              'serviceName': ir['service_name']}
+    if protocol == 'vless':
+        userinfo = quote(ir['uuid'] or '', safe='')
+        params.update(encryption='none', flow=ir['flow'])
+    elif protocol == 'trojan':
+        userinfo = quote(ir['password'] or '', safe='')
+    elif protocol == 'shadowsocks':
+        creds = f"{ir['method']}:{ir['password']}".encode('utf-8')
+        userinfo = base64.urlsafe_b64encode(creds).decode().rstrip('=')
+        params = {}
+    elif protocol == 'hysteria2':
+        userinfo = quote(ir['password'] or '', safe='')
+        params = {'sni': ir['sni'], 'obfs': ir['obfs'], 'obfs-password': ir['obfs_password']}
+    elif protocol == 'tuic':
+        userinfo = f"{quote(ir['uuid'] or '', safe='')}:{quote(ir['password'] or '', safe='')}"
+        params = {'sni': ir['sni'], 'alpn': ir['alpn'], 'congestion_control': ir['congestion']}
+    else:
+        raise ValueError(f"{protocol} has no share link form")
+    if ir['insecure']:
+        params['allowInsecure'] = '1'
+
+    scheme = 'ss' if protocol == 'shadowsocks' else protocol
+    query = urlencode({k: v for k, v in params.items() if v and v != 'none'})
+    return f"{scheme}://{userinfo}@{host}:{ir['port']}" + (f"?{query}" if query else '') + f"#{name}"
+
+
+def ir_from_xray(outbound, name=None):
+    """xray outbound object -> IR"""
+    protocol = outbound.get('protocol')
+    settings = outbound.get('settings') or {}
+    stream = outbound.get('streamSettings') or {}
+    security = stream.get('security') or 'none'
+    tls = stream.get('tlsSettings') or stream.get('realitySettings') or {}
+    network = stream.get('network') or 'tcp'
+    ws = stream.get('wsSettings') or {}
+    fields = dict(protocol=protocol, name=name or outbound.get('tag'), network=network,
+                  security=security, sni=tls.get('serverName'), fingerprint=tls.get('fingerprint'),
+                  alpn=','.join(tls.get('alpn') or ()) or None, insecure=bool(tls.get('allowInsecure')),
+                  public_key=tls.get('publicKey'), short_id=tls.get('shortId'),
+                  path=ws.get('path'), host=(ws.get('headers') or {}).get('Host'),
+                  service_name=(stream.get('grpcSettings') or {}).get('serviceName'))
+
+    if protocol in ('vless', 'vmess'):
+        server = settings['vnext'][0]
+        user = server['users'][0]
+        fields.update(address=server['address'], port=server['port'], uuid=user.get('id'),
+                      flow=user.get('flow'), alter_id=user.get('alterId', 0),
+                      cipher=user.get('security'))
+    elif protocol in ('trojan', 'shadowsocks'):
+        server = settings['servers'][0]
+        fields.update(address=server['address'], port=server['port'],
+                      password=server.get('password'), method=server.get('method'))
+    else:
+        raise ValueError(f"Unsupported xray outbound: {protocol}")
+    return _ir(**fields)
+
+
+def ir_from_singbox(outbound):
+    """sing-box outbound object -> IR"""
+    protocol = outbound.get('type')
+    if protocol not in ('vless', 'vmess', 'trojan', 'shadowsocks', 'hysteria2', 'tuic'):
+        raise ValueError(f"Unsupported sing-box outbound: {protocol}")
+    tls = outbound.get('tls') or {}
+    reality = tls.get('reality') or {}
+    transport = outbound.get('transport') or {}
+    obfs = outbound.get('obfs') or {}
+    security = 'none'
+    if tls.get('enabled'):
+        security = 'reality' if reality.get('enabled') else 'tls'
+    return _ir(protocol=protocol, name=outbound.get('tag'), address=outbound.get('server'),
+               port=outbound.get('server_port'), uuid=outbound.get('uuid'),
+               password=outbound.get('password'), method=outbound.get('method'),
+               flow=outbound.get('flow'), alter_id=outbound.get('alter_id', 0),
+               cipher=outbound.get('security'), network=transport.get('type'),
+               path=transport.get('path'), host=(transport.get('headers') or {}).get('Host'),
+               service_name=transport.get('service_name'), security=security,
+               sni=tls.get('server_name'), insecure=bool(tls.get('insecure')),
+               fingerprint=(tls.get('utls') or {}).get('fingerprint'),
+               alpn=','.join(tls.get('alpn') or ()) or None,
+               public_key=reality.get('public_key'), short_id=reality.get('short_id'),
+               obfs=obfs.get('type'), obfs_password=obfs.get('password'),
+               congestion=outbound.get('congestion_control'))
+
+
+def ir_from_ovpn(text, name=None):
+    """.ovpn profile -> IR (the profile body is carried through unchanged)"""
+    address = port = None
+    proto = 'udp'
+    for line in text.splitlines():
+        parts = line.split('#', 1)[0].split(';', 1)[0].split()
+        if not parts:
+            continue
+        if parts[0] == 'remote' and len(parts) > 1 and address is None:
+            address = parts[1]
+            port = parts[2] if len(parts) > 2 else None
+            if len(parts) > 3:
+                proto = parts[3]
+        elif parts[0] == 'port' and len(parts) > 1 and port is None:
+            port = parts[1]
+        elif parts[0] == 'proto' and len(parts) > 1:
+            proto = parts[1]
+    if address is None:
+        raise ValueError("No remote in OpenVPN profile")
+    return _ir(protocol='openvpn', name=name or address, address=address, port=port or 1194,
+               transport=proto, ovpn=text)
+
+
+def _xray_outbound(ir, address=None):
+    protocol = ir['protocol']
+    address = address or ir['address']
+    if protocol in ('vless', 'vmess'):
+        user = {'id': ir['uuid']}
+        if protocol == 'vmess':
+            user.update(alterId=ir['alter_id'] or 0, security=ir['cipher'] or 'auto')
+        else:
+            user['encryption'] = 'none'
+            if ir['flow']:
+                user['flow'] = ir['flow']
+        settings = {'vnext': [{'address': address, 'port': ir['port'], 'users': [user]}]}
+    elif protocol == 'trojan':
+        settings = {'servers': [{'address': address, 'port': ir['port'], 'password': ir['password']}]}
+    elif protocol == 'shadowsocks':
+        settings = {'servers': [{'address': address, 'port': ir['port'],
+                                 'method': ir['method'], 'password': ir['password']}]}
+    else:
+        raise ValueError(f"xray cannot run {protocol} configs")
+
+    stream = {'network': ir['network'], 'security': ir['security']}
+    server_name = ir['sni'] or ir['host'] or ir['address']
+    if ir['security'] == 'tls':
+        stream['tlsSettings'] = {'serverName': server_name, 'fingerprint': ir['fingerprint'] or 'chrome'}
+        if ir['alpn']:
+            stream['tlsSettings']['alpn'] = ir['alpn'].split(',')
+        if ir['insecure']:
+            stream['tlsSettings']['allowInsecure'] = True
+    elif ir['security'] == 'reality':
+        stream['realitySettings'] = {
+            'serverName': server_name, 'fingerprint': ir['fingerprint'] or 'chrome',
+            'publicKey': ir['public_key'] or '', 'shortId': ir['short_id'] or '',
+        }
+    if ir['network'] == 'ws':
+        stream['wsSettings'] = {'path': ir['path'] or '/', 'headers': {'Host': ir['host'] or server_name}}
+    elif ir['network'] == 'grpc':
+        stream['grpcSettings'] = {'serviceName': ir['service_name'] or ir['path'] or ''}
+
+    return {'tag': 'proxy', 'protocol': protocol, 'settings': settings, 'streamSettings': stream}
+
+
+def _singbox_outbound(ir, address=None):
+    protocol = ir['protocol']
+    if protocol == 'openvpn':
+        raise ValueError("sing-box cannot run OpenVPN configs")
+    outbound = {'type': protocol, 'tag': 'proxy', 'server': address or ir['address'],
+                'server_port': ir['port']}
+    if protocol in ('vless', 'tuic'):
+        outbound['uuid'] = ir['uuid']
+    if protocol == 'vless' and ir['flow']:
+        outbound['flow'] = ir['flow']
+    if protocol == 'vmess':
+        outbound.update(uuid=ir['uuid'], alter_id=ir['alter_id'] or 0, security=ir['cipher'] or 'auto')
+    if protocol in ('trojan', 'shadowsocks', 'hysteria2', 'tuic'):
+        outbound['password'] = ir['password']
+    if protocol == 'shadowsocks':
+        outbound['method'] = ir['method']
+    if protocol == 'hysteria2' and ir['obfs']:
+        outbound['obfs'] = {'type': ir['obfs'], 'password': ir['obfs_password']}
+    if protocol == 'tuic' and ir['congestion']:
+        outbound['congestion_control'] = ir['congestion']
+
+    if ir['security'] in ('tls', 'reality'):
+        tls = {'enabled': True, 'server_name': ir['sni'] or ir['host'] or ir['address']}
+        if ir['insecure']:
+            tls['insecure'] = True
+        if ir['alpn']:
+            tls['alpn'] = ir['alpn'].split(',')
+        if ir['fingerprint'] or ir['security'] == 'reality':
+            tls['utls'] = {'enabled': True, 'fingerprint': ir['fingerprint'] or 'chrome'}
+        if ir['security'] == 'reality':
+            tls['reality'] = {'enabled': True, 'public_key': ir['public_key'] or '',
+                              'short_id': ir['short_id'] or ''}
+        outbound['tls'] = tls
+
+    if ir['network'] == 'ws':
+        outbound['transport'] = {'type': 'ws', 'path': ir['path'] or '/',
+                                 'headers': {'Host': ir['host'] or ir['sni'] or ir['address']}}
+    elif ir['network'] == 'grpc':
+        outbound['transport'] = {'type': 'grpc', 'service_name': ir['service_name'] or ir['path'] or ''}
+    elif ir['network'] in ('h2', 'http'):
+        outbound['transport'] = {'type': 'http', 'path': ir['path'] or '/',
+                                 'host': [ir['host']] if ir['host'] else []}
+    return outbound
+
+
+def _singbox_rule(rule):
+    """xray routing rule -> sing-box route rule"""
+    converted = {'outbound': rule.get('outboundTag', 'direct')}
+    if rule.get('ip'):
+        converted['ip_cidr'] = rule['ip']
+    keys = {'domain': 'domain_suffix', 'full': 'domain', 'keyword': 'domain_keyword', 'regexp': 'domain_regex'}
+    for entry in rule.get('domain', ()):
+        kind, sep, value = entry.partition(':')
+        if not sep:
+            kind, value = 'domain', entry
+        converted.setdefault(keys.get(kind, 'domain_suffix'), []).append(value)
+    return converted
+
+
+def render_ir(ir, fmt, socks_port=TUNNEL_SOCKS_PORT, address=None, routing_rules=None, tuning=None):
+    """Render an IR into fmt ('link', 'xray', 'sing-box' or 'ovpn').
+
+    tuning holds the parameters TunnelTuner.grid picked for one format:
+    OpenVPN takes tun_mtu / mssfix / sndbuf / rcvbuf; xray gets the MSS as
+    tcpMaxSeg, socket buffers as SO_SNDBUF / SO_RCVBUF custom sockopts and
+    kcp_mtu / kcp_buffer as kcpSettings; sing-box gets a TUIC congestion
+    controller. Parameters tuned for another format are ignored.
+    """
+    if tuning and tuning.get('format', fmt) != fmt:
+        tuning = None
+    if fmt == 'link':
+        return ir_to_link(ir)
+    if fmt == 'xray':
+        routing = ''
+        if routing_rules:
+            routing = ', "routing": ' + json.dumps({'domainStrategy': 'IPIfNonMatch', 'rules': routing_rules})
+        outbound = _xray_outbound(ir, address)
+        if tuning:
+            stream = outbound['streamSettings']
+            sockopt = {}
+            if tuning.get('mssfix'):
+                sockopt['tcpMaxSeg'] = tuning['mssfix']
+            # xray has no named socket buffer options: setsockopt(SOL_SOCKET, SO_SNDBUF / SO_RCVBUF)
+            custom = [{'system': 'linux', 'level': '1', 'opt': opt, 'value': str(tuning[key]), 'type': 'int'}
+                      for key, opt in (('sndbuf', '7'), ('rcvbuf', '8')) if tuning.get(key)]
+            if custom:
+                sockopt['customSockopt'] = custom
+            if sockopt:
+                stream['sockopt'] = sockopt
+            if tuning.get('kcp_mtu') and stream['network'] == 'kcp':
+                buffer = tuning.get('kcp_buffer') or 2
+                stream['kcpSettings'] = {'mtu': tuning['kcp_mtu'], 'readBufferSize': buffer,
+                                         'writeBufferSize': buffer}
+        return XRAY_TEMPLATE.substitute(socks_port=int(socks_port), routing=routing,
+                                        outbound=json.dumps(outbound, ensure_ascii=False))
+    if fmt == 'sing-box':
+        rules = [_singbox_rule(rule) for rule in routing_rules or ()]
+        outbound = _singbox_outbound(ir, address)
+        if tuning and tuning.get('congestion') and outbound['type'] == 'tuic':
+            outbound['congestion_control'] = tuning['congestion']
+        return SINGBOX_TEMPLATE.substitute(socks_port=int(socks_port), rules=json.dumps(rules),
+                                           outbound=json.dumps(outbound, ensure_ascii=False))
+    if fmt == 'ovpn':
+        if ir['protocol'] != 'openvpn':
+            raise ValueError(f"Cannot express {ir['protocol']} as an OpenVPN profile")
+        tuned = [key for key in ('tun_mtu', 'mssfix', 'sndbuf', 'rcvbuf') if key in (tuning or {})]
+        lines = []
+        for line in ir['ovpn'].splitlines():
+            directive = line.split()[:1]
+            if directive and directive[0].replace('-', '_') in tuned:
+                continue     # replaced by the tuned values below
+            if address and directive == ['remote']:
+                # Pin the pre-resolved address, keep port/proto as written
+                line = ' '.join(['remote', address] + line.split()[2:])
+            lines.append(line)
+        for key in tuned:
+            # Zero buffers mean the OS default: leave the directive out
+            if tuning[key] or key == 'mssfix':
+                lines.append(f"{key.replace('_', '-')} {tuning[key]}")
+        for rule in routing_rules or ():
+            for cidr in rule.get('ip', ()):
+                network = ipaddress.ip_network(cidr)
+                if network.version == 4:
+                    lines.append(f"route {network.network_address} {network.netmask} net_gateway")
+        return '\n'.join(lines) + '\n'
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def _convert_chunk(uris, fmt, tunings=None):
+    """Process pool worker: links -> rendered texts (None where unsupported)"""
+    results = []
+    for uri, tuning in zip(uris, tunings or [None] * len(uris)):
+        try:
+            results.append(render_ir(ir_from_link(uri), fmt, tuning=tuning))
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+            results.append(None)
+    return results
+
+
+class ConfigConverter:
+    """Converts configs between link, xray, sing-box and OpenVPN formats via a shared IR.
+
+    Rendered tunnel configs are cached on disk by content hash, so
+    reconnecting to the same server with the same options is a lookup.
+    The files carry server credentials: they are owner-only, the least
+    recently used are deleted past cache_size, and close() removes them all.
+    """
+
+    FORMATS = {'link': 'txt', 'xray': 'json', 'sing-box': 'json', 'ovpn': 'ovpn'}
+
+    def __init__(self, cache_dir=os.path.join(CACHE_DIR, 'rendered'), max_workers=None, cache_size=128):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.rendered = OrderedDict()     # cache key -> path, least recently used first
+        self.cache_size = cache_size
+        self.lock = Lock()
+        self.pool = None
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    @staticmethod
+    def parse(text, name=None):
+        """Parse links, an xray/sing-box document or an .ovpn profile into IRs"""
+        stripped = text.lstrip()
+        if stripped.startswith('{'):
+            document = json.loads(stripped)
+            irs = []
+            for outbound in document.get('outbounds', ()):
+                try:
+                    if 'protocol' in outbound:
+                        irs.append(ir_from_xray(outbound, name))
+                    else:
+                        irs.append(ir_from_singbox(outbound))
+                except (ValueError, KeyError, IndexError, TypeError):
+                    continue    # direct/block/dns outbounds and the like
+            return irs
+        if re.search(r'^\s*remote\s', text, re.MULTILINE):
+            return [ir_from_ovpn(text, name)]
+
+        irs = []
+        for link in decode_subscription_payload(text):
+            try:
+                irs.append(ir_from_link(link))
+            except (ValueError, KeyError, TypeError, UnicodeDecodeError, JSONDecodeError):
+                continue
+        return irs
+
+    def convert(self, text, fmt, **options):
+        """Convert every node in text into fmt"""
+        return [render_ir(ir, fmt, **options) for ir in self.parse(text)]
+
+    @staticmethod
+    def can_run(config, fmt):
+        """True if config renders into a tunnel config of format fmt"""
+        return config.get('protocol') in TUNNEL_PROTOCOLS.get(fmt, ())
+
+    def cache_key(self, config, fmt, options):
+        data = json.dumps([config['hash'], fmt, options], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+    def render_file(self, config, fmt='xray', **options):
+        """Path of config rendered as fmt, rendering only on a cache miss"""
+        key = self.cache_key(config, fmt, options)
+        path = os.path.join(self.cache_dir, f"{key}.{self.FORMATS[fmt]}")
+        with self.lock:
+            cached = key in self.rendered
+            if cached:
+                self.rendered.move_to_end(key)
+        if cached and os.path.exists(path):
+            return path
+        if not os.path.exists(path):
+            ir = ir_from_ovpn(config['ovpn'], config.get('name')) if config.get('ovpn') else ir_from_link(config['uri'])
+            text = render_ir(ir, fmt, **options)
+            tmp_path = f"{path}.tmp"
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        evicted = []
+        with self.lock:
+            self.rendered[key] = path
+            self.rendered.move_to_end(key)
+            while len(self.rendered) > self.cache_size:
+                evicted.append(self.rendered.popitem(last=False)[1])
+        for old in evicted:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        return path
+
+    def convert_many(self, configs, fmt, chunk_size=500, tunings=None):
+        """Render many link configs in parallel. Returns texts aligned with configs (None = unsupported).
+
+        tunings optionally maps config hash -> tuned parameters.
+        """
+        uris = [config['uri'] for config in configs]
+        per_config = [tunings.get(config['hash']) for config in configs] if tunings else [None] * len(configs)
+        chunks = [uris[i:i + chunk_size] for i in range(0, len(uris), chunk_size)]
+        chunk_tunings = [per_config[i:i + chunk_size] for i in range(0, len(uris), chunk_size)]
+        if len(chunks) < 2 or self.max_workers < 2:
+            results = map(_convert_chunk, chunks, [fmt] * len(chunks), chunk_tunings)
+        else:
+            if self.pool is None:
+                # spawn: forking a process that runs Tk and worker threads is unsafe
+                self.pool = ProcessPoolExecutor(self.max_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            results = self.pool.map(_convert_chunk, chunks, [fmt] * len(chunks), chunk_tunings)
+        return [text for chunk in results for text in chunk]
+
+    def export(self, configs, fmt, directory, tunings=None):
+        """Write every convertible config as its own file. Returns (written, skipped)"""
+        os.makedirs(directory, exist_ok=True)
+        written = skipped = 0
+        for config, text in zip(configs, self.convert_many(configs, fmt, tunings=tunings)):
+            if text is None:
+                skipped += 1
+                continue
+            stem = re.sub(r'[^\w.-]+', '_', config['name']).strip('._')[:60] or config['hash'][:12]
+            with open(os.path.join(directory, f"{stem}-{config['hash'][:8]}.{self.FORMATS[fmt]}"),
+                      'w', encoding='utf-8') as f:
+                f.write(text)
+            written += 1
+        return written, skipped
+
+    def close(self):
+        """Stop the pool and delete every rendered config"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        with self.lock:
+            self.rendered.clear()
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+
+# ===== TUNNEL PROCESS AND FAST SWITCH =====
+class TunnelProcess:
+    """Supervises one tunnel binary bound to a local SOCKS port"""
+
+    def __init__(self, command, config, config_path, socks_port=TUNNEL_SOCKS_PORT, output=None, capture=True):
+        self.command = [part.format(config=config_path) for part in command]
+        self.config = config
+        self.config_path = config_path
+        self.socks_port = socks_port
+        self.output = output if output is not None else []
+        self.capture = capture       # False: discard output, no pump thread
+        self.process = None
+
+    def start(self):
+        if not self.capture:
+            self.process = Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return self
+        self.process = Popen(self.command, stdout=PIPE, stderr=STDOUT, text=True)
+        threading.Thread(target=self._pump_output, daemon=True).start()
+        return self
+
+    def _pump_output(self):
+        for line in self.process.stdout:
+            self.output.append(line.rstrip())
+            del self.output[:-200]
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def wait_ready(self, timeout=10.0):
+        """Block until the local SOCKS port accepts connections"""
+        deadline = time.monotonic() + timeout
+        while self.alive():
+            try:
+                with socket.create_connection(('127.0.0.1', self.socks_port), timeout=0.2):
+                    return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(0.01)
+        return False
+
+    def stop(self, timeout=3.0):
+        if not self.process:
+            return
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=timeout)
+            except TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+
+class FastSwitcher:
+    """Keeps the next-best server warm so failover only pays the attach cost"""
+
+    def __init__(self, command, dns_cache, validator, converter, tunnel_format='xray',
+                 standby_port=TUNNEL_SOCKS_PORT + 1, prespawn=True, routing_provider=None, tuning_provider=None):
+        self.command = command
+        self.converter = converter
+        self.tunnel_format = tunnel_format
+        self.routing_provider = routing_provider
+        self.tuning_provider = tuning_provider
+        self.dns_cache = dns_cache
+        self.validator = validator
+        self.standby_port = standby_port
+        self.prespawn = prespawn
+        self.standby = None      # {'config', 'path', 'port', 'process', 'prepared'}
+        self.lock = Lock()
+        self.timings = []        # (mode, milliseconds) per switch
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    def prepare(self, config, active_port=TUNNEL_SOCKS_PORT):
+        """Resolve, handshake and render config (and optionally start it) as standby"""
+        with self.lock:
+            if self.standby and self.standby['config']['hash'] == config['hash']:
+                return self.standby
+
+        verdict = self.validator.check(config)
+        if not verdict['ok']:
+            self.logger.info(f"Standby candidate {config['name']} failed: {verdict['error']}")
+            return None
+
+        # Pin the resolved address so the tunnel binary skips its own lookup
+        address = self.dns_cache.resolve(config['address'])[0]
+        port = self.standby_port if self.standby_port != active_port else active_port + 1
+        routing_rules = self.routing_provider() if self.routing_provider else None
+        tuning = self.tuning_provider(config) if self.tuning_provider else None
+        path = self.converter.render_file(config, self.tunnel_format, socks_port=port,
+                                          address=address, routing_rules=routing_rules, tuning=tuning)
+        standby = {'config': config, 'path': path, 'port': port,
+                   'process': None, 'prepared': time.time()}
+
+        if self.prespawn:
+            tunnel = TunnelProcess(self.command, config, path, socks_port=port).start()
+            if tunnel.wait_ready():
+                standby['process'] = tunnel
+            else:
+                tunnel.stop()
+
+        with self.lock:
+            old, self.standby = self.standby, standby
+        if old and old['process']:
+            old['process'].stop()
+        self.logger.info(f"Standby ready: {config['name']} on port {port}")
+        return standby
+
+    def take(self, config=None):
+        """Hand over the standby (if it matches config) and forget it"""
+        with self.lock:
+            standby = self.standby
+            if standby and (config is None or standby['config']['hash'] == config['hash']):
+                self.standby = None
+                return standby
+        return None
+
+    def discard(self):
+        standby = self.take()
+        if standby and standby['process']:
+            standby['process'].stop()
+
+    def record(self, mode, started):
+        elapsed = round((time.perf_counter() - started) * 1000, 2)
+        self.timings.append((mode, elapsed))
+        del self.timings[:-100]
+        self.logger.info(f"Switch ({mode}) took {elapsed} ms")
+        return elapsed
+
+
+class SocksFront:
+    """Fixed user-facing SOCKS port relaying to whichever tunnel is active.
+
+    Tunnels listen on internal ports; a switch only retargets the relay, so
+    browsers and system proxy settings pointing at port keep working.
+    Connections already open stay on their old tunnel until it stops.
+    """
+
+    BUFFER = 1 << 16
+
+    def __init__(self, port=TUNNEL_SOCKS_PORT, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+        self.backend_port = None
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = Event()
+        self.error = None
+        self.stats = {'connections': 0, 'active': 0, 'refused': 0, 'bytes': 0}
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='socks-front', daemon=True)
+        self.thread.start()
+        if not self.ready.wait(5) or self.error:
+            raise RuntimeError(f"SOCKS front on port {self.port} did not start: {self.error}")
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port, backlog=1024))
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+        self.loop.run_forever()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def retarget(self, backend_port):
+        """Send new connections to backend_port (None: refuse them). Returns the previous port"""
+        previous, self.backend_port = self.backend_port, backend_port
+        return previous
+
+    async def _handle_client(self, reader, writer):
+        backend_port = self.backend_port
+        if backend_port is None:
+            self.stats['refused'] += 1
+            writer.close()
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection('127.0.0.1', backend_port)
+        except OSError:
+            self.stats['refused'] += 1
+            writer.close()
+            return
+        self.stats['connections'] += 1
+        self.stats['active'] += 1
+        try:
+            await asyncio.gather(self._pipe(reader, upstream_writer), self._pipe(upstream_reader, writer))
+        finally:
+            self.stats['active'] -= 1
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(self.BUFFER)
+                if not data:
+                    break
+                writer.write(data)
+                self.stats['bytes'] += len(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+# ===== CONNECTION HEALTH WATCHDOG =====
+def socks5_connect(socks_port, host, port, timeout=1.5):
+    """Socket connected to host:port through a local SOCKS5 proxy"""
+    sock = socket.create_connection(('127.0.0.1', socks_port), timeout=timeout)
+    try:
+        sock.sendall(b'\x05\x01\x00')
+        if sock.recv(2) != b'\x05\x00':
+            raise ConnectionError("SOCKS greeting rejected")
+
+        try:
+            target = b'\x01' + socket.inet_aton(host)
+        except OSError:
+            encoded = host.encode('idna')
+            target = b'\x03' + bytes([len(encoded)]) + encoded
+        sock.sendall(b'\x05\x01\x00' + target + port.to_bytes(2, 'big'))
+
+        reply = sock.recv(10)
+        if len(reply) < 2 or reply[1] != 0:
+            raise ConnectionError(f"SOCKS connect failed (code {reply[1] if len(reply) > 1 else '?'})")
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def socks5_probe(socks_port, host, port, timeout=1.5):
+    """Open a connection to host:port through a local SOCKS5 proxy. Returns latency in ms"""
+    started = time.perf_counter()
+    socks5_connect(socks_port, host, port, timeout).close()
+    return (time.perf_counter() - started) * 1000
+
+
+class HealthWatchdog:
+    """Adaptive tunnel health checks with automatic failover.
+
+    Cheap passive checks (process alive, traffic counters) run every tick;
+    active probes back off while healthy and tighten on any anomaly.
+    on_failure returns True when it recovered the tunnel; otherwise the
+    watchdog disarms itself until start() is called again (on the next
+    successful connect), so a dead tunnel is not failed over every tick.
+    """
+
+    def __init__(self, stop_event, probe, on_failure, is_alive=None, counters=None,
+                 tick=0.5, min_interval=0.5, max_interval=5.0, backoff=1.5,
+                 failure_threshold=2, stall_ticks=4):
+        self.stop_event = stop_event
+        self.probe = probe
+        self.on_failure = on_failure
+        self.is_alive = is_alive or (lambda: True)
+        self.counters = counters or self._net_counters
+        self.tick = tick
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.stall_ticks = stall_ticks
+
+        self.interval = min_interval
+        self.failures = 0
+        self.stalled = 0
+        self.last_counters = None
+        self.armed = False
+        self.stats = {'probes': 0, 'probe_failures': 0, 'stalls': 0, 'failovers': 0,
+                      'failed_failovers': 0, 'last_latency_ms': None}
+        self.thread = None
+        self.lock = Lock()
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    @staticmethod
+    def _net_counters():
+        counters = psutil.net_io_counters()
+        return counters.bytes_recv, counters.bytes_sent
+
+    def start(self):
+        """Arm the watchdog, starting its thread if needed"""
+        self.failures = 0
+        self.stalled = 0
+        self.last_counters = None
+        self.interval = self.min_interval
+        self.armed = True
+        with self.lock:
+            if self.thread is threading.current_thread():
+                # A failover reconnecting from inside the loop: keep this thread running
+                self.stop_event.clear()
+                return
+            if self.thread and self.thread.is_alive():
+                if not self.stop_event.is_set():
+                    return
+                # Stopped but still inside wait(tick) or a probe: it would exit after we
+                # cleared the event, leaving the watchdog armed with no thread
+                self.thread.join()
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='health-watchdog', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _stall_detected(self):
+        """Outgoing traffic with nothing coming back for several ticks"""
+        try:
+            current = self.counters()
+        except Exception:
+            return False
+        previous, self.last_counters = self.last_counters, current
+        if previous is None:
+            return False
+
+        rx_delta = current[0] - previous[0]
+        tx_delta = current[1] - previous[1]
+        if tx_delta > 0 and rx_delta == 0:
+            self.stalled += 1
+        else:
+            self.stalled = 0
+        return self.stalled >= self.stall_ticks
+
+    def _run(self):
+        next_probe = time.monotonic()
+        while not self.stop_event.wait(self.tick):
+            if not self.armed:
+                next_probe = time.monotonic()
+                continue
+            if not self.is_alive():
+                self._fail("tunnel process exited")
+                next_probe = time.monotonic()
+                continue
+
+            if self._stall_detected():
+                self.stats['stalls'] += 1
+                self.stalled = 0
+                # Suspicious: probe right away
+                self.interval = self.min_interval
+                next_probe = time.monotonic()
+
+            if time.monotonic() < next_probe:
+                continue
+
+            self.stats['probes'] += 1
+            try:
+                self.stats['last_latency_ms'] = round(self.probe(), 1)
+                self.failures = 0
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+            except Exception as e:
+                self.stats['probe_failures'] += 1
+                self.failures += 1
+                self.interval = self.min_interval
+                if self.failures >= self.failure_threshold:
+                    self._fail(f"probe failed: {e}")
+            next_probe = time.monotonic() + self.interval
+
+    def _fail(self, reason):
+        self.logger.warning(f"Tunnel unhealthy: {reason}")
+        self.failures = 0
+        self.stalled = 0
+        self.last_counters = None
+        self.interval = self.min_interval
+        self.stats['failovers'] += 1
+        recovered = False
+        try:
+            recovered = self.on_failure(reason)
+        except Exception as e:
+            self.logger.error(f"Failover failed: {e}")
+        if not recovered:
+            # Nothing left to fail over to: wait for the next connect instead of retrying every tick
+            self.armed = False
+            self.stats['failed_failovers'] += 1
+            self.logger.warning("Failover did not recover the tunnel; health checks paused until reconnect")
+
+# ===== AUTO-CONNECT RULE ENGINE =====
+class CompiledRule:
+    """A rule compiled into per-input predicates with cached results"""
+
+    __slots__ = ('id', 'name', 'priority', 'action', 'target', 'predicates',
+                 'results', 'matched')
+
+    def __init__(self, rule_id, name, priority, action, target, predicates):
+        self.id = rule_id
+        self.name = name
+        self.priority = priority
+        self.action = action
+        self.target = target
+        self.predicates = predicates          # input key -> predicate(value)
+        self.results = dict.fromkeys(predicates, False)
+        self.matched = False
+
+
+class AutoConnectRuleEngine:
+    """Evaluates auto-connect rules incrementally as network inputs change.
+
+    Rule conditions (all optional, all must hold):
+        ssid: ["Home*", "Office"]      interface: ["wlan*"]
+        time: "22:00-07:00"            days: [0, 1, 2, 3, 4] (Monday = 0)
+        latency_above: 250              latency_below: 80
+    Actions: connect | switch | disconnect; target: best | favorite | <config hash or name>
+    """
+
+    ACTIONS = ('connect', 'switch', 'disconnect')
+
+    def __init__(self, db_path, on_fire=None):
+        self.on_fire = on_fire
+        self.lock = Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS auto_connect_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                priority INTEGER DEFAULT 0,
+                enabled BOOLEAN DEFAULT 1,
+                conditions TEXT,
+                action TEXT,
+                target TEXT
+            )
+        ''')
+        self.conn.commit()
+
+        self.inputs = {}
+        self.rules = {}       # rule id -> CompiledRule
+        self.by_input = {}    # input key -> [CompiledRule] that must be scanned
+        self.by_value = {}    # input key -> value -> [CompiledRule] (equality conditions)
+        self.by_bound = {}    # input key -> (sorted boundaries, [CompiledRule]) (range conditions)
+        self.logger = logging.getLogger('KingzVPNPro')
+        self.reload()
+
+    # === STORAGE ===
+    def add_rule(self, name, conditions, action='connect', target='best', priority=0):
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        self.compile(0, name, priority, action, target, conditions)  # validate first
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO auto_connect_rules (name, priority, conditions, action, target) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (name, priority, json.dumps(conditions), action, target)
+            )
+            self.conn.commit()
+        self.reload()
+        return cursor.lastrowid
+
+    def remove_rule(self, rule_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM auto_connect_rules WHERE id = ?", (rule_id,))
+            self.conn.commit()
+        self.reload()
+
+    def list_rules(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, name, priority, enabled, conditions, action, target "
+                "FROM auto_connect_rules ORDER BY priority DESC, id"
+            ).fetchall()
+        keys = ('id', 'name', 'priority', 'enabled', 'conditions', 'action', 'target')
+        rules = [dict(zip(keys, row)) for row in rows]
+        for rule in rules:
+            rule['conditions'] = json.loads(rule['conditions'] or '{}')
+        return rules
+
+    def reload(self):
+        """Recompile every enabled rule and re-evaluate against current inputs"""
+        compiled = {}
+        for rule in self.list_rules():
+            if not rule['enabled']:
+                continue
+            try:
+                compiled[rule['id']] = self.compile(
+                    rule['id'], rule['name'], rule['priority'],
+                    rule['action'], rule['target'], rule['conditions']
+                )
+            except (ValueError, TypeError) as e:
+                self.logger.error(f"Skipping invalid rule {rule['name']}: {e}")
+
+        by_input, by_value, bounds = {}, {}, {}
+        for rule in compiled.values():
+            for key, predicate in rule.predicates.items():
+                exact = getattr(predicate, 'exact', None)
+                if exact is not None:
+                    for value in exact:
+                        by_value.setdefault(key, {}).setdefault(value, []).append(rule)
+                elif hasattr(predicate, 'bounds'):
+                    for bound in predicate.bounds:
+                        if math.isfinite(bound):
+                            bounds.setdefault(key, []).append((bound, rule.id, rule))
+                else:
+                    by_input.setdefault(key, []).append(rule)
+
+        by_bound = {}
+        for key, entries in bounds.items():
+            entries.sort(key=lambda entry: entry[:2])
+            by_bound[key] = ([entry[0] for entry in entries], [entry[2] for entry in entries])
+
+        with self.lock:
+            self.rules = compiled
+            self.by_input = by_input
+            self.by_value = by_value
+            self.by_bound = by_bound
+            for rule in compiled.values():
+                for key, predicate in rule.predicates.items():
+                    rule.results[key] = self._evaluate(predicate, self.inputs.get(key))
+                # Rules that already hold when loaded do not fire retroactively
+                rule.matched = all(rule.results.values())
+
+    # === COMPILATION ===
+    @staticmethod
+    def _glob_matcher(patterns):
+        patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+        exact = frozenset(p for p in patterns if not any(c in p for c in '*?['))
+        wildcard = [p for p in patterns if p not in exact]
+        regex = re.compile('|'.join(fnmatch.translate(p) for p in wildcard)) if wildcard else None
+
+        def match(value):
+            return value in exact or (regex is not None and regex.match(value) is not None)
+        # Pure equality matchers get indexed by value instead of scanned
+        match.exact = exact if regex is None else None
+        return match
+
+    @staticmethod
+    def _time_matcher(window, days=None):
+        start_text, _, end_text = window.partition('-')
+        start_h, start_m = map(int, start_text.split(':'))
+        end_h, end_m = map(int, end_text.split(':'))
+        start, end = start_h * 60 + start_m, end_h * 60 + end_m
+        days = frozenset(days) if days is not None else None
+
+        def match(value):
+            weekday, minute = value
+            if start <= end:
+                inside = start <= minute < end
+            else:  # wraps past midnight
+                inside = minute >= start or minute < end
+            return inside and (days is None or weekday in days)
+        return match
+
+    def compile(self, rule_id, name, priority, action, target, conditions):
+        predicates = {}
+        for key, value in conditions.items():
+            if key in ('ssid', 'interface'):
+                predicates[key] = self._glob_matcher(value)
+            elif key == 'time':
+                predicates['clock'] = self._time_matcher(value, conditions.get('days'))
+            elif key == 'days':
+                if 'time' not in conditions:
+                    allowed = frozenset(value)
+                    predicates['clock'] = lambda v, allowed=allowed: v[0] in allowed
+            elif key not in ('latency_above', 'latency_below'):
+                raise ValueError(f"Unknown condition: {key}")
+
+        if 'latency_above' in conditions or 'latency_below' in conditions:
+            low = float(conditions.get('latency_above', float('-inf')))
+            high = float(conditions.get('latency_below', float('inf')))
+            predicates['latency'] = lambda v, low=low, high=high: low < v < high
+            # Range matchers get indexed by their boundaries instead of scanned
+            predicates['latency'].bounds = (low, high)
+        if not predicates:
+            raise ValueError("Rule has no conditions")
+        return CompiledRule(rule_id, name, priority, action, target, predicates)
+
+    # === EVALUATION ===
+    @staticmethod
+    def _evaluate(predicate, value):
+        if value is None:
+            return False
+        try:
+            return bool(predicate(value))
+        except Exception:
+            return False
+
+    def update(self, **changes):
+        """Feed new input values; only rules reading a changed input are re-evaluated.
+
+        Returns the rule that fired (highest priority newly matching rule) or None.
+        """
+        fired = []
+        with self.lock:
+            for key, value in changes.items():
+                previous = self.inputs.get(key)
+                if previous == value:
+                    continue
+                self.inputs[key] = value
+
+                # Equality rules can only flip for the old or the new value; a rule
+                # holding both (Home -> Office, both listed) stays matched and does not refire
+                indexed = self.by_value.get(key, {})
+                touched = {rule.id: rule for rule in indexed.get(previous, ())}
+                touched.update((rule.id, rule) for rule in indexed.get(value, ()))
+                for rule in touched.values():
+                    rule.results[key] = self._evaluate(rule.predicates[key], value)
+                    self._settle(rule, fired)
+
+                # Range rules can only flip if a boundary lies between old and new
+                scan = list(self.by_input.get(key, ()))
+                if key in self.by_bound:
+                    boundaries, bounded = self.by_bound[key]
+                    if previous is None or value is None:
+                        scan.extend(bounded)
+                    else:
+                        low, high = min(previous, value), max(previous, value)
+                        scan.extend(bounded[bisect.bisect_left(boundaries, low):
+                                            bisect.bisect_right(boundaries, high)])
+
+                for rule in scan:
+                    rule.results[key] = self._evaluate(rule.predicates[key], value)
+                    self._settle(rule, fired)
+
+        if not fired:
+            return None
+        winner = max(fired, key=lambda rule: (rule.priority, -rule.id))
+        self.logger.info(f"Auto-connect rule fired: {winner.name} -> {winner.action} {winner.target}")
+        if self.on_fire:
+            self.on_fire(winner)
+        return winner
+
+    @staticmethod
+    def _settle(rule, fired):
+        matched = all(rule.results.values())
+        if matched and not rule.matched:
+            fired.append(rule)
+        rule.matched = matched
+
+    def tick_clock(self, now=None):
+        """Update the time-of-day input (minute resolution)"""
+        now = now or datetime.now()
+        return self.update(clock=(now.weekday(), now.hour * 60 + now.minute))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def current_network():
+    """Best-effort (ssid, interface) of the active network connection"""
+    interface = None
+    if NETIFACES_AVAILABLE:
+        try:
+            default = netifaces.gateways().get('default', {}).get(netifaces.AF_INET)
+            if default:
+                interface = default[1]
+        except Exception:
+            pass
+    if interface is None:
+        stats = psutil.net_if_stats()
+        up = [name for name, st in stats.items() if st.isup and not name.startswith(('lo', 'Loopback'))]
+        interface = up[0] if up else None
+
+    system = platform.system()
+    if system == 'Windows':
+        command, pattern = ['netsh', 'wlan', 'show', 'interfaces'], r'^\s*SSID\s*:\s*(.+)$'
+    elif system == 'Darwin':
+        command, pattern = ['networksetup', '-getairportnetwork', 'en0'], r'Network:\s*(.+)$'
+    else:
+        command, pattern = ['iwgetid', '-r'], r'^(.+)$'
+
+    ssid = ''
+    try:
+        output = subprocess_check_output(command, text=True, timeout=3, stderr=subprocess.DEVNULL)
+        found = re.search(pattern, output, re.MULTILINE)
+        if found:
+            ssid = found.group(1).strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return ssid, interface
+
+# ===== SPLIT-TUNNEL ROUTE COMPILER =====
+class CIDRTrie:
+    """Multibit (8-bit stride) radix trie for longest-prefix IP lookups"""
+
+    STRIDE = 8
+
+    def __init__(self, version=4):
+        self.version = version
+        self.bits = 32 if version == 4 else 128
+        self.root = ({}, {})     # (leaf values by chunk, child nodes by chunk)
+        self.count = 0
+
+    def insert(self, network_int, prefixlen, value=True):
+        """Insert a prefix. Insert shorter prefixes first so longer ones win"""
+        node = self.root
+        consumed = 0
+        while prefixlen - consumed > self.STRIDE:
+            chunk = (network_int >> (self.bits - consumed - self.STRIDE)) & 0xFF
+            node = node[1].setdefault(chunk, ({}, {}))
+            consumed += self.STRIDE
+
+        # Expand the remaining 1..8 bits into every chunk they cover
+        remaining = prefixlen - consumed
+        chunk = (network_int >> (self.bits - consumed - self.STRIDE)) & 0xFF
+        span = 1 << (self.STRIDE - remaining)
+        base = chunk & ~(span - 1) & 0xFF
+        leaves = node[0]
+        for c in range(base, base + span):
+            leaves[c] = value
+        self.count += 1
+
+    def lookup(self, address_int):
+        """Value of the longest matching prefix, or None"""
+        node = self.root
+        best = None
+        shift = self.bits - self.STRIDE
+        while node is not None and shift >= 0:
+            chunk = (address_int >> shift) & 0xFF
+            value = node[0].get(chunk)
+            if value is not None:
+                best = value
+            node = node[1].get(chunk)
+            shift -= self.STRIDE
+        return best
+
+    def __contains__(self, address):
+        return self.lookup(int(ipaddress.ip_address(address))) is not None
+
+
+class RouteListCompiler:
+    """Aggregates CIDR lists into minimal prefix sets and renders routing output"""
+
+    def __init__(self, cache_dir=os.path.join(CACHE_DIR, 'routes')):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    @staticmethod
+    def _ranges_to_cidrs(ranges, bits):
+        """Merge (start, end) integer ranges and cover them with the fewest prefixes"""
+        ranges.sort()
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+
+        full = 1 << bits
+        cidrs = []
+        for start, end in merged:
+            while start <= end:
+                size = start & -start if start else full
+                while size > end - start + 1:
+                    size >>= 1
+                cidrs.append((start, bits - size.bit_length() + 1))
+                start += size
+        return cidrs
+
+    def aggregate(self, lines):
+        """Parse CIDR lines (comments/blank lines ignored) into {'v4': [...], 'v6': [...]}"""
+        ranges = {4: [], 6: []}
+        invalid = 0
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                network = ipaddress.ip_network(line, strict=False)
+            except ValueError:
+                invalid += 1
+                continue
+            start = int(network.network_address)
+            ranges[network.version].append((start, start + network.num_addresses - 1))
+        if invalid:
+            self.logger.warning(f"Route list: skipped {invalid} invalid entries")
+
+        return {
+            'v4': [f"{ipaddress.IPv4Address(n)}/{p}" for n, p in self._ranges_to_cidrs(ranges[4], 32)],
+            'v6': [f"{ipaddress.IPv6Address(n)}/{p}" for n, p in self._ranges_to_cidrs(ranges[6], 128)],
+        }
+
+    def compile(self, source):
+        """Compile a list (text or path), reusing the cached artefact when unchanged"""
+        if os.path.isfile(source):
+            with open(source, encoding='utf-8') as f:
+                source = f.read()
+
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{digest}.json")
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, JSONDecodeError):
+            pass
+
+        compiled = self.aggregate(source.splitlines())
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(compiled, f)
+        os.replace(tmp_path, cache_path)
+        self.logger.info(f"Compiled route list: {len(compiled['v4'])} IPv4, {len(compiled['v6'])} IPv6 prefixes")
+        return compiled
+
+    @staticmethod
+    def build_trie(compiled, value=True):
+        """Lookup structure for a compiled list: {4: CIDRTrie, 6: CIDRTrie}"""
+        tries = {4: CIDRTrie(4), 6: CIDRTrie(6)}
+        for key, version in (('v4', 4), ('v6', 6)):
+            networks = [ipaddress.ip_network(cidr) for cidr in compiled[key]]
+            networks.sort(key=lambda n: n.prefixlen)
+            for network in networks:
+                tries[version].insert(int(network.network_address), network.prefixlen, value)
+        return tries
+
+    @staticmethod
+    def to_openvpn(compiled, gateway='net_gateway'):
+        """OpenVPN route directives sending the listed ranges outside the tunnel"""
+        lines = []
+        for cidr in compiled['v4']:
+            network = ipaddress.IPv4Network(cidr)
+            lines.append(f"route {network.network_address} {network.netmask} {gateway}")
+        if compiled['v6']:
+            lines.append(f"# {len(compiled['v6'])} IPv6 prefixes omitted (no IPv6 net_gateway in OpenVPN)")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def to_xray_rules(compiled, outbound='direct'):
+        """xray routing rule sending the listed ranges to outbound"""
+        ips = compiled['v4'] + compiled['v6']
+        return [{'type': 'field', 'ip': ips, 'outboundTag': outbound}] if ips else []
+
+# ===== DOMAIN ROUTING MATCHER =====
+class DomainMatcher:
+    """Memory-mapped domain rule table with suffix and exact matching.
+
+    Rules use geosite syntax: "example.com" / "domain:example.com" match the
+    domain and its subdomains, "full:" matches exactly, "keyword:" and
+    "regexp:" are kept as a (small) side list. Suffixes are stored as 64-bit
+    hashes in an open-addressing table so a lookup costs one probe per label
+    and the file can be shared by mmap between processes.
+    """
+
+    MAGIC = b'KVDM'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHIII')   # magic, version, reserved, slots, entries, meta length
+    SLOT = struct.Struct('<Q')
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, slots, entries, meta_len = self.HEADER.unpack_from(self.mm, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError(f"Not a domain matcher file: {path}")
+
+        meta_start = self.HEADER.size
+        meta = json.loads(self.mm[meta_start:meta_start + meta_len].decode('utf-8'))
+        self.outbounds = meta['outbounds']
+        self.keywords = [(k, o) for k, o in meta['keywords']]
+        self.regexps = [(re.compile(r), o) for r, o in meta['regexps']]
+        self.entries = entries
+        self.mask = slots - 1
+        self.keys_offset = meta_start + meta_len
+        self.values_offset = self.keys_offset + slots * self.SLOT.size
+
+    @staticmethod
+    def key(text):
+        # Stable across runs (unlike hash()) and cheap; 0 marks an empty slot
+        data = text.encode('utf-8')
+        return zlib.adler32(data) << 32 | zlib.crc32(data) | 1 << 63
+
+    @staticmethod
+    def parse_rule(line):
+        """Return (kind, value) for a geosite-style line, or None"""
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            return None
+        line = line.split(' @', 1)[0].strip()   # drop attributes
+        kind, sep, value = line.partition(':')
+        if not sep:
+            kind, value = 'domain', line
+        if kind not in ('domain', 'full', 'keyword', 'regexp'):
+            return None
+        value = value.strip()
+        return (kind, value if kind == 'regexp' else value.lower().strip('.'))
+
+    @classmethod
+    def build(cls, rules, path):
+        """Write a matcher file. rules: {outbound: iterable of lines}, earlier outbounds win"""
+        outbounds = list(rules)
+        if len(outbounds) > 255:
+            raise ValueError("Too many outbounds")
+
+        hashed, keywords, regexps = {}, [], []
+        for index, outbound in enumerate(outbounds):
+            for line in rules[outbound]:
+                parsed = cls.parse_rule(line)
+                if parsed is None:
+                    continue
+                kind, value = parsed
+                if kind == 'keyword':
+                    keywords.append((value, outbound))
+                elif kind == 'regexp':
+                    regexps.append((value, outbound))
+                else:
+                    text = ('=' if kind == 'full' else '.') + value
+                    hashed.setdefault(cls.key(text), index + 1)
+
+        slots = 1 << max(4, (len(hashed) * 2 - 1).bit_length())
+        mask = slots - 1
+        keys = array('Q', bytes(slots * 8))
+        values = bytearray(slots)
+        for key, value in hashed.items():
+            slot = key & mask
+            while keys[slot]:
+                slot = (slot + 1) & mask
+            keys[slot] = key
+            values[slot] = value
+
+        if sys.byteorder != 'little':
+            keys.byteswap()
+        meta = json.dumps({'outbounds': outbounds, 'keywords': keywords,
+                           'regexps': regexps}).encode('utf-8')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, slots, len(hashed), len(meta)))
+            f.write(meta)
+            f.write(keys.tobytes())
+            f.write(values)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def compile(cls, rules, cache_dir=os.path.join(CACHE_DIR, 'domains')):
+        """Build (or reuse) the cached matcher for rules and open it"""
+        os.makedirs(cache_dir, exist_ok=True)
+        rules = {outbound: list(lines) for outbound, lines in rules.items()}
+        digest = hashlib.sha256(json.dumps(rules, sort_keys=False).encode('utf-8')).hexdigest()
+        path = os.path.join(cache_dir, f"{digest}.kvdm")
+        if not os.path.exists(path):
+            cls.build(rules, path)
+        return cls(path)
+
+    def _probe(self, key):
+        unpack = self.SLOT.unpack_from
+        mm = self.mm
+        slot = key & self.mask
+        while True:
+            stored = unpack(mm, self.keys_offset + slot * 8)[0]
+            if stored == key:
+                return mm[self.values_offset + slot]
+            if not stored:
+                return 0
+            slot = (slot + 1) & self.mask
+
+    def match(self, domain):
+        """Outbound for domain (most specific rule wins), or None"""
+        domain = domain.lower().rstrip('.')
+        probe, key = self._probe, self.key
+
+        value = probe(key('=' + domain))
+        if value:
+            return self.outbounds[value - 1]
+
+        suffix = domain
+        while True:
+            value = probe(key('.' + suffix))
+            if value:
+                return self.outbounds[value - 1]
+            dot = suffix.find('.')
+            if dot < 0:
+                break
+            suffix = suffix[dot + 1:]
+
+        for keyword, outbound in self.keywords:
+            if keyword in domain:
+                return outbound
+        for pattern, outbound in self.regexps:
+            if pattern.search(domain):
+                return outbound
+        return None
+
+    def parent_outbound(self, domain):
+        """Outbound of the closest suffix rule strictly above domain, or None"""
+        probe, key = self._probe, self.key
+        suffix = domain.lower().rstrip('.')
+        while True:
+            dot = suffix.find('.')
+            if dot < 0:
+                return None
+            suffix = suffix[dot + 1:]
+            value = probe(key('.' + suffix))
+            if value:
+                return self.outbounds[value - 1]
+
+    @classmethod
+    def to_xray_rules(cls, rules, matcher=None):
+        """xray routing rules equivalent to rules ({outbound: lines}).
+
+        With the matcher compiled from the same rules, duplicates and domains
+        a broader suffix already sends to the same outbound are left out, so
+        large lists reach the tunnel binary minimal.
+        """
+        result = []
+        for outbound, lines in rules.items():
+            domains = []
+            seen = set()
+            for line in lines:
+                parsed = cls.parse_rule(line)
+                if not parsed:
+                    continue
+                entry = f"{parsed[0]}:{parsed[1]}"
+                if matcher is not None:
+                    if entry in seen:
+                        continue
+                    seen.add(entry)
+                    if parsed[0] in ('domain', 'full') and matcher.parent_outbound(parsed[1]) == outbound:
+                        continue
+                domains.append(entry)
+            if domains:
+                result.append({'type': 'field', 'domain': domains, 'outboundTag': outbound})
+        return result
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+# ===== QR CODE EXPORT AND IMPORT =====
+def render_qr_png(text, box_size=6, border=2):
+    """Render text as a QR code PNG. Returns bytes, or None if it does not fit"""
+    # A fixed mask skips scoring all eight patterns (~4x faster, still valid for readers)
+    options = dict(error_correction=qrcode.constants.ERROR_CORRECT_L, border=border)
+    try:
+        qr = qrcode.QRCode(mask_pattern=2, **options)
+    except TypeError:  # qrcode < 7.4
+        qr = qrcode.QRCode(**options)
+    qr.add_data(text)
+    try:
+        qr.make(fit=True)
+    except qrcode.exceptions.DataOverflowError:
+        return None
+
+    # Draw the module matrix directly instead of one rectangle per module
+    matrix = qr.get_matrix()
+    size = len(matrix)
+    pixels = bytes(0 if dark else 255 for row in matrix for dark in row)
+    image = Image.frombytes('L', (size, size), pixels)
+    image = image.resize((size * box_size, size * box_size), Image.NEAREST).convert('1')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def decode_qr_image(path):
+    """Return the text payloads of every QR code found in an image file"""
+    with Image.open(path) as image:
+        return [symbol.data.decode('utf-8', 'ignore')
+                for symbol in pyzbar_decode(image.convert('L'))
+                if symbol.type == 'QRCODE']
+
+
+class QRCodec:
+    """Bulk QR rendering in a process pool with an LRU cache keyed by config hash"""
+
+    def __init__(self, cache_size=256, max_workers=None, box_size=6):
+        self.cache = OrderedDict()     # config hash -> PNG bytes (None = does not fit)
+        self.cache_size = cache_size
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.box_size = box_size
+        self.lock = Lock()
+        self.pool = None
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    def _pool(self):
+        # spawn: forking a process that runs Tk and worker threads is unsafe
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return self.pool
+
+    def _cache_get(self, key):
+        with self.lock:
+            if key not in self.cache:
+                return False, None
+            self.cache.move_to_end(key)
+            return True, self.cache[key]
+
+    def _cache_put(self, key, png):
+        with self.lock:
+            self.cache[key] = png
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def render(self, config):
+        """PNG bytes for one config (rendered in-process, it is only a few ms)"""
+        hit, png = self._cache_get(config['hash'])
+        if not hit:
+            png = render_qr_png(config['uri'], self.box_size)
+            self._cache_put(config['hash'], png)
+        return png
+
+    def render_many(self, configs):
+        """Yield (config, png) for configs; cache misses are rendered in parallel"""
+        pending = []
+        for config in configs:
+            hit, png = self._cache_get(config['hash'])
+            if hit:
+                yield config, png
+            else:
+                pending.append(config)
+        if not pending:
+            return
+
+        if len(pending) < 8:
+            for config in pending:
+                yield config, self.render(config)
+            return
+
+        chunksize = max(1, len(pending) // (self.max_workers * 4))
+        results = self._pool().map(render_qr_png, [c['uri'] for c in pending],
+                                   [self.box_size] * len(pending), chunksize=chunksize)
+        for config, png in zip(pending, results):
+            self._cache_put(config['hash'], png)
+            yield config, png
+
+    def export(self, configs, directory):
+        """Write one PNG per config into directory. Returns (written, skipped)"""
+        os.makedirs(directory, exist_ok=True)
+        written, skipped = 0, 0
+        used = set()
+        for config, png in self.render_many(configs):
+            if png is None:
+                skipped += 1
+                continue
+            name = re.sub(r'[^\w.-]+', '_', config['name']).strip('._')[:60] or config['hash'][:12]
+            if name in used:
+                name = f"{name}-{config['hash'][:8]}"
+            used.add(name)
+            with open(os.path.join(directory, f"{name}.png"), 'wb') as f:
+                f.write(png)
+            written += 1
+        if skipped:
+            self.logger.warning(f"QR export: {skipped} configs too long for a QR code")
+        return written, skipped
+
+    @staticmethod
+    def decode_files(paths, max_workers=4):
+        """Decode QR images into parsed configs (duplicates dropped)"""
+        if not PYZBAR_AVAILABLE:
+            raise RuntimeError("pyzbar is required to read QR codes")
+        configs, seen = [], set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for payloads in executor.map(decode_qr_image, paths):
+                for payload in payloads:
+                    for link in decode_subscription_payload(payload):
+                        config = parse_config_link(link)
+                        if config and config['hash'] not in seen:
+                            seen.add(config['hash'])
+                            configs.append(config)
+        return configs
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+# ===== BULK PASTE PARSER =====
+SHARE_LINK_RE = re.compile(r'(?:%s)://[^\s"\'<>]+' % '|'.join(SUPPORTED_LINK_SCHEMES), re.IGNORECASE)
+BASE64_RE = re.compile(r'[A-Za-z0-9+/_=\s-]+')
+
+
+def looks_like_config_payload(text, sample=4096):
+    """Cheap check (on a prefix only) for pasted share links or a base64 subscription blob"""
+    head = text[:sample]
+    if SHARE_LINK_RE.search(head):
+        return True
+    if len(head) < 64 or not BASE64_RE.fullmatch(head):
+        return False
+    head = ''.join(head.split())
+    try:
+        decoded = b64decode_padded(head[:len(head) - len(head) % 4]).decode('utf-8', 'ignore')
+    except ValueError:
+        return False
+    return SHARE_LINK_RE.search(decoded) is not None
+
+
+def iter_share_links(text, chunk_size=1 << 16, sample=4096):
+    """Stream share links out of pasted text, one chunk at a time.
+
+    Links may be separated by any whitespace or embedded in other text;
+    a base64 blob (a whole subscription) is decoded and scanned instead.
+    """
+    if not SHARE_LINK_RE.search(text[:sample]):
+        if not BASE64_RE.fullmatch(text[:sample]):
+            return
+        try:
+            decoded = b64decode_padded(''.join(text.split())).decode('utf-8', 'ignore')
+        except ValueError:
+            return
+        if SHARE_LINK_RE.search(decoded[:sample]):
+            yield from iter_share_links(decoded, chunk_size, sample)
+        return
+
+    carry = ''
+    for start in range(0, len(text), chunk_size):
+        chunk = carry + text[start:start + chunk_size]
+        more = start + chunk_size < len(text)
+        # The longest scheme prefix ("hysteria2://") may straddle chunks
+        carry = chunk[-16:] if more else ''
+        for found in SHARE_LINK_RE.finditer(chunk):
+            if more and found.end() == len(chunk):
+                carry = chunk[found.start():]
+                break
+            yield found.group(0).rstrip(',;')
+            if more:
+                carry = chunk[max(found.end(), len(chunk) - 16):]
+
+# ===== TRAFFIC TIME-SERIES STORE =====
+class TimeSeriesStore:
+    """Fixed-size multi-resolution ring buffers for throughput/latency samples.
+
+    Every sample is folded into each tier (mean and max per slot), so
+    memory is constant no matter how long the session runs. Persisted as
+    one compact binary file.
+    """
+
+    MAGIC = b'KVTS'
+    VERSION = 1
+    METRICS = ('rx_bps', 'tx_bps', 'latency_ms')
+    TIERS = ((1, 600), (60, 1440), (3600, 744))   # (seconds per slot, slots): 10 min, 1 day, 31 days
+    FIELDS = 3                                     # sum, count, max per metric
+
+    def __init__(self, path=None, metrics=METRICS, tiers=TIERS):
+        self.path = path
+        self.metrics = tuple(metrics)
+        self.index = {name: i for i, name in enumerate(self.metrics)}
+        self.tiers = tuple(tiers)
+        self.width = len(self.metrics) * self.FIELDS
+        self.lock = Lock()
+        # Per tier: bucket number per slot (-1 = empty) and slots x width values
+        self.stamps = [array('q', [-1]) * slots for _, slots in self.tiers]
+        self.values = [array('d', bytes(8 * slots * self.width)) for _, slots in self.tiers]
+        self.blank = array('d', bytes(8 * self.width))
+        self.newest = 0      # latest sample time; tiers cover the slots before it
+        self.logger = logging.getLogger('KingzVPNPro')
+        if path and os.path.exists(path):
+            try:
+                self.load()
+            except (OSError, ValueError, struct.error) as e:
+                self.logger.warning(f"Discarding unreadable traffic history: {e}")
+
+    def record(self, timestamp=None, **samples):
+        """Add one sample per given metric (missing metrics are left untouched)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        columns = [(self.index[name] * self.FIELDS, float(value))
+                   for name, value in samples.items() if value is not None]
+        with self.lock:
+            self.newest = max(self.newest, timestamp)
+            for tier, (resolution, slots) in enumerate(self.tiers):
+                bucket = int(timestamp // resolution)
+                slot = bucket % slots
+                values = self.values[tier]
+                base = slot * self.width
+                if self.stamps[tier][slot] != bucket:
+                    self.stamps[tier][slot] = bucket
+                    values[base:base + self.width] = self.blank
+                for column, value in columns:
+                    offset = base + column
+                    values[offset] += value
+                    values[offset + 1] += 1
+                    if values[offset + 1] == 1 or value > values[offset + 2]:
+                        values[offset + 2] = value
+
+    def _tier_for(self, start, resolution):
+        for tier, (tier_resolution, slots) in enumerate(self.tiers):
+            if resolution is not None and tier_resolution < resolution:
+                continue
+            # Allow one bucket of slack so "the last 10 minutes" still fits the 600 s tier
+            if int(start // tier_resolution) >= int(self.newest // tier_resolution) - slots:
+                return tier
+        return len(self.tiers) - 1
+
+    def query(self, metric, start, end=None, resolution=None, aggregate='mean'):
+        """(timestamps, values) for metric in [start, end], from the finest tier covering start.
+
+        Returns numpy arrays when numpy is available, lists otherwise.
+        """
+        end = time.time() if end is None else end
+        tier = self._tier_for(start, resolution)
+        tier_resolution, slots = self.tiers[tier]
+        column = self.index[metric] * self.FIELDS
+        first, last = int(start // tier_resolution), int(end // tier_resolution)
+
+        with self.lock:
+            stamps = array('q', self.stamps[tier])
+            values = array('d', self.values[tier])
+
+        if NUMPY_AVAILABLE:
+            buckets = np.frombuffer(stamps, dtype=np.int64)
+            table = np.frombuffer(values, dtype=np.float64).reshape(slots, self.width)
+            counts = table[:, column + 1]
+            mask = (buckets >= first) & (buckets <= last) & (counts > 0)
+            order = np.argsort(buckets[mask])
+            times = buckets[mask][order] * tier_resolution
+            if aggregate == 'max':
+                series = table[mask, column + 2][order]
+            else:
+                series = table[mask, column][order] / counts[mask][order]
+            return times, series
+
+        rows = []
+        for slot, bucket in enumerate(stamps):
+            count = values[slot * self.width + column + 1]
+            if first <= bucket <= last and count:
+                offset = slot * self.width + column
+                value = values[offset + 2] if aggregate == 'max' else values[offset] / count
+                rows.append((bucket * tier_resolution, value))
+        rows.sort()
+        return [t for t, _ in rows], [v for _, v in rows]
+
+    def latest(self, metric, seconds=60):
+        """Convenience: the last `seconds` of metric at the finest resolution"""
+        return self.query(metric, time.time() - seconds)
+
+    def nbytes(self):
+        return sum(len(s) * s.itemsize for s in self.stamps) + sum(len(v) * v.itemsize for v in self.values)
+
+    # === PERSISTENCE ===
+    def _header(self):
+        return struct.pack('<4sHHH', self.MAGIC, self.VERSION, len(self.metrics), len(self.tiers))
+
+    def _layout(self):
+        names = ','.join(self.metrics).encode('utf-8')
+        tiers = b''.join(struct.pack('<II', resolution, slots) for resolution, slots in self.tiers)
+        return struct.pack('<H', len(names)) + names + tiers
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self.lock:
+            payload = [self._header(), self._layout()]
+            for stamps, values in zip(self.stamps, self.values):
+                payload.append(stamps.tobytes())
+                payload.append(values.tobytes())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            # Native byte order: the file never leaves this machine
+            f.write(b''.join(payload))
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        with open(path, 'rb') as f:
+            data = f.read()
+        expected = self._header() + self._layout()
+        if not data.startswith(expected):
+            raise ValueError("layout changed")
+        offset = len(expected)
+        loaded = []
+        for _, slots in self.tiers:
+            stamps, values = array('q'), array('d')
+            stamps.frombytes(data[offset:offset + slots * 8])
+            offset += slots * 8
+            values.frombytes(data[offset:offset + slots * self.width * 8])
+            offset += slots * self.width * 8
+            if len(stamps) != slots or len(values) != slots * self.width:
+                raise ValueError("truncated file")
+            loaded.append((stamps, values))
+        with self.lock:
+            self.stamps = [stamps for stamps, _ in loaded]
+            self.values = [values for _, values in loaded]
+            self.newest = max(self.stamps[0]) * self.tiers[0][0] if self.stamps else 0
+
+# ===== LIVE BANDWIDTH GRAPH =====
+def format_rate(bps):
+    """Human readable bits per second"""
+    for unit, size in (('Gbps', 1e9), ('Mbps', 1e6), ('Kbps', 1e3)):
+        if bps >= size:
+            return f"{bps / size:.1f} {unit}"
+    return f"{bps:.0f} bps"
+
+
+class BandwidthGraph:
+    """Scrolling rx/tx graph on a Tk canvas, updated incrementally.
+
+    Samples are decimated to one point per pixel column (peak value).
+    When a column completes, existing segments are shifted with a single
+    canvas.move() and only the new segment is created; rescaling uses
+    canvas.scale() instead of redrawing.
+    """
+
+    MARGIN = 18
+
+    def __init__(self, parent, window=600, width=600, height=180, bg="#2d2d2d",
+                 colors=(("rx", "#4CAF50"), ("tx", "#2196F3"))):
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg=bg, highlightthickness=0)
+        self.width = width
+        self.height = height
+        self.seconds_per_px = window / width
+        self.base = height - 1                       # y of a zero value
+        self.plot_height = height - 1 - self.MARGIN
+        self.colors = dict(colors)
+        self.scale = 1e6                             # bps at the top of the plot
+
+        self.column = None     # column being accumulated
+        self.drawn = None      # column of the rightmost drawn point
+        self.pending = {}
+        self.last = {}         # series -> value of the rightmost drawn point
+        self.items = {name: deque() for name in self.colors}    # (column, canvas item)
+        self.visible = {name: deque() for name in self.colors}  # (column, value)
+
+        self.canvas.create_line(0, self.MARGIN, width, self.MARGIN, fill="#444444", dash=(2, 4))
+        self.label = self.canvas.create_text(6, 2, anchor="nw", fill="#b0b0b0", font=("Arial", 9), text="")
+
+        self.busy = 0.0
+        self.updates = 0
+        self.created = time.perf_counter()
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def _y(self, value):
+        return self.base - min(value / self.scale, 1.0) * self.plot_height
+
+    @staticmethod
+    def _nice(value):
+        if value <= 0:
+            return 1e6
+        magnitude = 10 ** math.floor(math.log10(value))
+        for step in (1, 2, 5, 10):
+            if value <= step * magnitude:
+                return step * magnitude
+        return 10 * magnitude
+
+    def push(self, timestamp, **values):
+        """Add a sample; draws only when a pixel column completes"""
+        started = time.perf_counter()
+        column = int(timestamp / self.seconds_per_px)
+        if self.column is None:
+            self.column = column
+        if column > self.column:
+            self._flush()
+            self.column = column
+        for name, value in values.items():
+            if name in self.colors and value is not None:
+                self.pending[name] = max(self.pending.get(name, 0.0), value)
+        self.busy += time.perf_counter() - started
+        self.updates += 1
+
+    def _flush(self):
+        column, values = self.column, self.pending
+        self.pending = {}
+        if not values:
+            return
+
+        oldest = column - self.width
+        peak = 0.0
+        for name, value in values.items():
+            visible = self.visible[name]
+            visible.append((column, value))
+            while visible and visible[0][0] < oldest:
+                visible.popleft()
+            peak = max(peak, max(v for _, v in visible))
+        self._rescale(peak)
+
+        shift = column - self.drawn if self.drawn is not None else 0
+        if shift:
+            self.canvas.move("data", -shift, 0)
+        x = self.width - 1
+        for name, value in values.items():
+            if name in self.last:
+                item = self.canvas.create_line(x - shift, self._y(self.last[name]), x, self._y(value),
+                                               fill=self.colors[name], width=1.5, tags=("data", name))
+                self.items[name].append((column, item))
+            self.last[name] = value
+            items = self.items[name]
+            while items and items[0][0] < oldest:
+                self.canvas.delete(items.popleft()[1])
+        self.drawn = column
+
+        text = "   ".join(f"{'↓' if name == 'rx' else '↑'} {format_rate(value)}" for name, value in values.items())
+        self.canvas.itemconfigure(self.label, text=f"{text}   (max {format_rate(self.scale)})")
+
+    def _rescale(self, peak):
+        target = self._nice(peak * 1.1)
+        # Grow immediately, shrink only once the window peak is well below the scale
+        if peak <= self.scale and peak * 4 > self.scale:
+            return
+        if target != self.scale:
+            self.canvas.scale("data", 0, self.base, 1, self.scale / target)
+            self.scale = target
+
+    def load(self, times, series):
+        """Backfill from history: times plus {name: values}"""
+        names = list(series)
+        for i, timestamp in enumerate(times):
+            self.push(float(timestamp), **{name: float(series[name][i]) for name in names})
+
+    def cpu_share(self):
+        """Fraction of wall time spent in graph updates since creation"""
+        return self.busy / max(time.perf_counter() - self.created, 1e-9)
+
+# ===== LOCAL CONTROL API =====
+def default_control_socket():
+    """$XDG_RUNTIME_DIR/kingzvpn.sock, else control.sock in a per-user kingzvpn-<uid> directory under the temp dir"""
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'kingzvpn.sock')
+    uid = getattr(os, 'getuid', lambda: 0)()
+    return os.path.join(tempfile.gettempdir(), f"kingzvpn-{uid}", 'control.sock')
+
+
+CONTROL_SOCKET = default_control_socket()
+
+
+def ensure_private_dir(directory):
+    """Create directory with mode 0700, or check an existing one is ours and closed to everyone else"""
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directory)
+    uid = getattr(os, 'getuid', lambda: info.st_uid)()
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != uid or info.st_mode & 0o077:
+        raise PermissionError(f"{directory} must be a directory owned by this user with mode 0700")
+
+
+class RPCError(Exception):
+    """Error returned to a control API caller"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class _Outbox:
+    """One control client's pending output.
+
+    Replies are never dropped (a caller blocks on each one); a full reply
+    backlog pauses reading the client's requests instead. Events keep only
+    the newest `size`.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.replies = deque()
+        self.events = deque()
+        self.ready = asyncio.Event()     # something to send
+        self.sent = asyncio.Event()      # replies flushed, room again
+
+    async def reply(self, line):
+        while len(self.replies) >= self.size:
+            self.sent.clear()
+            await self.sent.wait()
+        self.replies.append(line)
+        self.ready.set()
+
+    def event(self, line):
+        """Queue an event line; True if the oldest one had to be dropped"""
+        dropped = len(self.events) >= self.size
+        if dropped:
+            self.events.popleft()
+        self.events.append(line)
+        self.ready.set()
+        return dropped
+
+
+class ControlServer:
+    """Newline-delimited JSON-RPC 2.0 over a Unix socket, served by one asyncio loop.
+
+    Methods are registered as plain callables taking keyword params.
+    Blocking ones run on the loop's thread pool. Subscribers receive
+    {"method": "event", "params": {...}} notifications pushed by publish().
+    """
+
+    QUEUE_SIZE = 256      # per-client backlog; the oldest events are dropped beyond it, replies never
+
+    def __init__(self, path=CONTROL_SOCKET, max_workers=8):
+        self.path = path
+        self.methods = {}       # name -> (callable, blocking)
+        self.subscribers = {}   # _Outbox -> frozenset of event types (empty = all)
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = Event()
+        self.error = None
+        self.bound = False      # path is ours to remove on stop
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='control')
+        self.stats = {'clients': 0, 'requests': 0, 'errors': 0, 'events': 0, 'dropped': 0}
+        self.logger = logging.getLogger('KingzVPNPro')
+        self.register('ping', lambda: 'pong', blocking=False)
+        self.register('methods', lambda: sorted(self.methods), blocking=False)
+
+    def register(self, name, func, blocking=True):
+        self.methods[name] = (func, blocking)
+
+    # === LIFECYCLE ===
+    def start(self):
+        if not hasattr(asyncio, 'start_unix_server'):
+            raise RuntimeError("Control API needs Unix domain sockets")
+        self.thread = threading.Thread(target=self._run, name='control-api', daemon=True)
+        self.thread.start()
+        if not self.ready.wait(5):
+            raise RuntimeError("Control API did not start")
+        if self.error:
+            raise RuntimeError(self.error)
+        return self
+
+    def _claim_path(self):
+        """Clear a stale socket left at path; refuse if a server still answers there or it isn't a socket"""
+        try:
+            info = os.lstat(self.path)
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(info.st_mode):
+            raise RuntimeError(f"{self.path} exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        probe.settimeout(1)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(self.path)    # stale socket from a previous run
+            return
+        except OSError:
+            pass
+        finally:
+            probe.close()
+        raise RuntimeError(f"Another control server is listening on {self.path}")
+
+    def _bind(self):
+        """Socket bound at path and 0600 before anyone else can reach it.
+
+        It is bound and chmodded inside a fresh 0700 directory next to path,
+        then renamed into place (no process-wide umask change).
+        """
+        staging = tempfile.mkdtemp(prefix='.kingzvpn-', dir=os.path.dirname(os.path.abspath(self.path)))
+        staged = os.path.join(staging, 'control.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(staged)
+            os.chmod(staged, 0o600)
+            os.rename(staged, self.path)
+        except BaseException:
+            sock.close()
+            raise
+        finally:
+            try:
+                os.remove(staged)       # only left behind when the rename failed
+            except OSError:
+                pass
+            os.rmdir(staging)
+        return sock
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.set_default_executor(self.executor)
+        try:
+            if self.path == CONTROL_SOCKET:
+                ensure_private_dir(os.path.dirname(self.path))
+            self._claim_path()
+            sock = self._bind()
+            self.bound = True
+            self.server = self.loop.run_until_complete(
+                asyncio.start_unix_server(self._handle_client, sock=sock, limit=1 << 20, backlog=1024)
+            )
+            self.logger.info(f"Control API listening on {self.path}")
+        except Exception as e:
+            self.error = str(e)
+            self.logger.error(f"Control API failed to start: {e}")
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        self.loop.run_forever()
+        self.server.close()
+        # Connected clients' handlers would otherwise die with the closed loop
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=2)
+        self.executor.shutdown(wait=False)
+        if not self.bound:
+            return      # never touch a socket another instance owns
+        self.bound = False
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    # === EVENTS ===
+    def publish(self, event, **data):
+        """Push an event to subscribers (safe from any thread, no-op without subscribers)"""
+        if not self.subscribers or self.loop is None:
+            return
+        message = {'jsonrpc': '2.0', 'method': 'event',
+                   'params': dict(data, type=event, time=time.time())}
+        self.loop.call_soon_threadsafe(self._fan_out, event, message)
+
+    def _fan_out(self, event, message):
+        self.stats['events'] += 1
+        line = None
+        for outbox, types in self.subscribers.items():
+            if types and event not in types:
+                continue
+            if line is None:
+                line = (json.dumps(message, default=str) + '\n').encode('utf-8')  # encoded once
+            if outbox.event(line):
+                self.stats['dropped'] += 1
+
+    # === CONNECTIONS ===
+    async def _handle_client(self, reader, writer):
+        self.stats['clients'] += 1
+        outgoing = _Outbox(self.QUEUE_SIZE)
+        sender = asyncio.ensure_future(self._send_loop(outgoing, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    response = await self._dispatch(line, outgoing)
+                    if response is not None:
+                        await outgoing.reply((json.dumps(response, default=str) + '\n').encode('utf-8'))
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.subscribers.pop(outgoing, None)
+            self.stats['clients'] -= 1
+            sender.cancel()
+            writer.close()
+
+    @staticmethod
+    async def _send_loop(outbox, writer):
+        try:
+            while True:
+                await outbox.ready.wait()
+                outbox.ready.clear()
+                # Coalesce whatever is queued into one drain, replies first
+                while outbox.replies:
+                    writer.write(outbox.replies.popleft())
+                outbox.sent.set()
+                while outbox.events:
+                    writer.write(outbox.events.popleft())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def _dispatch(self, line, outgoing):
+        self.stats['requests'] += 1
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise RPCError(-32700, "Parse error")
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RPCError(-32600, "Invalid request")
+            request_id = request.get('id')
+            params = request.get('params') or {}
+            if not isinstance(params, dict):
+                raise RPCError(-32602, "params must be an object")
+
+            name = request['method']
+            if name == 'subscribe':
+                self.subscribers[outgoing] = frozenset(params.get('events') or ())
+                result = True
+            elif name == 'unsubscribe':
+                result = self.subscribers.pop(outgoing, None) is not None
+            else:
+                if name not in self.methods:
+                    raise RPCError(-32601, f"Method not found: {name}")
+                func, blocking = self.methods[name]
+                try:
+                    if blocking:
+                        result = await self.loop.run_in_executor(None, lambda: func(**params))
+                    else:
+                        result = func(**params)
+                except TypeError as e:
+                    raise RPCError(-32602, f"Invalid params: {e}")
+                except RPCError:
+                    raise
+                except Exception as e:
+                    raise RPCError(-32000, str(e))
+        except RPCError as e:
+            self.stats['errors'] += 1
+            if request_id is None and e.code not in (-32700, -32600):
+                return None
+            return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': e.code, 'message': str(e)}}
+
+        if request_id is None:
+            return None    # notification: no reply
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+
+class ControlClient:
+    """Minimal blocking client for the control API (scripts and fleet tooling)"""
+
+    def __init__(self, path=CONTROL_SOCKET, timeout=30):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rb')
+        self.next_id = 0
+        self.pending_events = deque()
+
+    def call(self, method, **params):
+        self.next_id += 1
+        request = {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params}
+        self.sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        while True:
+            message = self._read()
+            if message.get('id') == self.next_id:
+                if 'error' in message:
+                    raise RPCError(message['error']['code'], message['error']['message'])
+                return message['result']
+            self.pending_events.append(message['params'])
+
+    def events(self, *types):
+        """Subscribe and yield events as they arrive"""
+        self.call('subscribe', events=list(types))
+        while True:
+            while self.pending_events:
+                yield self.pending_events.popleft()
+            message = self._read()
+            if message.get('method') == 'event':
+                yield message['params']
+
+    def _read(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Control API closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+# ===== MULTI-TUNNEL MODE =====
+class TunnelSlot:
+    """State of one tunnel in a TunnelPool (__slots__ keep dozens of them small)"""
+
+    __slots__ = ('id', 'config', 'port', 'rules', 'tunnel', 'proc', 'state', 'started', 'restarts',
+                 'latency_ms', 'failures', 'probes', 'probe_failures', 'probing', 'interval', 'next_check',
+                 'cpu_percent', 'rss', 'io_chars', 'relay_bps', 'sampled', 'active', 'served', 'bytes')
+
+    def __init__(self, slot_id, config, port, rules=None):
+        self.id = slot_id
+        self.config = config
+        self.port = port
+        self.rules = rules            # routing rules rendered into this tunnel's config
+        self.tunnel = None
+        self.proc = None              # psutil.Process, kept so cpu_percent has a baseline
+        self.state = 'starting'       # starting / up / down / failed
+        self.started = 0.0
+        self.restarts = 0
+        self.latency_ms = None        # EWMA of probe latency
+        self.failures = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.probing = False
+        self.interval = 0.0
+        self.next_check = 0.0         # next probe, or next restart while down
+        self.cpu_percent = 0.0
+        self.rss = 0
+        self.io_chars = 0
+        self.relay_bps = 0.0
+        self.sampled = 0.0
+        self.active = 0               # leases currently held by the scheduler
+        self.served = 0
+        self.bytes = 0
+
+    def snapshot(self):
+        return {
+            'id': self.id, 'name': self.config['name'], 'hash': self.config['hash'],
+            'port': self.port, 'state': self.state, 'restarts': self.restarts,
+            'latency_ms': None if self.latency_ms is None else round(self.latency_ms, 1),
+            'probes': self.probes, 'probe_failures': self.probe_failures,
+            'cpu_percent': self.cpu_percent, 'rss': self.rss, 'relay_bps': round(self.relay_bps),
+            'active': self.active, 'served': self.served, 'bytes': self.bytes,
+        }
+
+
+class TunnelPool:
+    """Several tunnels at once, each with its own SOCKS port, routing rules and health state.
+
+    A single supervisor thread serves every tunnel: liveness and startup
+    checks each tick, process CPU/memory/IO sampling every sample_every
+    seconds, health probes on a small shared executor with per-tunnel
+    adaptive intervals, and restarts with exponential backoff.
+    """
+
+    def __init__(self, command, converter, tunnel_format='xray', base_port=TUNNEL_SOCKS_PORT + 10,
+                 max_tunnels=64, probe=None, on_change=None, tick=0.5, sample_every=2.0,
+                 min_interval=1.0, max_interval=15.0, failure_threshold=2, max_restarts=5,
+                 start_timeout=10.0, probe_workers=8, tuning_provider=None):
+        self.command = command
+        self.converter = converter
+        self.tuning_provider = tuning_provider
+        self.tunnel_format = tunnel_format
+        self.base_port = base_port
+        self.max_tunnels = max_tunnels
+        self.probe = probe or (lambda slot: socks5_probe(slot.port, '1.1.1.1', 443))
+        self.on_change = on_change
+        self.tick = tick
+        self.sample_every = sample_every
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.failure_threshold = failure_threshold
+        self.max_restarts = max_restarts
+        self.start_timeout = start_timeout
+        self.slots = {}          # id -> TunnelSlot
+        self.next_id = 1
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+        self.probe_pool = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix='tunnel-probe')
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, config, rules=None):
+        """Start a tunnel for config (non-blocking; it turns 'up' once its port answers)"""
+        with self.lock:
+            for slot in self.slots.values():
+                if slot.config['hash'] == config['hash']:
+                    return slot
+            if len(self.slots) >= self.max_tunnels:
+                raise RuntimeError(f"At most {self.max_tunnels} tunnels")
+            used = {slot.port for slot in self.slots.values()}
+            port = next(p for p in range(self.base_port, self.base_port + self.max_tunnels) if p not in used)
+            slot = TunnelSlot(self.next_id, config, port, rules)
+            self.next_id += 1
+            self.slots[slot.id] = slot
+        try:
+            self._launch(slot)
+        except Exception:
+            with self.lock:
+                self.slots.pop(slot.id, None)
+            raise
+        self.start()
+        return slot
+
+    def remove(self, slot_id):
+        with self.lock:
+            slot = self.slots.pop(slot_id, None)
+        if slot is not None and slot.tunnel is not None:
+            slot.tunnel.stop()
+        return slot is not None
+
+    def healthy(self):
+        with self.lock:
+            return [slot for slot in self.slots.values() if slot.state == 'up']
+
+    def snapshot(self):
+        with self.lock:
+            slots = list(self.slots.values())
+        return [slot.snapshot() for slot in slots]
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='tunnel-pool', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            slots, self.slots = list(self.slots.values()), {}
+        for slot in slots:
+            if slot.tunnel is not None:
+                slot.tunnel.stop()
+        self.probe_pool.shutdown(wait=False)
+
+    # === SUPERVISION ===
+    def _launch(self, slot):
+        tuning = self.tuning_provider(slot.config) if self.tuning_provider else None
+        path = self.converter.render_file(slot.config, self.tunnel_format, socks_port=slot.port,
+                                          routing_rules=slot.rules, tuning=tuning)
+        slot.tunnel = TunnelProcess(self.command, slot.config, path, socks_port=slot.port,
+                                    capture=False).start()
+        slot.proc = None
+        slot.state = 'starting'
+        slot.started = time.monotonic()
+        slot.failures = 0
+        slot.interval = self.min_interval
+        slot.sampled = 0.0
+
+    def _changed(self, slot):
+        if self.on_change:
+            try:
+                self.on_change(slot)
+            except Exception as e:
+                self.logger.error(f"Tunnel change callback failed: {e}")
+
+    def _run(self):
+        last_sample = 0.0
+        while not self.stop_event.wait(self.tick):
+            now = time.monotonic()
+            sample = now - last_sample >= self.sample_every
+            if sample:
+                last_sample = now
+            with self.lock:
+                slots = list(self.slots.values())
+            for slot in slots:
+                try:
+                    self._supervise(slot, now, sample)
+                except Exception as e:
+                    self.logger.error(f"Tunnel {slot.config['name']} supervision failed: {e}")
+
+    def _supervise(self, slot, now, sample):
+        if slot.state == 'failed':
+            return
+        if slot.state == 'down':
+            if now >= slot.next_check:
+                self.logger.info(f"Restarting tunnel {slot.config['name']} (attempt {slot.restarts})")
+                self._launch(slot)
+            return
+        if not slot.tunnel.alive():
+            self._fail(slot, "tunnel process exited")
+            return
+
+        if slot.state == 'starting':
+            try:
+                # Loopback connect: refused instantly until the tunnel listens
+                with socket.create_connection(('127.0.0.1', slot.port), timeout=0.05):
+                    pass
+            except OSError:
+                if now - slot.started > self.start_timeout:
+                    self._fail(slot, "tunnel did not come up")
+                return
+            slot.state = 'up'
+            slot.next_check = now
+            self._changed(slot)
+
+        if sample:
+            self._sample(slot, now)
+        if not slot.probing and now >= slot.next_check:
+            slot.probing = True
+            self.probe_pool.submit(self._probe, slot)
+
+    def _sample(self, slot, now):
+        """Per-process CPU, memory and relayed bytes (read_chars counts socket reads on Linux)"""
+        try:
+            if slot.proc is None:
+                slot.proc = psutil.Process(slot.tunnel.process.pid)
+                slot.proc.cpu_percent(None)
+            with slot.proc.oneshot():
+                slot.cpu_percent = slot.proc.cpu_percent(None)
+                slot.rss = slot.proc.memory_info().rss
+                io_counters = slot.proc.io_counters() if hasattr(slot.proc, 'io_counters') else None
+        except (psutil.Error, AttributeError):
+            return
+        if io_counters is not None:
+            chars = getattr(io_counters, 'read_chars', io_counters.read_bytes)
+            if slot.sampled:
+                slot.relay_bps = max(chars - slot.io_chars, 0) * 8 / max(now - slot.sampled, 1e-3)
+            slot.io_chars = chars
+        slot.sampled = now
+
+    def _probe(self, slot):
+        try:
+            latency = self.probe(slot)
+            slot.latency_ms = latency if slot.latency_ms is None else 0.7 * slot.latency_ms + 0.3 * latency
+            slot.failures = 0
+            slot.interval = min(self.max_interval, slot.interval * 1.5)
+            if slot.restarts and time.monotonic() - slot.started > 60:
+                slot.restarts = 0     # stable again
+        except Exception as e:
+            slot.probe_failures += 1
+            slot.failures += 1
+            slot.interval = self.min_interval
+            if slot.failures >= self.failure_threshold:
+                self._fail(slot, f"probe failed: {e}")
+        finally:
+            slot.probes += 1
+            if slot.state == 'up':
+                slot.next_check = time.monotonic() + slot.interval
+            slot.probing = False
+
+    def _fail(self, slot, reason):
+        with self.lock:
+            if slot.state in ('down', 'failed') or slot.id not in self.slots:
+                return
+            slot.restarts += 1
+            if slot.restarts > self.max_restarts:
+                slot.state = 'failed'
+            else:
+                slot.state = 'down'
+                slot.next_check = time.monotonic() + min(60, 2 ** slot.restarts)
+        self.logger.warning(f"Tunnel {slot.config['name']} unhealthy: {reason}")
+        slot.tunnel.stop()
+        self._changed(slot)
+
+
+class TunnelScheduler:
+    """Spreads work over the healthy tunnels of a TunnelPool"""
+
+    STRATEGIES = ('least_loaded', 'round_robin', 'fastest')
+
+    def __init__(self, pool, strategy='least_loaded'):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        self.pool = pool
+        self.strategy = strategy
+        self.cursor = 0
+        self.lock = Lock()
+
+    def acquire(self):
+        """Pick a tunnel and count the lease against it. Pair with release()"""
+        healthy = self.pool.healthy()
+        if not healthy:
+            raise RuntimeError("No healthy tunnel")
+        infinity = float('inf')
+        with self.lock:
+            if self.strategy == 'round_robin':
+                self.cursor += 1
+                slot = healthy[self.cursor % len(healthy)]
+            elif self.strategy == 'fastest':
+                slot = min(healthy, key=lambda s: infinity if s.latency_ms is None else s.latency_ms)
+            else:
+                slot = min(healthy, key=lambda s: (s.active, infinity if s.latency_ms is None else s.latency_ms))
+            slot.active += 1
+        return slot
+
+    def release(self, slot, nbytes=0):
+        with self.lock:
+            slot.active -= 1
+            slot.served += 1
+            slot.bytes += nbytes
+
+    def run(self, tasks, func, concurrency=None):
+        """Call func(slot, task) for every task across the tunnels. Yields (task, result or exception)"""
+        tasks = list(tasks)
+        concurrency = concurrency or max(1, 2 * len(self.pool.healthy()))
+
+        def call(task):
+            slot = self.acquire()
+            try:
+                return func(slot, task)
+            finally:
+                self.release(slot)
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tunnel-task') as executor:
+            futures = [executor.submit(call, task) for task in tasks]
+            for task, future in zip(tasks, futures):
+                error = future.exception()
+                yield task, error if error is not None else future.result()
+
+# ===== SERVER LOAD BALANCER =====
+class ServerStats:
+    """Live measurements for one server (EWMAs plus time-decayed session outcomes)"""
+
+    __slots__ = ('latency_ms', 'loss', 'throughput_bps', 'successes', 'failures', 'updated', 'picks',
+                 'jitter_ms')
+
+    def __init__(self):
+        self.latency_ms = None
+        self.jitter_ms = None
+        self.loss = 0.0
+        self.throughput_bps = None
+        self.successes = 0.0
+        self.failures = 0.0
+        self.updated = time.time()
+        self.picks = 0
+
+
+class ServerLoadBalancer:
+    """Scores servers from measured latency, loss, throughput and history, then picks one
+    with weighted power-of-two-choices.
+
+    Two candidates are drawn with probability proportional to their weight and
+    the better one wins. Clients that all see the same fastest node therefore
+    still spread over the good ones instead of herding onto a single server.
+    Servers with few observations get an exploration bonus (UCB-style) so new
+    nodes are measured rather than ignored.
+    """
+
+    def __init__(self, alpha=0.3, history_half_life=7 * 86400, prior_latency_ms=300.0,
+                 reference_bps=10e6, loss_exponent=4, exploration=0.5, rng=None):
+        self.alpha = alpha                         # EWMA weight of a new sample
+        self.decay = math.log(2) / history_half_life
+        self.prior_latency_ms = prior_latency_ms   # assumed for never-measured servers
+        self.reference_bps = reference_bps         # throughput at which the bonus is half way
+        self.loss_exponent = loss_exponent
+        self.exploration = exploration
+        self.rng = rng or random.Random()
+        self.stats = {}        # key -> ServerStats
+        self.lock = Lock()
+
+    def _get(self, key):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = ServerStats()
+        return stats
+
+    def _ewma(self, old, value):
+        return value if old is None else old + self.alpha * (value - old)
+
+    # === OBSERVATIONS ===
+    def observe_latency(self, key, latency_ms):
+        """A successful probe (also counts as a delivered packet for loss)"""
+        with self.lock:
+            stats = self._get(key)
+            stats.latency_ms = self._ewma(stats.latency_ms, latency_ms)
+            stats.loss = self._ewma(stats.loss, 0.0)
+
+    def observe_loss(self, key, lost=True):
+        with self.lock:
+            stats = self._get(key)
+            stats.loss = self._ewma(stats.loss, 1.0 if lost else 0.0)
+
+    def observe_probe_train(self, key, loss, rtt_ms=None, jitter_ms=None):
+        """Summary of a UDP packet train: loss fraction, mean RTT and RFC 3550 jitter"""
+        with self.lock:
+            stats = self._get(key)
+            stats.loss = self._ewma(stats.loss, loss)
+            if rtt_ms is not None:
+                stats.latency_ms = self._ewma(stats.latency_ms, rtt_ms)
+                stats.jitter_ms = self._ewma(stats.jitter_ms, jitter_ms or 0.0)
+
+    def observe_throughput(self, key, bps):
+        with self.lock:
+            stats = self._get(key)
+            stats.throughput_bps = self._ewma(stats.throughput_bps, bps)
+
+    def observe_session(self, key, success, timestamp=None):
+        """Outcome of a connection; old outcomes fade with history_half_life"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            stats = self._get(key)
+            if timestamp > stats.updated:
+                fade = math.exp(-self.decay * (timestamp - stats.updated))
+                stats.successes *= fade
+                stats.failures *= fade
+                stats.updated = timestamp
+                weight = 1.0
+            else:
+                weight = math.exp(-self.decay * (stats.updated - timestamp))
+            if success:
+                stats.successes += weight
+            else:
+                stats.failures += weight
+
+    def load_history(self, rows):
+        """Seed session outcomes from (key, success, unix time) rows"""
+        for key, success, timestamp in sorted(rows, key=lambda row: row[2]):
+            self.observe_session(key, success, timestamp)
+
+    # === SCORING ===
+    def weight(self, key):
+        """Higher is better: success rate x delivery x throughput bonus / latency x exploration"""
+        stats = self.stats.get(key)
+        if stats is None:
+            return (1 + self.exploration) * 0.5 / self.prior_latency_ms
+        latency = stats.latency_ms if stats.latency_ms is not None else self.prior_latency_ms
+        if stats.jitter_ms:
+            latency += 2 * stats.jitter_ms      # a jittery path behaves like a slower one
+        success_rate = (stats.successes + 1) / (stats.successes + stats.failures + 2)   # Beta(1, 1) prior
+        delivery = (1 - min(stats.loss, 1.0)) ** self.loss_exponent
+        if stats.throughput_bps is None:
+            speed = 0.5
+        else:
+            speed = stats.throughput_bps / (stats.throughput_bps + self.reference_bps)
+        observations = stats.successes + stats.failures + (stats.latency_ms is not None) * 3
+        bonus = 1 + self.exploration / math.sqrt(1 + observations)
+        return success_rate * delivery * (0.5 + speed) * bonus / max(latency, 1.0)
+
+    def rank(self, candidates, key=lambda c: c['hash']):
+        """Candidates best first (deterministic, for fallbacks and standby selection)"""
+        with self.lock:
+            return sorted(candidates, key=lambda c: -self.weight(key(c)))
+
+    def choose(self, candidates, key=lambda c: c['hash']):
+        """Weighted power-of-two-choices pick among candidates"""
+        candidates = list(candidates)
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            chosen = candidates[0]
+        else:
+            with self.lock:
+                weights = [self.weight(key(c)) for c in candidates]
+            cumulative = list(itertools.accumulate(weights))
+            total = cumulative[-1]
+            first = bisect.bisect_left(cumulative, self.rng.random() * total)
+            second = first
+            for _ in range(8):        # a distinct second draw, almost always on the first try
+                second = bisect.bisect_left(cumulative, self.rng.random() * total)
+                if second != first:
+                    break
+            first, second = min(first, len(candidates) - 1), min(second, len(candidates) - 1)
+            chosen = candidates[first] if weights[first] >= weights[second] else candidates[second]
+        with self.lock:
+            self._get(key(chosen)).picks += 1
+        return chosen
+
+    def export_state(self):
+        with self.lock:
+            return {key: (s.latency_ms, s.loss, s.throughput_bps, s.successes, s.failures, s.updated, s.picks,
+                          s.jitter_ms)
+                    for key, s in self.stats.items()}
+
+    def restore_state(self, state):
+        with self.lock:
+            for key, values in state.items():
+                if key not in self.stats:
+                    stats = self.stats[key] = ServerStats()
+                    (stats.latency_ms, stats.loss, stats.throughput_bps, stats.successes,
+                     stats.failures, stats.updated, stats.picks) = values[:7]
+                    stats.jitter_ms = values[7] if len(values) > 7 else None
+
+    def snapshot(self, key):
+        stats = self.stats.get(key)
+        if stats is None:
+            return None
+        return {
+            'latency_ms': None if stats.latency_ms is None else round(stats.latency_ms, 1),
+            'jitter_ms': None if stats.jitter_ms is None else round(stats.jitter_ms, 2),
+            'loss': round(stats.loss, 3),
+            'throughput_bps': None if stats.throughput_bps is None else round(stats.throughput_bps),
+            'success_rate': round((stats.successes + 1) / (stats.successes + stats.failures + 2), 3),
+            'weight': self.weight(key),
+            'picks': stats.picks,
+        }
+
+# ===== SESSION SNAPSHOT =====
+class SessionSnapshot:
+    """Sectioned session state file, memory-mapped and decoded one section at a time.
+
+    Layout: header, table of contents (name, offset, length), then one
+    marshal blob per section. Only plain data (dicts, lists, tuples, sets,
+    str, numbers) goes in, so loading never runs code. Sections that did
+    not change since the last load are written back as the same bytes.
+    """
+
+    MAGIC = b'KVSS'
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.toc = {}          # section -> (offset, length)
+        self.cache = {}
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    def open(self):
+        """Map the file and read its table of contents (no section is decoded yet)"""
+        self.close()
+        try:
+            self.file = open(self.path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count = struct.unpack_from('<4sHH', self.map, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("unknown snapshot format")
+            offset = 8
+            for _ in range(count):
+                (size,) = struct.unpack_from('<B', self.map, offset)
+                name = self.map[offset + 1:offset + 1 + size].decode('utf-8')
+                self.toc[name] = struct.unpack_from('<QQ', self.map, offset + 1 + size)
+                offset += 1 + size + 16
+        except FileNotFoundError:
+            self.close()
+        except (OSError, ValueError, struct.error) as e:
+            self.logger.warning(f"Ignoring unreadable session snapshot: {e}")
+            self.close()
+        return self
+
+    def __contains__(self, name):
+        return name in self.toc
+
+    def raw(self, name):
+        offset, length = self.toc[name]
+        return self.map[offset:offset + length]
+
+    def get(self, name, default=None):
+        """Decode one section on first use"""
+        if name not in self.toc:
+            return default
+        if name not in self.cache:
+            try:
+                self.cache[name] = marshal.loads(self.raw(name))
+            except (ValueError, EOFError, TypeError) as e:
+                self.logger.warning(f"Snapshot section {name} unreadable: {e}")
+                return default
+        return self.cache[name]
+
+    def save(self, sections, keep=()):
+        """Atomically write sections ({name: data}); names in keep reuse their current bytes"""
+        blobs = {name: self.raw(name) for name in keep if name in self.toc}
+        for name, data in sections.items():
+            blobs[name] = marshal.dumps(data)
+
+        header = struct.pack('<4sHH', self.MAGIC, self.VERSION, len(blobs))
+        toc_size = sum(1 + len(name.encode('utf-8')) + 16 for name in blobs)
+        offset = len(header) + toc_size
+        toc = []
+        for name, blob in blobs.items():
+            encoded = name.encode('utf-8')
+            toc.append(struct.pack('<B', len(encoded)) + encoded + struct.pack('<QQ', offset, len(blob)))
+            offset += len(blob)
+
+        self.close()     # the mapping must go before the file is replaced (Windows)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(b''.join(toc))
+            for blob in blobs.values():
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return offset
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.toc = {}
+        self.cache = {}
+
+# ===== UDP LOSS AND JITTER PROBES =====
+class UDPEchoServer:
+    """Minimal UDP echo (RFC 862): a local stand-in for tests, or run next to a server"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='udp-echo', daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+                self.reply(data, addr)
+            except OSError:
+                return
+
+    def reply(self, data, addr):
+        self.sock.sendto(data, addr)
+
+    def stop(self):
+        self.sock.close()
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    """Collects (sequence, rtt ms) for one packet train"""
+
+    def __init__(self, nonce, expected, done):
+        self.nonce = nonce
+        self.expected = expected
+        self.done = done
+        self.arrivals = []
+        self.seen = set()
+        self.errors = 0
+
+    def datagram_received(self, data, addr):
+        now = time.perf_counter_ns()
+        if len(data) < UDPProbeEngine.HEADER.size:
+            return
+        magic, nonce, seq, stamp = UDPProbeEngine.HEADER.unpack_from(data)
+        if magic != UDPProbeEngine.MAGIC or nonce != self.nonce:
+            return
+        self.arrivals.append((seq, (now - stamp) / 1e6))
+        self.seen.add(seq)
+        if len(self.seen) >= self.expected and not self.done.is_set():
+            self.done.set()
+
+    def error_received(self, exc):
+        # ICMP port unreachable and friends: no echo listening
+        self.errors += 1
+
+
+class UDPProbeEngine:
+    """Timestamped UDP packet trains to echo endpoints: loss, RFC 3550 jitter and reordering.
+
+    Every target gets its own socket, all on one asyncio loop, so probing
+    hundreds of servers at once costs a single thread.
+    """
+
+    HEADER = struct.Struct('!4sIIQ')     # magic, train nonce, sequence, send time (ns)
+    MAGIC = b'KVUP'
+
+    def __init__(self, count=20, interval=0.02, timeout=1.0, size=64, max_concurrent=256):
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout          # wait for stragglers after the last packet
+        self.size = max(size, self.HEADER.size)
+        self.max_concurrent = max_concurrent
+
+    def probe(self, host, port):
+        return self.probe_many([(None, host, port)])[None]
+
+    def probe_many(self, targets, max_concurrent=None):
+        """targets: (key, host, port) tuples. Returns {key: result}"""
+        targets = list(targets)
+        if not targets:
+            return {}
+        return asyncio.run(self._probe_all(targets, max_concurrent or self.max_concurrent))
+
+    async def _probe_all(self, targets, max_concurrent):
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def run(key, host, port):
+            async with semaphore:
+                return key, await self._probe(host, port)
+
+        return dict(await asyncio.gather(*(run(*target) for target in targets)))
+
+    async def _probe(self, host, port):
+        loop = asyncio.get_running_loop()
+        nonce = random.getrandbits(32)
+        done = asyncio.Event()
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: _ProbeProtocol(nonce, self.count, done), remote_addr=(host, port))
+        except OSError as e:
+            return dict(self.summarize(self.count, []), error=str(e))
+
+        padding = bytes(self.size - self.HEADER.size)
+        try:
+            for seq in range(self.count):
+                transport.sendto(self.HEADER.pack(self.MAGIC, nonce, seq, time.perf_counter_ns()) + padding)
+                await asyncio.sleep(self.interval)
+            try:
+                await asyncio.wait_for(done.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            transport.close()
+
+        result = self.summarize(self.count, protocol.arrivals)
+        if not protocol.arrivals:
+            # Refused, or (on most servers) silently dropped: zero replies cannot be
+            # told apart from a dead path, so it is not reported as loss
+            result['error'] = "no echo service"
+        return result
+
+    @staticmethod
+    def summarize(sent, arrivals):
+        """Stats for a train from (sequence, rtt ms) in arrival order"""
+        seen = set()
+        rtts = []
+        jitter = 0.0
+        previous = None
+        highest = -1
+        reordered = duplicates = 0
+        for seq, rtt in arrivals:
+            if seq in seen:
+                duplicates += 1
+                continue
+            seen.add(seq)
+            if seq < highest:
+                reordered += 1       # arrived after a later-sent packet
+            else:
+                highest = seq
+            if previous is not None:
+                # RFC 3550 6.4.1: J += (|D(i-1, i)| - J) / 16, with D the transit-time difference
+                jitter += (abs(rtt - previous) - jitter) / 16
+            previous = rtt
+            rtts.append(rtt)
+
+        received = len(rtts)
+        return {
+            'sent': sent,
+            'received': received,
+            'loss': round(1 - received / sent, 4) if sent else 1.0,
+            'rtt_ms': round(sum(rtts) / received, 2) if rtts else None,
+            'rtt_min_ms': round(min(rtts), 2) if rtts else None,
+            'rtt_max_ms': round(max(rtts), 2) if rtts else None,
+            'jitter_ms': round(jitter, 3),
+            'reordered': reordered,
+            'duplicates': duplicates,
+            'error': None,
+        }
+
+# ===== MTU DISCOVERY AND TUNNEL TUNING =====
+# Linux socket option values, for Pythons that do not export them
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_DO = getattr(socket, 'IP_PMTUDISC_DO', 2)
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+
+
+def discover_path_mtu(host, port, low=576, high=1500, timeout=0.4, attempts=2):
+    """Packetization-layer path MTU discovery against a UDP echo (RFC 8899 style).
+
+    Binary-searches the largest don't-fragment datagram that comes back.
+    Returns (mtu, probed); probed is False when nothing answered and the
+    kernel's route MTU (or high) is returned instead.
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    overhead = 48 if family == socket.AF_INET6 else 28      # IP + UDP headers
+    linux = sys.platform.startswith('linux') and family == socket.AF_INET
+    nonce = random.getrandbits(32)
+
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        if linux:
+            sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+        sock.connect((host, port))
+        route_mtu = high
+        if linux:
+            try:
+                route_mtu = min(high, sock.getsockopt(socket.IPPROTO_IP, IP_MTU))
+            except OSError:
+                pass
+
+        def fits(mtu):
+            header = struct.pack('!II', nonce, mtu)
+            payload = header + bytes(mtu - overhead - len(header))
+            for _ in range(attempts):
+                try:
+                    sock.send(payload)
+                except OSError as e:
+                    if e.errno == errno.EMSGSIZE:
+                        return False      # larger than the MTU the kernel already knows
+                    raise
+                while True:
+                    try:
+                        data = sock.recv(65535)
+                    except (socket.timeout, ConnectionRefusedError):
+                        break
+                    if data[:8] == header:
+                        return True
+            return False
+
+        if not fits(low):
+            return route_mtu, False
+        if fits(route_mtu):
+            return route_mtu, True
+        good, bad = low, route_mtu
+        while bad - good > 8:     # 8-byte granularity is plenty for tun-mtu
+            middle = (good + bad) // 2
+            if fits(middle):
+                good = middle
+            else:
+                bad = middle
+        return good, True
+
+
+class ThroughputTester:
+    """Bulk download through a tunnel's SOCKS port, measured after a short warm-up"""
+
+    def __init__(self, url='http://speed.cloudflare.com/__down?bytes=200000000', duration=3.0,
+                 warmup=0.5, timeout=5.0):
+        parts = urlsplit(url)
+        self.tls = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.tls else 80)
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.duration = duration
+        self.warmup = warmup       # skip TCP slow start
+        self.timeout = timeout
+
+    def measure(self, socks_port):
+        """Bits per second through the tunnel (0 when nothing arrived)"""
+        sock = socks5_connect(socks_port, self.host, self.port, timeout=self.timeout)
+        try:
+            if self.tls:
+                sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+            sock.sendall(f"GET {self.path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                         f"User-Agent: KingzVPN-tuner\r\nConnection: close\r\n\r\n".encode('ascii'))
+            buffer = bytearray(1 << 16)
+            started = time.perf_counter()
+            measure_from = started + self.warmup
+            deadline = measure_from + self.duration
+            counted = 0
+            while True:
+                received = sock.recv_into(buffer)
+                now = time.perf_counter()
+                if not received:
+                    break
+                if now >= measure_from:
+                    counted += received
+                if now >= deadline:
+                    break
+            elapsed = min(now, deadline) - measure_from
+            return counted * 8 / elapsed if elapsed > 0 else 0.0
+        finally:
+            sock.close()
+
+
+class TuningStore:
+    """Best tunnel parameters per server and network (SQLite)"""
+
+    def __init__(self, db_path):
+        self.lock = Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS tunnel_tuning (
+                    server TEXT,
+                    network TEXT,
+                    params TEXT,
+                    throughput_bps REAL,
+                    path_mtu INTEGER,
+                    tuned_at REAL,
+                    PRIMARY KEY (server, network)
+                )
+            ''')
+            self.conn.commit()
+
+    def get(self, server, network):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT params FROM tunnel_tuning WHERE server = ? AND network = ?", (server, network)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def for_network(self, network):
+        """{server: params} tuned on network"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT server, params FROM tunnel_tuning WHERE network = ?", (network,)
+            ).fetchall()
+        return {server: json.loads(params) for server, params in rows}
+
+    def put(self, server, network, params, throughput_bps, path_mtu):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tunnel_tuning VALUES (?, ?, ?, ?, ?, ?)",
+                (server, network, json.dumps(params, sort_keys=True), throughput_bps, path_mtu, time.time())
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class TunnelTuner:
+    """Path MTU discovery, then a throughput benchmark over a small parameter grid per server.
+
+    The grid only varies what the tunnel format renders, and sizes packets
+    from the path MTU minus the outer headers the protocol adds. Measured
+    through the tunnel's SOCKS port, so in the client that is xray over TCP
+    (MSS, socket buffers) or mKCP (KCP MTU and buffers) and TUIC under
+    sing-box (congestion control). sing-box exposes no MSS or buffer knobs
+    per outbound, and an OpenVPN grid needs an OpenVPN-capable tuning command.
+    """
+
+    TUNABLE = "xray over TCP or mKCP, TUIC under sing-box"
+    BUFFERS = (0, 524288)      # 0 = OS default (autotuning)
+    KCP_MTU = (1350, 1460)     # xray default and maximum UDP payload
+    KCP_BUFFERS = (2, 8)       # MB per connection; 2 is xray's default
+    TUIC_CONGESTION = ('bbr', 'cubic', 'new_reno')
+    IP_HEADER = {4: 20, 6: 40}
+    TCP_HEADER = 20
+    UDP_HEADER = 8
+    OPENVPN_HEADER = 57        # opcode, packet id, IV, HMAC and CBC padding (AEAD ciphers need less)
+    OPENVPN_DEFAULT_MTU = 1500
+
+    def __init__(self, command, converter, store, tester=None, tunnel_format='xray',
+                 socks_port=TUNNEL_SOCKS_PORT + 5, echo_port=7, resolver=None):
+        self.command = command
+        self.converter = converter
+        self.store = store
+        self.tester = tester or ThroughputTester()
+        self.tunnel_format = tunnel_format
+        self.socks_port = socks_port
+        self.echo_port = echo_port
+        self.resolver = resolver
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    def grid(self, path_mtu, config=None, ip_version=4):
+        """Distinct parameter sets for the tunnel format; empty when it renders none for config"""
+        endpoints = KillSwitch.endpoints_of(config) if config else []
+        transport = endpoints[0][1] if endpoints else ('udp' if self.tunnel_format == 'ovpn' else 'tcp')
+        ip_header = self.IP_HEADER[ip_version]
+        fmt = {'format': self.tunnel_format}
+
+        if self.tunnel_format == 'ovpn':
+            if transport == 'tcp':
+                # Streamed over TCP: the kernel segments it, only the buffers matter
+                for buffer in self.BUFFERS:
+                    yield {**fmt, 'sndbuf': buffer, 'rcvbuf': buffer}
+                return
+            # Largest inner packet that still fits one outer IP/UDP/OpenVPN packet
+            fitted = max(576, path_mtu - ip_header - self.UDP_HEADER - self.OPENVPN_HEADER)
+            # mssfix bounds the encapsulated UDP payload; 0 turns clamping off
+            clamp = path_mtu - ip_header - self.UDP_HEADER
+            for tun_mtu, mssfix in ((fitted, clamp), (fitted, 0), (self.OPENVPN_DEFAULT_MTU, clamp)):
+                for buffer in self.BUFFERS:
+                    yield {**fmt, 'tun_mtu': tun_mtu, 'mssfix': mssfix, 'sndbuf': buffer, 'rcvbuf': buffer}
+        elif self.tunnel_format == 'xray' and transport == 'tcp':
+            # Proxied streams ride one outer TCP connection: its MSS and socket buffers
+            for mssfix in (path_mtu - ip_header - self.TCP_HEADER, 0):
+                for buffer in self.BUFFERS:
+                    yield {**fmt, 'mssfix': mssfix, 'sndbuf': buffer, 'rcvbuf': buffer}
+        elif self.tunnel_format == 'xray' and 'kcp' in (config or {}).get('tags', ()):
+            # mKCP's mtu is the UDP payload: what the path carries, or the default if that is smaller
+            fitted = min(self.KCP_MTU[1], path_mtu - ip_header - self.UDP_HEADER)
+            for kcp_mtu in sorted({min(self.KCP_MTU[0], fitted), fitted}):
+                for buffer in self.KCP_BUFFERS:
+                    yield {**fmt, 'kcp_mtu': kcp_mtu, 'kcp_buffer': buffer}
+        elif self.tunnel_format == 'sing-box' and (config or {}).get('protocol') == 'tuic':
+            # QUIC sizes its own packets; what differs per path is how it backs off under loss
+            for congestion in self.TUIC_CONGESTION:
+                yield {**fmt, 'congestion': congestion}
+
+    def measure(self, config, params):
+        path = self.converter.render_file(config, self.tunnel_format, socks_port=self.socks_port,
+                                          tuning=params)
+        tunnel = TunnelProcess(self.command, config, path, socks_port=self.socks_port, capture=False).start()
+        try:
+            if not tunnel.wait_ready():
+                return 0.0
+            return self.tester.measure(self.socks_port)
+        except OSError as e:
+            self.logger.info(f"Tuning run {params} for {config['name']} failed: {e}")
+            return 0.0
+        finally:
+            tunnel.stop()
+
+    def tune(self, config, network, stop_event=None):
+        """Benchmark the grid for config and store the winner for network"""
+        address = config['address']
+        if self.resolver is not None:
+            address = self.resolver.resolve(address)[0]
+        path_mtu, probed = discover_path_mtu(address, self.echo_port)
+        self.logger.info(f"Path MTU to {config['name']}: {path_mtu}" + ("" if probed else " (route MTU, no echo)"))
+
+        try:
+            ip_version = ipaddress.ip_address(address).version
+        except ValueError:
+            ip_version = 4
+        grid = list(self.grid(path_mtu, config, ip_version))
+        if not grid:
+            self.logger.info(f"Nothing to tune for {config['name']} in {self.tunnel_format} format "
+                             f"(tunable: {self.TUNABLE})")
+        results = []
+        for params in grid:
+            if stop_event is not None and stop_event.is_set():
+                break
+            results.append((self.measure(config, params), params))
+
+        best_bps, best = max(results, key=lambda item: item[0]) if results else (0.0, None)
+        if best_bps > 0:
+            self.store.put(config['hash'], network, best, best_bps, path_mtu)
+        return {'path_mtu': path_mtu, 'probed': probed, 'best': best if best_bps > 0 else None,
+                'throughput_bps': best_bps, 'results': results}
+
+# ===== RESOURCE GOVERNOR =====
+def link_is_metered(interface):
+    """True/False when the OS knows whether interface is metered, else None (NetworkManager only)"""
+    if not interface or platform.system() != 'Linux':
+        return None
+    try:
+        output = subprocess_check_output(['nmcli', '-t', '-g', 'GENERAL.METERED', 'device', 'show', interface],
+                                         text=True, timeout=3, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    value = output.strip().split(' ')[0]      # "yes", "no", "yes (guessed)", "unknown"
+    return {'yes': True, 'no': False}.get(value)
+
+
+class SystemMetrics:
+    """Machine readings for ResourceGovernor.
+
+    Anything with a sample() returning the same keys can stand in for it,
+    which is how the governor is exercised without a loaded machine.
+    """
+
+    def __init__(self, metered=None, metered_ttl=60.0):
+        self.process = psutil.Process()
+        self.process.cpu_percent(None)          # first call only sets the baseline
+        psutil.cpu_percent(None)
+        self.cpus = psutil.cpu_count() or 1
+        self.metered = metered                  # callable -> bool or None
+        self.metered_ttl = metered_ttl          # nmcli is a subprocess; don't run it every tick
+        self.metered_checked = None
+        self.metered_value = False
+
+    def sample(self):
+        battery = None
+        if hasattr(psutil, 'sensors_battery'):
+            try:
+                battery = psutil.sensors_battery()
+            except Exception:
+                battery = None
+        now = time.monotonic()
+        if self.metered is not None and (self.metered_checked is None
+                                         or now - self.metered_checked >= self.metered_ttl):
+            self.metered_checked = now
+            try:
+                self.metered_value = bool(self.metered())
+            except Exception:
+                self.metered_value = False
+        return {
+            'cpu_percent': psutil.cpu_percent(None),
+            'process_percent': self.process.cpu_percent(None) / self.cpus,    # share of the whole machine
+            'battery_percent': battery.percent if battery else None,
+            'on_battery': bool(battery) and battery.power_plugged is False,
+            'metered': self.metered_value,
+        }
+
+
+class ResourceGovernor:
+    """Hands out concurrency budgets, sampling intervals and a byte rate to background work.
+
+    Every interval it reads the machine: CPU load, the client's own CPU
+    share, battery and whether the link is metered. Conditions set a ceiling
+    on the work factor; the client's own CPU drives the factor below it
+    (multiplicative decrease over cpu_cap, bounded additive increase under
+    it).
+    Schedulers scale their concurrency by the factor, stretch their intervals
+    by its inverse, defer heavy jobs while any constraint holds and pay for
+    traffic from a token bucket capped at net_cap_bps (metered_cap_bps on
+    metered links).
+    """
+
+    BUSY_CEILING = 0.25
+    BATTERY_CEILING = 0.5
+    LOW_BATTERY_CEILING = 0.1
+    METERED_CEILING = 0.5
+    FLOOR = 0.05
+    INCREASE = 0.1
+
+    def __init__(self, metrics=None, cpu_cap=15.0, busy_percent=85.0, low_battery=20,
+                 net_cap_bps=None, metered_cap_bps=256e3, interval=2.0, clock=time.monotonic, sleep=time.sleep):
+        self.metrics = metrics or SystemMetrics()
+        self.cpu_cap = cpu_cap                  # percent of the machine for this client
+        self.busy_percent = busy_percent
+        self.low_battery = low_battery
+        self.net_cap_bps = net_cap_bps
+        self.metered_cap_bps = metered_cap_bps
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.factor = 1.0
+        self.ceiling = 1.0
+        self.reasons = ()
+        self.heavy_ok = True
+        self.rate_bps = net_cap_bps
+        self.reading = {}
+        self.tokens = 0.0
+        self.refilled = clock()
+        self.spent = 0
+        self.deferred = 0
+        self.lock = Lock()
+        self.changed = Event()
+        self.stop_event = Event()
+        self.thread = None
+        self.on_change = None
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    @property
+    def level(self):
+        if self.factor >= 0.99:
+            return 'normal'
+        return 'reduced' if self.factor > self.BUSY_CEILING else 'minimal'
+
+    def update(self):
+        """Take one reading and recompute the factor, heavy-work gate and rate cap"""
+        reading = self.metrics.sample()
+        reasons = []
+        ceiling = 1.0
+        if reading['cpu_percent'] >= self.busy_percent:
+            ceiling = min(ceiling, self.BUSY_CEILING)
+            reasons.append('busy')
+        if reading['on_battery']:
+            battery = reading.get('battery_percent')
+            if battery is not None and battery <= self.low_battery:
+                ceiling = min(ceiling, self.LOW_BATTERY_CEILING)
+                reasons.append('low battery')
+            else:
+                ceiling = min(ceiling, self.BATTERY_CEILING)
+                reasons.append('battery')
+        if reading['metered']:
+            ceiling = min(ceiling, self.METERED_CEILING)
+            reasons.append('metered')
+
+        own = reading['process_percent']
+        with self.lock:
+            previous = (self.level, tuple(self.reasons))
+            if own > self.cpu_cap:
+                reasons.append('cpu cap')
+                factor = self.factor * max(0.5, self.cpu_cap / own)
+            else:
+                # Grow towards the cap, not past it: own CPU scales roughly with the factor
+                headroom = self.factor * (self.cpu_cap / own - 1) if own > 0 else self.INCREASE
+                factor = self.factor + min(self.INCREASE, headroom)
+            self.factor = max(self.FLOOR, min(factor, ceiling))
+            self.ceiling = ceiling
+            self.reasons = tuple(reasons)
+            self.heavy_ok = not reasons
+            caps = [cap for cap in (self.net_cap_bps, self.metered_cap_bps if reading['metered'] else None) if cap]
+            self.rate_bps = min(caps) if caps else None
+            self.reading = reading
+            changed = previous != (self.level, self.reasons)
+        if self.heavy_ok:
+            self.changed.set()
+        if changed:
+            self.logger.info(f"Resource governor: {self.level} ({', '.join(self.reasons) or 'unconstrained'})")
+            if self.on_change:
+                self.on_change(self.snapshot())
+        return self.factor
+
+    # === BUDGETS ===
+    def budget(self, maximum, minimum=1):
+        """Concurrency for a scheduler that would use maximum when unconstrained"""
+        return max(minimum, int(round(maximum * self.factor)))
+
+    def stretch(self, interval, maximum=None):
+        """A periodic job's interval, lengthened as the factor drops"""
+        stretched = interval / self.factor
+        return stretched if maximum is None else min(stretched, max(interval, maximum))
+
+    def heavy_allowed(self):
+        return self.heavy_ok
+
+    def defer_heavy(self, stop_event=None, max_wait=None):
+        """Block until heavy work is allowed. False if stop_event fired or max_wait ran out first"""
+        if self.heavy_ok:
+            return True
+        with self.lock:
+            self.deferred += 1
+        deadline = None if max_wait is None else self.clock() + max_wait
+        while not self.heavy_ok:
+            if self.stop_event.is_set() or (stop_event is not None and stop_event.is_set()):
+                return False
+            remaining = None if deadline is None else deadline - self.clock()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.changed.clear()
+            self.changed.wait(self.interval if remaining is None else min(self.interval, remaining))
+        return True
+
+    def spend(self, nbytes, stop_event=None):
+        """Account nbytes of background traffic, sleeping first if the rate cap needs it"""
+        while True:
+            with self.lock:
+                rate = self.rate_bps
+                now = self.clock()
+                if rate is None:
+                    self.spent += nbytes
+                    return True
+                byte_rate = rate / 8
+                burst = max(byte_rate, nbytes)      # one second of credit, or the request itself
+                self.tokens = min(burst, self.tokens + (now - self.refilled) * byte_rate)
+                self.refilled = now
+                if self.tokens >= nbytes:
+                    self.tokens -= nbytes
+                    self.spent += nbytes
+                    return True
+                wait = (nbytes - self.tokens) / byte_rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                self.sleep(wait)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'level': self.level,
+                'factor': round(self.factor, 3),
+                'ceiling': self.ceiling,
+                'reasons': list(self.reasons),
+                'heavy_allowed': self.heavy_ok,
+                'rate_bps': self.rate_bps,
+                'spent_bytes': self.spent,
+                'deferred': self.deferred,
+                'reading': dict(self.reading),
+            }
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return self
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='resource-governor', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.changed.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.update()
+            except Exception as e:
+                self.logger.error(f"Resource governor update failed: {e}")
+
+# ===== KILL SWITCH =====
+class KillSwitch:
+    """nftables kill switch: drop all traffic except the tunnel, the VPN server endpoints and the LAN.
+
+    The whole policy is one table compiled to nft syntax and loaded with a
+    single `nft -f`, which the kernel applies as one transaction: there is
+    never a moment with half the rules in place, and thousands of endpoints
+    cost one set load instead of thousands of rule insertions. With dry_run
+    nothing is executed and the ruleset is only returned (and written to
+    output), which needs neither root nor nft.
+
+    Rendered configs still name servers by hostname, so DNS to the system
+    resolvers (resolvers=None) or to the given ones stays allowed.
+    """
+
+    TABLE = 'kingzvpn_killswitch'
+    TUNNEL_INTERFACES = ('tun*', 'wg*', 'utun*')
+    LAN_V4 = ('10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '169.254.0.0/16', '224.0.0.0/4')
+    LAN_V6 = ('fe80::/10', 'fc00::/7', 'ff00::/8')
+    UDP_PROTOCOLS = ('hysteria2', 'tuic', 'wireguard', 'openvpn')
+    UDP_TRANSPORTS = ('kcp', 'quic')
+    # systemd-resolved lists itself (127.0.0.53) in the first; its upstreams are in the second
+    RESOLV_CONF = ('/etc/resolv.conf', '/run/systemd/resolve/resolv.conf')
+
+    def __init__(self, nft='nft', dry_run=False, table=TABLE, interfaces=TUNNEL_INTERFACES,
+                 allow_lan=True, output=None, resolvers=None):
+        self.nft = nft
+        self.dry_run = dry_run
+        self.table = table
+        self.interfaces = tuple(interfaces)
+        self.allow_lan = allow_lan
+        self.output = output          # dry run: also write the ruleset here
+        self.resolvers = resolvers    # None: read from RESOLV_CONF on every apply
+        self.enabled = False
+        self.endpoints = 0
+        self.last_apply_ms = None
+        self.lock = Lock()
+        self.logger = logging.getLogger('KingzVPNPro')
+
+    @classmethod
+    def endpoints_of(cls, config):
+        """(host, 'tcp' | 'udp', port) tuples a config connects to"""
+        if config.get('ovpn'):
+            default_proto = 'udp'
+            remotes = []
+            for line in config['ovpn'].splitlines():
+                words = line.split()
+                if words[:1] == ['proto'] and len(words) > 1:
+                    default_proto = 'tcp' if words[1].startswith('tcp') else 'udp'
+                elif words[:1] == ['remote'] and len(words) > 1:
+                    remotes.append(words[1:])
+            endpoints = []
+            for words in remotes:
+                port = int(words[1]) if len(words) > 1 and words[1].isdigit() else 1194
+                proto = words[2] if len(words) > 2 else default_proto
+                endpoints.append((words[0], 'tcp' if proto.startswith('tcp') else 'udp', port))
+            return endpoints
+        if not config.get('address') or not config.get('port'):
+            return []
+        udp = (config.get('protocol') in cls.UDP_PROTOCOLS
+               or any(tag in cls.UDP_TRANSPORTS for tag in config.get('tags', ())))
+        return [(config['address'], 'udp' if udp else 'tcp', int(config['port']))]
+
+    @classmethod
+    def system_resolvers(cls, paths=RESOLV_CONF):
+        """Non-loopback nameserver addresses from resolv.conf files"""
+        resolvers = []
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            for line in lines:
+                words = line.split()
+                if words[:1] != ['nameserver'] or len(words) < 2:
+                    continue
+                try:
+                    ip = ipaddress.ip_address(words[1].split('%')[0])
+                except ValueError:
+                    continue
+                if not ip.is_loopback and str(ip) not in resolvers:
+                    resolvers.append(str(ip))
+        return resolvers
+
+    def resolver_endpoints(self):
+        resolvers = self.system_resolvers() if self.resolvers is None else self.resolvers
+        return [(ip, proto, 53) for ip in resolvers for proto in ('udp', 'tcp')]
+
+    def _elements(self, endpoints):
+        """Set elements for endpoints plus the resolvers, split into (v4, v6)"""
+        v4, v6 = set(), set()
+        for address, proto, port in [*endpoints, *self.resolver_endpoints()]:
+            try:
+                ip = ipaddress.ip_address(address)
+            except ValueError:
+                raise ValueError(f"Kill switch endpoints must be IP addresses, got {address!r}") from None
+            (v4 if ip.version == 4 else v6).add(f"{ip} . {proto} . {int(port)}")
+        return v4, v6
+
+    @staticmethod
+    def _set(name, type_, elements, flags=None):
+        lines = [f"    set {name} {{", f"        type {type_}"]
+        if flags:
+            lines.append(f"        flags {flags}")
+        if elements:
+            # One element per line keeps nft's parser fast and diffs readable
+            lines.append("        elements = {")
+            lines.append(",\n".join(f"            {element}" for element in elements))
+            lines.append("        }")
+        lines.append("    }")
+        return lines
+
+    def compile(self, endpoints):
+        """nft ruleset for endpoints ((ip, proto, port) tuples, addresses already resolved)"""
+        v4, v6 = self._elements(endpoints)
+
+        lines = [f"table inet {self.table} {{"]
+        lines += self._set('endpoints4', 'ipv4_addr . inet_proto . inet_service', sorted(v4))
+        lines += self._set('endpoints6', 'ipv6_addr . inet_proto . inet_service', sorted(v6))
+        if self.allow_lan:
+            lines += self._set('lan4', 'ipv4_addr', self.LAN_V4, flags='interval')
+            lines += self._set('lan6', 'ipv6_addr', self.LAN_V6, flags='interval')
+
+        tunnel_out = [f'        oifname "{name}" accept' for name in self.interfaces]
+        tunnel_in = [f'        iifname "{name}" accept' for name in self.interfaces]
+        lan_out = ['        ip daddr @lan4 accept', '        ip6 daddr @lan6 accept'] if self.allow_lan else []
+        lan_in = ['        ip saddr @lan4 accept', '        ip6 saddr @lan6 accept'] if self.allow_lan else []
+        lines += [
+            "    chain output {",
+            "        type filter hook output priority 0; policy drop;",
+            '        oifname "lo" accept',
+            *tunnel_out,
+            "        ip daddr . meta l4proto . th dport @endpoints4 accept",
+            "        ip6 daddr . meta l4proto . th dport @endpoints6 accept",
+            *lan_out,
+            "        udp sport 68 udp dport 67 accept",
+            "        udp sport 546 udp dport 547 accept",
+            "        icmpv6 type { nd-router-solicit, nd-neighbor-solicit, nd-neighbor-advert } accept",
+            # Reject rather than drop so applications fail fast instead of hanging
+            "        counter reject with icmpx type admin-prohibited",
+            "    }",
+            "    chain input {",
+            "        type filter hook input priority 0; policy drop;",
+            '        iifname "lo" accept',
+            "        ct state established,related accept",
+            *tunnel_in,
+            *lan_in,
+            "        udp sport 67 udp dport 68 accept",
+            "        udp sport 547 udp dport 546 accept",
+            "        icmpv6 type { nd-router-advert, nd-neighbor-solicit, nd-neighbor-advert } accept",
+            "        counter drop",
+            "    }",
+            "}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def _replace_script(self, body=''):
+        # 'table' is a no-op when it exists and creates it otherwise, so the
+        # delete never fails; all three statements commit as one transaction
+        return f"table inet {self.table}\ndelete table inet {self.table}\n{body}"
+
+    def _load(self, script):
+        started = time.perf_counter()
+        if self.dry_run:
+            if self.output:
+                with open(self.output, 'w', encoding='utf-8') as f:
+                    f.write(script)
+        else:
+            result = subprocess.run([self.nft, '-f', '-'], input=script, text=True,
+                                    capture_output=True, timeout=30)
+            if result.returncode != 0:
+                raise RuntimeError(f"nft failed: {result.stderr.strip() or result.returncode}")
+        self.last_apply_ms = (time.perf_counter() - started) * 1000
+        return script
+
+    def enable(self, endpoints):
+        """Install (or atomically replace) the kill switch. Returns the nft script"""
+        endpoints = list(endpoints)
+        script = self._replace_script(self.compile(endpoints))
+        with self.lock:
+            self._load(script)
+            self.enabled = True
+            self.endpoints = len(endpoints)
+        self.logger.info(f"Kill switch {'compiled (dry run)' if self.dry_run else 'enabled'}: "
+                         f"{len(endpoints)} endpoints in {self.last_apply_ms:.1f} ms")
+        return script
+
+    def update_endpoints(self, endpoints):
+        """Swap the endpoint sets in one transaction, leaving the chains untouched"""
+        v4, v6 = self._elements(endpoints)
+        statements = [f"flush set inet {self.table} endpoints4", f"flush set inet {self.table} endpoints6"]
+        for name, elements in (('endpoints4', v4), ('endpoints6', v6)):
+            if elements:
+                statements.append(f"add element inet {self.table} {name} {{ {', '.join(sorted(elements))} }}")
+        script = "\n".join(statements) + "\n"
+        with self.lock:
+            if not self.enabled:
+                return None
+            self._load(script)
+            self.endpoints = len(v4) + len(v6)
+        return script
+
+    def disable(self):
+        """Remove the kill switch (a no-op when it is not installed)"""
+        with self.lock:
+            script = self._load(self._replace_script())
+            self.enabled = False
+            self.endpoints = 0
+        self.logger.info("Kill switch disabled")
+        return script
+
+    def status(self):
+        return {'enabled': self.enabled, 'dry_run': self.dry_run, 'endpoints': self.endpoints,
+                'last_apply_ms': self.last_apply_ms}
+
+# ===== HTTP CLIENT =====
+class _ResumableSSLSocket(ssl.SSLSocket):
+    """Hands its TLS session to the context once the server's ticket has arrived"""
+
+    _ticketed = False
+
+    def _keep_session(self):
+        session = self.session
+        if session is not None and self.server_hostname:
+            self.context.sessions[self.server_hostname] = session
+            self._ticketed = session.has_ticket
+
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        received = super().recv_into(buffer, nbytes, flags)
+        if not self._ticketed:
+            # TLS 1.3 tickets come after the handshake, with the first response bytes
+            self._keep_session()
+        return received
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """Client context that offers the last session per host, so new connections skip the full handshake"""
+
+    sslsocket_class = _ResumableSSLSocket
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.sessions = {}                    # server hostname -> ssl.SSLSession
+        self.handshakes = Counter()           # (hostname, 'resumed' | 'full') -> count
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and server_hostname:
+            session = self.sessions.get(server_hostname)
+        ssl_sock = super().wrap_socket(sock, server_side=server_side,
+                                       do_handshake_on_connect=do_handshake_on_connect,
+                                       suppress_ragged_eofs=suppress_ragged_eofs,
+                                       server_hostname=server_hostname, session=session)
+        if server_hostname and do_handshake_on_connect:
+            self.handshakes[server_hostname, 'resumed' if ssl_sock.session_reused else 'full'] += 1
+        return ssl_sock
+
+    @classmethod
+    def create(cls, cafile=None, verify=True):
+        context = cls(ssl.PROTOCOL_TLS_CLIENT)
+        if verify:
+            context.load_verify_locations(cafile=cafile or requests.certs.where())
+        else:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+
+class _ContextAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter pinned to one SSL context (CA store loaded once, not per connection)"""
+
+    def __init__(self, context, **kwargs):
+        self.context = context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.context
+        super().init_poolmanager(*args, **kwargs)
+
+    @property
+    def cert_reqs(self):
+        return 'CERT_NONE' if self.context.verify_mode == ssl.CERT_NONE else 'CERT_REQUIRED'
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        # urllib3 sets verify_mode on the context from cert_reqs; keep it the context's own
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        pool_kwargs['cert_reqs'] = self.cert_reqs
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        # The CA bundle is already in the context; a ca_certs path would be re-read per connection
+        conn.cert_reqs = self.cert_reqs
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+
+
+class RetryBudget:
+    """Caps retries at a share of traffic: each request deposits ratio, each retry withdraws 1"""
+
+    def __init__(self, ratio=0.1, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = float(reserve)
+        self.lock = Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class HostMetrics:
+    """Per-host request counters and latency (__slots__: one per host the client ever talks to)"""
+
+    __slots__ = ('requests', 'failures', 'retries', 'connections', 'bytes_in', 'latency_ms', 'statuses',
+                 'versions')
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.connections = 0       # new TCP connections (the rest reused keep-alive ones)
+        self.bytes_in = 0
+        self.latency_ms = None     # EWMA
+        self.statuses = Counter()
+        self.versions = Counter()
+
+
+class HTTPClient:
+    """Shared HTTP layer: pooled keep-alive connections per host, TLS session resumption,
+    optional HTTP/2 (httpx with h2), a total timeout per call, jittered retries under a
+    global retry budget, and per-host metrics.
+
+    get()/request() accept the usual requests keywords (headers, params, data,
+    json), so it stands in for a requests.Session.
+    """
+
+    RETRY_STATUSES = (429, 502, 503, 504)
+    IDEMPOTENT = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, timeout=10.0, attempts=3, backoff=0.25, max_backoff=4.0, pool_maxsize=16,
+                 http2=False, cafile=None, insecure_hosts=(), user_agent='KingzVPN', budget=None, rng=None):
+        self.timeout = timeout               # whole call, retries included
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget or RetryBudget()
+        self.rng = rng or random.Random()
+        self.context = ResumingSSLContext.create(cafile)
+        self.insecure_context = None
+        self.metrics = {}
+        self.lock = Lock()
+        self.logger = logging.getLogger('KingzVPNPro')
+
+        self.http2 = bool(http2 and HTTPX_AVAILABLE)
+        if self.http2:
+            self.client = httpx.Client(http2=True, verify=self.context, follow_redirects=True,
+                                       limits=httpx.Limits(max_keepalive_connections=pool_maxsize),
+                                       headers={'User-Agent': user_agent})
+            self.errors = (httpx.TransportError, OSError)
+        else:
+            self.client = requests.Session()
+            self.client.headers['User-Agent'] = user_agent
+            self.adapter = _ContextAdapter(self.context, pool_connections=32, pool_maxsize=pool_maxsize)
+            self.client.mount('https://', self.adapter)
+            self.client.mount('http://', self.adapter)
+            self.errors = (RequestException, OSError)
+        for host in insecure_hosts:
+            self.allow_insecure(host)
+
+    def allow_insecure(self, host):
+        """Skip certificate checks for one host only (self-signed subscription panels)"""
+        if self.http2:
+            raise ValueError("Per-host certificate exemptions need the requests backend")
+        if self.insecure_context is None:
+            self.insecure_context = ResumingSSLContext.create(verify=False)
+            self.insecure_adapter = _ContextAdapter(self.insecure_context)
+        self.client.mount(f"https://{host}/", self.insecure_adapter)
+        self.client.mount(f"https://{host}:", self.insecure_adapter)
+        # Silence urllib3's warning for this host, not for everything
+        warnings.filterwarnings('ignore', message=f"Unverified HTTPS request is being made to host '{re.escape(host)}'",
+                                category=urllib3.exceptions.InsecureRequestWarning)
+
+    def _host(self, host):
+        with self.lock:
+            metrics = self.metrics.get(host)
+            if metrics is None:
+                metrics = self.metrics[host] = HostMetrics()
+            return metrics
+
+    def _connections(self, url, host):
+        """Connections opened so far by the urllib3 pools for host"""
+        if self.http2:
+            return None
+        pools = self.client.get_adapter(url).poolmanager.pools
+        total = 0
+        for key in pools.keys():
+            pool = pools.get(key) if key.key_host == host else None
+            if pool is not None:
+                total += pool.num_connections
+        return total
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        # Full jitter: spreads retries from many clients hitting the same failure
+        return self.rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method, url, timeout=None, attempts=None, **kwargs):
+        method = method.upper()
+        host = urlsplit(url).hostname or ''
+        metrics = self._host(host)
+        attempts = attempts or (self.attempts if method in self.IDEMPOTENT else 1)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{method} {url}: timeout budget spent after {attempt} attempts")
+            before = self._connections(url, host)
+            started = time.perf_counter()
+            response = error = None
+            try:
+                response = self.client.request(method, url, timeout=remaining, **kwargs)
+            except self.errors as e:
+                error = e
+            elapsed = (time.perf_counter() - started) * 1000
+            after = self._connections(url, host)
+
+            with self.lock:
+                metrics.requests += 1
+                if before is not None and after is not None:
+                    metrics.connections += max(after - before, 0)
+                if response is not None:
+                    metrics.statuses[response.status_code] += 1
+                    version = getattr(response, 'http_version', None) or \
+                        {10: 'HTTP/1.0', 11: 'HTTP/1.1'}.get(getattr(response.raw, 'version', 11), 'HTTP/1.1')
+                    metrics.versions[version] += 1
+                    metrics.bytes_in += len(response.content)
+                    metrics.latency_ms = elapsed if metrics.latency_ms is None else \
+                        0.8 * metrics.latency_ms + 0.2 * elapsed
+                else:
+                    metrics.failures += 1
+
+            if isinstance(error, (requests.exceptions.SSLError, ssl.SSLError)):
+                raise error          # a bad certificate won't get better on retry
+            retry = error is not None or response.status_code in self.RETRY_STATUSES
+            if not retry:
+                self.budget.deposit()
+                return response
+            attempt += 1
+            if attempt >= attempts or not self.budget.withdraw():
+                if error is not None:
+                    raise error
+                return response
+            with self.lock:
+                metrics.retries += 1
+            delay = self._delay(attempt - 1, response)
+            if delay >= deadline - time.monotonic():
+                if error is not None:
+                    raise error
+                return response
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def host_metrics(self):
+        """{host: counters}, including TLS handshakes resumed vs full"""
+        handshakes = Counter()
+        for context in (self.context, self.insecure_context):
+            if context is not None:
+                handshakes.update(context.handshakes)
+        with self.lock:
+            return {
+                host: {
+                    'requests': m.requests, 'failures': m.failures, 'retries': m.retries,
+                    'connections': m.connections,
+                    'reused': max(m.requests - m.failures - m.connections, 0) if not self.http2 else None,
+                    'tls_full': handshakes[host, 'full'], 'tls_resumed': handshakes[host, 'resumed'],
+                    'bytes_in': m.bytes_in,
+                    'latency_ms': None if m.latency_ms is None else round(m.latency_ms, 1),
+                    'statuses': dict(m.statuses), 'versions': dict(m.versions),
+                }
+                for host, m in self.metrics.items()
+            }
+
+    def close(self):
+        self.client.close()
+
+class AdvancedVPNClient:
+    def __init__(self, auto_install_deps=True):
+        print("🚀 Initializing KingzVPN Pro...")
+        
+        # Initialize dependency manager
+        self.dep_manager = DependencyManager()
+        
+        # Check and install dependencies if needed
+        if auto_install_deps:
+            self.install_missing_dependencies()
+        
+        # Now initialize the main application
+        self.app = ctk.CTk()
+        self.setup_window()
+        
+        # Initialize all UI frames first
+        self.quick_connect_frame = None
+        self.configs_frame = None
+        self.speed_frame = None
+        self.settings_frame = None
+        self.tools_frame = None
+        self.deps_frame = None
+        self.main_content = None
+        self.sidebar = None
+        
+        self.configs = []
+        self.current_config = None
+        self.vpn_process = None
+        self.is_connected = False
+        
+        self.connection_lock = threading.Lock()
+        self.process_output = []
+        self.openvpn_config_path = CONFIG_DIR
+
+        # Enhanced events system
+        self.events = {
+            'stats_stop': Event(),
+            'monitor_stop': Event(),
+            'process_stop': Event(),
+            'scan_stop': Event(),
+            'update_stop': Event(),
+            'rules_stop': Event()
+        }
+        
+        self.active_threads = {}
+        self.stats_queue = Queue(maxsize=50)
+        
+        self.speed_widgets = {}
+        self.nav_buttons = {}
+        
+        # Performance optimization
+        self.last_stats_update = 0
+        self.stats_update_interval = 0.5
+        
+        # Enhanced functionality storage
+        self.network_devices = []
+        self.port_scan_results = []
+        # Fixed-size history of throughput and latency (see start_stats_sampler)
+        self.traffic_data = TimeSeriesStore(os.path.join(DB_DIR, 'traffic.tsdb'))
+        self.connection_history = []
+        self.favorite_servers = []
+        self.auto_connect_rules = []
+        
+        # Search index over preset servers and imported configs
+        self.search_index = ServerSearchIndex()
+        self.dns_cache = DNSCache()
+        self.validator = ConfigValidator(resolver=self.dns_cache, tunnel_format=self.tunnel_format)
+        self.qr_codec = QRCodec()
+        self.udp_prober = UDPProbeEngine()
+        
+        self.setup_logging()
+        self.setup_database()
+        # Yesterday's state, decoded section by section as it is needed
+        self.snapshot = SessionSnapshot(os.path.join(DB_DIR, 'session.snap')).open()
+        self.setup_config_store()
+        self.load_user_preferences()
+        self.setup_governor()
+        self.setup_http()
+        self.setup_tunnel()
+        self.setup_rules()
+        self.restore_snapshot()
+        
+        # Enhanced color scheme
+        self.colors = {
+            "primary": "#2b825b",
+            "secondary": "#2196F3", 
+            "success": "#4CAF50",
+            "warning": "#FF9800",
+            "danger": "#ff6b6b",
+            "dark_bg": "#1a1a1a",
+            "card_bg": "#2d2d2d",
+            "text_primary": "#ffffff",
+            "text_secondary": "#b0b0b0"
+        }
+        
+        self.load_data()
+        self.create_ui()
+        self.restore_ui_state()
+        # Decoding the index holds the GIL, so it waits until the window is drawn
+        self.app.after(2000, lambda: threading.Thread(target=self.ensure_search_index,
+                                                      name='search-index', daemon=True).start())
+        self.start_subscription_updater()
+        self.start_network_watcher()
+        self.start_stats_sampler()
+        self.setup_control_server()
+        if self.user_prefs.get('kill_switch') == '1':
+            self.set_kill_switch(True, notify=False)
+        
+    def install_missing_dependencies(self):
+        """Install missing dependencies automatically"""
+        print("\n" + "=" * 50)
+        print("🔍 Checking dependencies...")
+        print("=" * 50)
+        
+        # First check system requirements
+        if not self.dep_manager.check_system_requirements():
+            print("❌ System requirements not met")
+            response = input("Continue anyway? (y/n): ")
+            if response.lower() not in ['y', 'yes']:
+                sys.exit(1)
+        
+        missing_packages = []
+        for pkg, import_name in self.dep_manager.required_packages.items():
+            if not self.dep_manager.is_package_installed(pkg):
+                missing_packages.append(pkg)
+        
+        # Check Windows packages
+        if platform.system() == 'Windows':
+            for pkg, import_name in self.dep_manager.windows_packages.items():
+                if not self.dep_manager.is_package_installed(pkg):
+                    missing_packages.append(pkg)
+        
+        if missing_packages:
+            print(f"❌ Missing {len(missing_packages)} packages: {', '.join(missing_packages)}")
+            print("\n💡 Some features may not work without these packages.")
+            
+            response = input("🤔 Install missing dependencies automatically? (y/n): ")
+            
+            if response.lower() in ['y', 'yes']:
+                print("🚀 Starting automatic installation...")
+                success = self.dep_manager.install_all_dependencies()
+                
+                if success:
+                    print("✅ All dependencies installed successfully!")
+                    print("🔄 Restarting application to load new dependencies...")
+                    time.sleep(2)
+                    os.execv(sys.executable, [sys.executable] + sys.argv)
+                else:
+                    print("❌ Some dependencies failed to install.")
+                    response = input("Continue anyway? (y/n): ")
+                    if response.lower() not in ['y', 'yes']:
+                        sys.exit(1)
+            else:
+                print("⚠️  Continuing with missing dependencies...")
+                print("💡 You can install dependencies later from the Dependencies tab.")
+        else:
+            print("✅ All dependencies are installed!")
+    
+    def setup_window(self):
+        self.app.title("KingzVPN Pro - Advanced VPN Client")
+        self.app.geometry("1200x800")
+        self.app.minsize(1000, 700)
+        
+        # Center window
+        self.app.update_idletasks()
+        screen_width = self.app.winfo_screenwidth()
+        screen_height = self.app.winfo_screenheight()
+        x = (screen_width - 1200) // 2
+        y = (screen_height - 800) // 2
+        self.app.geometry(f"1200x800+{x}+{y}")
+        
+        # Set window icon (if available)
+        try:
+            self.app.iconbitmap(default='icon.ico')
+        except:
+            pass
+
+    # === ENHANCED DEPENDENCY MANAGEMENT UI ===
+    def show_dependency_manager(self):
+        """Show enhanced dependency management dialog"""
+        dialog = ctk.CTkToplevel(self.app)
+        dialog.title("Dependency Manager")
+        dialog.geometry("700x500")
+        dialog.transient(self.app)
+        dialog.grab_set()
+        
+        # Title
+        title = ctk.CTkLabel(dialog, text="📦 Dependency Manager", 
+                           font=("Arial", 20, "bold"))
+        title.pack(pady=10)
+        
+        # System info
+        info_frame = ctk.CTkFrame(dialog)
+        info_frame.pack(fill="x", padx=20, pady=5)
+        
+        sys_info = f"Python {platform.python_version()} | {platform.system()} {platform.release()}"
+        ctk.CTkLabel(info_frame, text=sys_info, font=("Arial", 11)).pack(pady=5)
+        
+        # Status summary
+        summary_frame = ctk.CTkFrame(dialog)
+        summary_frame.pack(fill="x", padx=20, pady=5)
         
         # Count installed vs missing
         total_packages = len(self.dep_manager.required_packages)
@@ -652,6 +6169,16 @@ class AdvancedVPNClient:
         )
         req_btn.pack(side="left", padx=5)
         
+        # Offline wheelhouse button
+        wheel_btn = ctk.CTkButton(
+            btn_frame,
+            text="💾 Build Offline Wheelhouse",
+            command=lambda: self._build_wheelhouse_from_dialog(),
+            fg_color="#6f42c1",
+            hover_color="#5a32a3"
+        )
+        wheel_btn.pack(side="left", padx=5)
+        
         # Close button
         close_btn = ctk.CTkButton(
             btn_frame,
@@ -668,6 +6195,20 @@ class AdvancedVPNClient:
         )
         refresh_btn.pack(side="right", padx=5)
 
+    def _build_wheelhouse_from_dialog(self):
+        """Build the offline wheelhouse in the background"""
+        self.show_notification("Building offline wheelhouse...", "info")
+        
+        def build_async():
+            success, failures = self.dep_manager.build_wheelhouse(include_optional=True)
+            if success:
+                self.show_notification(f"Wheelhouse ready: {self.dep_manager.wheelhouse}", "success")
+            else:
+                failed = ', '.join(pkg for pkg, _ in failures)
+                self.show_notification(f"Wheelhouse built, failed: {failed}", "warning")
+        
+        threading.Thread(target=build_async, daemon=True).start()
+
     def _install_deps_from_dialog(self, dialog):
         """Install dependencies from dialog with progress"""
         # Disable install button during installation
@@ -772,7 +6313,10 @@ class AdvancedVPNClient:
             # Use tkinter's built-in clipboard (most reliable)
             clipboard_content = self.app.clipboard_get()
             
-            if clipboard_content:
+            # Share links / subscription blobs go straight to the store, never into the entry
+            if clipboard_content and looks_like_config_payload(clipboard_content):
+                self.import_pasted_configs(clipboard_content)
+            elif clipboard_content:
                 # Insert at cursor position
                 event.widget.insert('insert', clipboard_content)
                 self.show_notification("Text pasted successfully", "success")
@@ -784,6 +6328,40 @@ class AdvancedVPNClient:
             self.show_notification("Paste failed", "error")
             return "break"
 
+    def import_pasted_configs(self, text, batch_size=1000):
+        """Parse pasted share links on a worker thread and import them"""
+        self.show_notification("Importing pasted configs...", "info")
+        
+        def import_async():
+            try:
+                found = 0
+                added, batch = [], []
+                for link in iter_share_links(text):
+                    config = parse_config_link(link)
+                    if config is None:
+                        continue
+                    found += 1
+                    batch.append(config)
+                    if len(batch) >= batch_size:
+                        added += self.add_configs(batch, source="clipboard", validate=False)
+                        batch = []
+                if batch:
+                    added += self.add_configs(batch, source="clipboard", validate=False)
+                if added:
+                    self.validate_configs(added, notify=False, background=True)
+                
+                if not found:
+                    self.show_notification("No valid configs in clipboard", "warning")
+                else:
+                    self.show_notification(
+                        f"Pasted {found} configs: {len(added)} new, {found - len(added)} duplicates", "success"
+                    )
+            except Exception as e:
+                self.logger.error(f"Paste import failed: {e}")
+                self.show_notification(f"Paste import failed: {e}", "error")
+        
+        threading.Thread(target=import_async, daemon=True).start()
+
     def _show_simple_context_menu(self, event):
         """Simple context menu"""
         try:
@@ -799,61 +6377,621 @@ class AdvancedVPNClient:
         except Exception as e:
             print(f"❌ Context menu failed: {e}")
 
-    def _context_copy_simple(self):
-        """Simple copy operation"""
-        try:
-            selected_text = self.url_entry.get()
-            if selected_text:
-                self.app.clipboard_clear()
-                self.app.clipboard_append(selected_text)
-                self.show_notification("Text copied", "success")
-        except Exception as e:
-            print(f"❌ Copy failed: {e}")
+    def _context_copy_simple(self):
+        """Simple copy operation"""
+        try:
+            selected_text = self.url_entry.get()
+            if selected_text:
+                self.app.clipboard_clear()
+                self.app.clipboard_append(selected_text)
+                self.show_notification("Text copied", "success")
+        except Exception as e:
+            print(f"❌ Copy failed: {e}")
+
+    def _context_cut_simple(self):
+        """Simple cut operation"""
+        try:
+            selected_text = self.url_entry.get()
+            if selected_text:
+                self.app.clipboard_clear()
+                self.app.clipboard_append(selected_text)
+                self.url_entry.delete(0, 'end')
+                self.show_notification("Text cut", "success")
+        except Exception as e:
+            print(f"❌ Cut failed: {e}")
+
+    def _context_select_all_simple(self):
+        """Simple select all"""
+        try:
+            self.url_entry._entry.select_range(0, 'end')
+            self.url_entry._entry.icursor('end')
+        except Exception as e:
+            print(f"❌ Select all failed: {e}")
+
+    # === CORE APPLICATION FUNCTIONALITY ===
+    def setup_database(self):
+        """Initialize SQLite database"""
+        try:
+            # Shared with background threads (watchdog, probes) under db_lock
+            self.db_lock = threading.Lock()
+            self.db_conn = sqlite3.connect(os.path.join(DB_DIR, 'vpn_client.db'), check_same_thread=False)
+            self.db_cursor = self.db_conn.cursor()
+            
+            # Create basic tables
+            self.db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS connection_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    server_name TEXT,
+                    config_type TEXT,
+                    duration INTEGER,
+                    success BOOLEAN
+                )
+            ''')
+            
+            self.db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_preferences (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            
+            self.db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS probe_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    config_hash TEXT,
+                    sent INTEGER,
+                    received INTEGER,
+                    rtt_ms REAL,
+                    jitter_ms REAL,
+                    reordered INTEGER
+                )
+            ''')
+            
+            self.db_conn.commit()
+            self.logger.info("Database initialized")
+            
+        except Exception as e:
+            self.logger.error(f"Database setup failed: {e}")
+
+    def setup_config_store(self):
+        """Open the imported config store"""
+        self.configs_lock = threading.Lock()
+        self.snapshot_fresh = False
+        try:
+            self.config_store = ConfigStore(os.path.join(DB_DIR, 'vpn_client.db'))
+            # The snapshot copy is only used while the store has not changed since it was written
+            meta = self.snapshot.get('meta', {})
+            self.snapshot_fresh = ('configs' in self.snapshot
+                                   and meta.get('fingerprint') == self.config_store.fingerprint())
+            self.configs = self.snapshot.get('configs') if self.snapshot_fresh else self.config_store.all()
+            self.logger.info(f"Loaded {len(self.configs)} configs" + (" from snapshot" if self.snapshot_fresh else ""))
+        except Exception as e:
+            self.logger.error(f"Config store setup failed: {e}")
+            self.config_store = None
+
+    def start_subscription_updater(self):
+        """Start background subscription refresh"""
+        if not self.config_store:
+            return
+        self.subscription_updater = SubscriptionUpdater(
+            self.config_store,
+            self.events['update_stop'],
+            on_delta=self._on_subscription_delta,
+            on_error=lambda url, e: self.show_notification(f"Subscription update failed: {e}", "error"),
+            session=self.http,
+            governor=self.governor
+        )
+        self.subscription_updater.start()
+
+    def _on_subscription_delta(self, url, added, removed, changed):
+        """Apply a subscription delta to the in-memory configs (updater thread)"""
+        gone = {c['hash'] for c in removed} | {old['hash'] for old, _ in changed}
+        fresh = added + [new for _, new in changed]
+        for config in fresh:
+            config['subscription'] = url
+        
+        with self.configs_lock:
+            if gone:
+                self.configs = [c for c in self.configs if c['hash'] not in gone]
+            self.configs.extend(fresh)
+        
+        for config in removed:
+            self.unindex_config(config)
+        for old, _ in changed:
+            self.unindex_config(old)
+        for config in fresh:
+            self.index_config(config)
+        
+        self._publish('subscription', url=url, added=len(added), removed=len(removed), changed=len(changed))
+        self.refresh_kill_switch()
+        self.show_notification(
+            f"Subscription updated: +{len(added)} -{len(removed)} ~{len(changed)}", "success"
+        )
+        
+        # Flag dead nodes before anyone tries them
+        if fresh:
+            self.validate_configs(fresh, notify=False, background=True)
+
+    def add_configs(self, configs, source="import", validate=True):
+        """Store configs not seen before and make them searchable. Returns the ones added"""
+        if not self.config_store:
+            self.show_notification("Config store unavailable", "error")
+            return []
+        added = self.config_store.add_many(configs)
+        with self.configs_lock:
+            self.configs.extend(added)
+        for config in added:
+            self.index_config(config)
+        
+        duplicates = len(configs) - len(added)
+        self.logger.info(f"Imported {len(added)} configs from {source} ({duplicates} duplicates)")
+        if added:
+            self._publish('configs', source=source, added=len(added), duplicates=duplicates)
+            self.refresh_kill_switch()
+        if added and validate:
+            self.validate_configs(added, notify=False, background=True)
+        return added
+
+    def validate_configs(self, configs=None, notify=True, background=False):
+        """Dry-run check configs in the background and flag dead ones.
+
+        background passes (after imports and subscription updates) wait until
+        the resource governor allows heavy work.
+        """
+        if configs is None:
+            with self.configs_lock:
+                configs = list(self.configs)
+        if not configs:
+            if notify:
+                self.show_notification("No configs to validate", "warning")
+            return
+        
+        def validate_async():
+            if background and not self.governor.defer_heavy(self.events['scan_stop']):
+                return
+            # One parallel resolution pass instead of a lookup per check
+            self.dns_cache.resolve_many(c['address'] for c in configs if c.get('address'))
+            
+            by_hash = {c['hash']: c for c in configs}
+            alive = dead = 0
+            for verdict in self.validator.validate(configs, stop_event=self.events['scan_stop']):
+                config = by_hash.get(verdict['hash'])
+                if config is not None:
+                    config['alive'] = verdict['ok']
+                    config['latency_ms'] = verdict['latency_ms']
+                if verdict['ok'] and verdict['latency_ms'] is not None:
+                    self.load_balancer.observe_latency(verdict['hash'], verdict['latency_ms'])
+                elif not verdict['ok']:
+                    self.load_balancer.observe_loss(verdict['hash'])
+                if verdict['ok']:
+                    alive += 1
+                else:
+                    dead += 1
+                    self.logger.info(f"Dead config {verdict['name']}: {verdict['stage']} - {verdict['error']}")
+            
+            dns_stats = self.dns_cache.stats()
+            self.logger.info(
+                f"DNS cache: {dns_stats['hits']} hits, {dns_stats['misses']} misses, "
+                f"{dns_stats['entries']} entries"
+            )
+            if notify:
+                self.show_notification(f"Validation: {alive} alive, {dead} dead", "success" if alive else "warning")
+        
+        threading.Thread(target=validate_async, daemon=True).start()
+
+    def probe_servers(self, configs=None, notify=True):
+        """UDP loss/jitter probes against each server's echo port, in the background. Returns the count"""
+        if configs is None:
+            configs = self.rank_configs()[:int(self.user_prefs.get('udp_probe_limit', '200'))]
+        if not configs:
+            if notify:
+                self.show_notification("No configs to probe", "warning")
+            return 0
+        echo_port = int(self.user_prefs.get('udp_echo_port', '7'))
+        
+        def probe_async():
+            try:
+                addresses = self.dns_cache.resolve_many(c['address'] for c in configs)
+                targets = [(c['hash'], addresses[c['address']][0], echo_port)
+                           for c in configs if addresses.get(c['address'])]
+                started = time.perf_counter()
+                results = {}
+                prober = self.udp_prober
+                train_bytes = 2 * prober.count * prober.size      # out and back
+                while targets and not self.events['scan_stop'].is_set():
+                    batch_size = self.governor.budget(prober.max_concurrent)
+                    batch, targets = targets[:batch_size], targets[batch_size:]
+                    if not self.governor.spend(train_bytes * len(batch), self.events['scan_stop']):
+                        break
+                    results.update(prober.probe_many(batch, max_concurrent=batch_size))
+                self.logger.info(f"UDP probes: {len(results)} servers in {time.perf_counter() - started:.1f}s")
+                
+                rows = []
+                answered = 0
+                for config in configs:
+                    result = results.get(config['hash'])
+                    if result is None or result['error']:
+                        continue     # no echo service says nothing about the path
+                    answered += 1
+                    config['loss'] = result['loss']
+                    config['jitter_ms'] = result['jitter_ms']
+                    self.load_balancer.observe_probe_train(config['hash'], result['loss'],
+                                                           result['rtt_ms'], result['jitter_ms'])
+                    rows.append((config['hash'], result['sent'], result['received'], result['rtt_ms'],
+                                 result['jitter_ms'], result['reordered']))
+                self.record_probes(rows)
+                self._publish('probes', servers=len(results), answered=answered)
+                if notify:
+                    self.show_notification(f"UDP probes: {answered} of {len(configs)} servers answered",
+                                           "success" if answered else "warning")
+            except Exception as e:
+                self.logger.error(f"UDP probes failed: {e}")
+                if notify:
+                    self.show_notification(f"UDP probes failed: {e}", "error")
+        
+        threading.Thread(target=probe_async, name='udp-probes', daemon=True).start()
+        return len(configs)
+
+    def record_probes(self, rows):
+        """Store (hash, sent, received, rtt, jitter, reordered) rows in probe_history"""
+        if not rows:
+            return
+        try:
+            with self.db_lock:
+                self.db_cursor.executemany(
+                    "INSERT INTO probe_history (config_hash, sent, received, rtt_ms, jitter_ms, reordered) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self.db_conn.commit()
+        except Exception as e:
+            self.logger.error(f"Failed to record probes: {e}")
+
+    def setup_governor(self):
+        """Size background work from CPU load, battery and metering (prefs background_cpu_cap,
+        background_kbps, metered = auto/1/0, metered_kbps)"""
+        metered = self.user_prefs.get('metered', 'auto')
+        if metered == 'auto':
+            probe = lambda: link_is_metered(getattr(self, 'network_interface', None))
+        else:
+            probe = lambda: metered == '1'
+        net_cap = float(self.user_prefs.get('background_kbps', '0')) * 1000
+        self.governor = ResourceGovernor(
+            SystemMetrics(metered=probe),
+            cpu_cap=float(self.user_prefs.get('background_cpu_cap', '15')),
+            net_cap_bps=net_cap or None,
+            metered_cap_bps=float(self.user_prefs.get('metered_kbps', '256')) * 1000
+        )
+        self.governor.on_change = lambda state: self._publish('governor', **state)
+        self.validator.governor = self.governor
+        self.governor.start()
+
+    def setup_http(self):
+        """Shared HTTP client (prefs http2, insecure_hosts = comma-separated hosts with self-signed certs)"""
+        self.http = HTTPClient(
+            http2=self.user_prefs.get('http2', '0') == '1',
+            insecure_hosts=[host.strip() for host in self.user_prefs.get('insecure_hosts', '').split(',')
+                            if host.strip()]
+        )
+
+    def setup_tunnel(self):
+        """Prepare tunnel launching and the fast-switch standby"""
+        self.active_socks_port = TUNNEL_SOCKS_PORT
+        self.fast_switch_enabled = self.user_prefs.get('fast_switch', '1') == '1'
+        self.route_compiler = RouteListCompiler()
+        self.domain_routes_cache = None    # (list file stamp, matcher, xray rules)
+        self.domain_lock = Lock()
+        self.converter = ConfigConverter()
+        self.network_id = 'default'
+        self.network_interface = None
+        try:
+            self.tuning_store = TuningStore(os.path.join(DB_DIR, 'vpn_client.db'))
+        except Exception as e:
+            self.logger.error(f"Tuning store setup failed: {e}")
+            self.tuning_store = None
+        self.tunnel_pool = None
+        self.kill_switch_addresses = {}       # host -> last good addresses
+        self.kill_switch = KillSwitch(
+            dry_run=platform.system() != 'Linux' or self.user_prefs.get('kill_switch_dry_run', '0') == '1',
+            allow_lan=self.user_prefs.get('kill_switch_lan', '1') == '1',
+            output=os.path.join(CONFIG_DIR, 'killswitch.nft')
+        )
+        self.load_balancer = ServerLoadBalancer()
+        self.fast_switcher = FastSwitcher(self.tunnel_command(), self.dns_cache, self.validator,
+                                          self.converter, self.tunnel_format(),
+                                          routing_provider=self.split_tunnel_rules,
+                                          tuning_provider=self.tuning_for)
+        # Fast switches run the next tunnel on another port; the front keeps the user's port fixed
+        self.socks_front = None
+        if self.fast_switch_enabled:
+            try:
+                self.socks_front = SocksFront(TUNNEL_SOCKS_PORT).start()
+            except Exception as e:
+                self.logger.warning(f"{e}; fast switches will move the SOCKS port")
+        self.connected_since = None
+        self.watchdog = HealthWatchdog(
+            self.events['monitor_stop'],
+            probe=self._health_probe,
+            on_failure=self._on_tunnel_failure,
+            is_alive=lambda: self.vpn_process is not None and self.vpn_process.alive()
+        )
+
+    def setup_rules(self):
+        """Load auto-connect rules and favorites"""
+        try:
+            self.favorite_servers = json.loads(self.user_prefs.get('favorite_servers', '[]'))
+        except JSONDecodeError:
+            self.favorite_servers = []
+        
+        try:
+            self.rule_engine = AutoConnectRuleEngine(
+                os.path.join(DB_DIR, 'vpn_client.db'),
+                on_fire=self._on_rule_fired
+            )
+            self.auto_connect_rules = self.rule_engine.list_rules()
+            self.logger.info(f"Loaded {len(self.auto_connect_rules)} auto-connect rules")
+        except Exception as e:
+            self.logger.error(f"Rule engine setup failed: {e}")
+            self.rule_engine = None
+
+    def restore_snapshot(self):
+        """Apply the small snapshot sections: balancer state, IP info, last server"""
+        balancer = self.snapshot.get('balancer')
+        if balancer:
+            # Already includes the history it was seeded with
+            self.load_balancer.restore_state(balancer)
+        else:
+            self.load_balancer_history()
+        self.ip_info = self.snapshot.get('ip_info') or {}
+        self.last_server = self.snapshot.get('session', {}).get('last_server')
+
+    def restore_ui_state(self):
+        """Reopen the last tab"""
+        tabs = {
+            "🚀 Quick Connect": self.show_quick_connect,
+            "📈 Speed": self.show_speed,
+            "🛠️ Tools": self.show_tools,
+        }
+        show = tabs.get(self.snapshot.get('session', {}).get('tab'))
+        if show:
+            show()
+
+    def save_snapshot(self):
+        """Atomically write the session snapshot; unchanged sections are copied as-is"""
+        started = time.perf_counter()
+        fingerprint = self.config_store.fingerprint() if self.config_store else None
+        meta = self.snapshot.get('meta', {})
+        unchanged = self.snapshot_fresh and meta.get('fingerprint') == fingerprint
+        
+        current = self.current_config['hash'] if self.current_config else None
+        sections = {
+            'balancer': self.load_balancer.export_state(),
+            'ip_info': self.ip_info,
+            'session': {'last_server': current or self.last_server, 'tab': getattr(self, 'active_tab', None)},
+        }
+        keep = []
+        if unchanged:
+            keep.append('configs')
+        else:
+            with self.configs_lock:
+                sections['configs'] = [{key: c.get(key) for key in ConfigStore.COLUMNS} for c in self.configs]
+        
+        # The index generation (its next doc id) tells whether it changed since it was restored
+        generation = self.search_index.next_id
+        if not self.index_ready.is_set():
+            generation = meta.get('index_generation')
+            if unchanged:
+                keep.append('search_index')
+        elif unchanged and meta.get('index_generation') == generation:
+            keep.append('search_index')
+        else:
+            sections['search_index'] = self.search_index.export_state()
+        sections['meta'] = {'fingerprint': fingerprint, 'saved': time.time(), 'index_generation': generation}
+        
+        size = self.snapshot.save(sections, keep)
+        self.logger.info(f"Session snapshot: {size // 1024} KB in {time.perf_counter() - started:.2f}s "
+                         f"(reused {', '.join(keep) or 'nothing'})")
+
+    def load_balancer_history(self, limit=5000):
+        """Seed the load balancer with recent session outcomes from connection_history"""
+        with self.configs_lock:
+            by_name = {c['name']: c['hash'] for c in self.configs}
+        try:
+            with self.db_lock:
+                self.db_cursor.execute(
+                    "SELECT server_name, success, timestamp FROM connection_history ORDER BY id DESC LIMIT ?",
+                    (limit,)
+                )
+                rows = self.db_cursor.fetchall()
+        except Exception as e:
+            self.logger.error(f"Failed to load connection history: {e}")
+            return
+        
+        history = []
+        for name, success, timestamp in rows:
+            if name not in by_name:
+                continue
+            try:
+                # CURRENT_TIMESTAMP is UTC
+                when = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+            except (TypeError, ValueError):
+                continue
+            history.append((by_name[name], bool(success), when))
+        self.load_balancer.load_history(history)
+        self.logger.info(f"Load balancer seeded with {len(history)} past sessions")
+
+    def add_favorite(self, config):
+        """Mark a config as favorite"""
+        if config['hash'] not in self.favorite_servers:
+            self.favorite_servers.append(config['hash'])
+            self.save_user_preference('favorite_servers', json.dumps(self.favorite_servers))
+
+    def start_network_watcher(self, interval=10):
+        """Poll network identity and clock, feeding the rule engine and tuning lookups"""
+        stop = self.events['rules_stop']
+        
+        def watch():
+            while not stop.is_set():
+                try:
+                    ssid, interface = current_network()
+                    self.network_id = ssid or interface or 'default'
+                    self.network_interface = interface
+                    if self.rule_engine:
+                        self.rule_engine.update(ssid=ssid, interface=interface or '')
+                        self.rule_engine.tick_clock()
+                except Exception as e:
+                    self.logger.error(f"Network watcher failed: {e}")
+                stop.wait(interval)
+        
+        threading.Thread(target=watch, name='network-watcher', daemon=True).start()
+
+    def start_stats_sampler(self, interval=0.25, save_every=60):
+        """Record throughput (and fresh latency probes) into traffic_data every interval"""
+        stop = self.events['stats_stop']
+        
+        def sample():
+            last = psutil.net_io_counters()
+            last_time = last_save = time.monotonic()
+            probes = 0
+            # The graph wants 4 Hz, but a constrained machine gets at most 1 s between samples
+            while not stop.wait(self.governor.stretch(interval, maximum=1.0)):
+                try:
+                    counters = psutil.net_io_counters()
+                    now = time.monotonic()
+                    elapsed = max(now - last_time, 1e-3)
+                    rx_bps = (counters.bytes_recv - last.bytes_recv) * 8 / elapsed
+                    tx_bps = (counters.bytes_sent - last.bytes_sent) * 8 / elapsed
+                    last, last_time = counters, now
+                    
+                    # Only count a latency once per probe, not once per sample
+                    latency = None
+                    if self.is_connected and self.watchdog.stats['probes'] != probes:
+                        probes = self.watchdog.stats['probes']
+                        latency = self.watchdog.stats['last_latency_ms']
+                    
+                    rx_bps, tx_bps = max(rx_bps, 0), max(tx_bps, 0)
+                    self.traffic_data.record(rx_bps=rx_bps, tx_bps=tx_bps, latency_ms=latency)
+                    # Idle samples say nothing about what the server can deliver
+                    config = self.current_config
+                    if self.is_connected and config and rx_bps >= 256e3:
+                        self.load_balancer.observe_throughput(config['hash'], rx_bps)
+                    if not self.stats_queue.full():
+                        self.stats_queue.put_nowait((time.time(), rx_bps, tx_bps))
+                    self._publish('stats', rx_bps=rx_bps, tx_bps=tx_bps, latency_ms=latency)
+                    if now - last_save >= save_every:
+                        self.traffic_data.save()
+                        last_save = now
+                except Exception as e:
+                    self.logger.error(f"Stats sampler failed: {e}")
+        
+        thread = threading.Thread(target=sample, name='stats-sampler', daemon=True)
+        self.active_threads['stats'] = thread
+        thread.start()
+
+    def resolve_rule_target(self, target):
+        """Map a rule target (best / favorite / last / hash / name) to a config"""
+        if target in (None, '', 'best'):
+            return self.pick_server()
+        if target == 'last':
+            target = self.last_server
+        ranked = self.rank_configs()
+        if target == 'favorite':
+            favorites = set(self.favorite_servers)
+            return next((c for c in ranked if c['hash'] in favorites), None)
+        with self.configs_lock:
+            return next((c for c in self.configs if target in (c['hash'], c['name'])), None)
+
+    def _on_rule_fired(self, rule):
+        """Carry out a fired rule's action off the caller's thread"""
+        def run():
+            if rule.action == 'disconnect':
+                if self.is_connected:
+                    self.disconnect()
+                return
+            if rule.action == 'connect' and self.is_connected:
+                return
+            config = self.resolve_rule_target(rule.target)
+            if config is None:
+                self.logger.warning(f"Rule {rule.name}: no server for target {rule.target}")
+                return
+            if self.current_config and self.is_connected and config['hash'] == self.current_config['hash']:
+                return
+            self.show_notification(f"Rule '{rule.name}': connecting to {config['name']}", "info")
+            self.connect_config(config)
+        
+        threading.Thread(target=run, daemon=True).start()
+
+    def split_tunnel_rules(self):
+        """xray routing rules sending the split-tunnel lists (if any) direct"""
+        rules = []
+        
+        rules.extend(self.domain_routes()[1])
+        
+        source = self.user_prefs.get('split_tunnel_list')
+        if source and os.path.isfile(source):
+            try:
+                rules.extend(self.route_compiler.to_xray_rules(self.route_compiler.compile(source)))
+            except Exception as e:
+                self.logger.error(f"Split-tunnel list failed to compile: {e}")
+        
+        return rules or None
 
-    def _context_cut_simple(self):
-        """Simple cut operation"""
-        try:
-            selected_text = self.url_entry.get()
-            if selected_text:
-                self.app.clipboard_clear()
-                self.app.clipboard_append(selected_text)
-                self.url_entry.delete(0, 'end')
-                self.show_notification("Text cut", "success")
-        except Exception as e:
-            print(f"❌ Cut failed: {e}")
+    def split_tunnel_domains(self):
+        """Lines of the split-tunnel domain list (geosite syntax), if configured"""
+        source = self.user_prefs.get('split_tunnel_domains')
+        if not source or not os.path.isfile(source):
+            return []
+        with open(source, encoding='utf-8') as f:
+            return f.read().splitlines()
 
-    def _context_select_all_simple(self):
-        """Simple select all"""
+    def domain_routes(self):
+        """(matcher, xray rules) for the split-tunnel domain list, rebuilt whenever the file changes"""
+        source = self.user_prefs.get('split_tunnel_domains')
         try:
-            self.url_entry._entry.select_range(0, 'end')
-            self.url_entry._entry.icursor('end')
-        except Exception as e:
-            print(f"❌ Select all failed: {e}")
+            info = os.stat(source) if source else None
+        except OSError:
+            info = None
+        stamp = (source, info.st_mtime_ns, info.st_size) if info else None
+        with self.domain_lock:
+            cached = self.domain_routes_cache
+            if cached is not None and cached[0] == stamp:
+                return cached[1], cached[2]
+            if cached is not None and cached[1] is not None:
+                cached[1].close()
+            matcher, rules = None, []
+            domains = self.split_tunnel_domains() if stamp else []
+            if domains:
+                try:
+                    matcher = DomainMatcher.compile({'direct': domains})
+                    rules = DomainMatcher.to_xray_rules({'direct': domains}, matcher)
+                except (OSError, ValueError) as e:
+                    self.logger.error(f"Split-tunnel domain list failed to compile: {e}")
+                    matcher, rules = None, DomainMatcher.to_xray_rules({'direct': domains})
+            self.domain_routes_cache = (stamp, matcher, rules)
+            return matcher, rules
 
-    # === CORE APPLICATION FUNCTIONALITY ===
-    def setup_database(self):
-        """Initialize SQLite database"""
+    def route_for_domain(self, domain):
+        """'direct' if domain bypasses the tunnel per the domain list, else 'proxy'"""
+        matcher = self.domain_routes()[0]
+        with self.domain_lock:
+            if matcher is None or matcher.mm.closed:
+                return 'proxy'
+            return matcher.match(domain) or 'proxy'
+
+    def tunnel_format(self):
+        """Config format the tunnel binary expects: xray or sing-box"""
+        fmt = self.user_prefs.get('tunnel_format', 'xray')
+        return fmt if fmt in ('xray', 'sing-box') else 'xray'
+
+    def tunnel_command(self):
+        """Tunnel binary command line; {config} is replaced by the config path"""
         try:
-            self.db_conn = sqlite3.connect(os.path.join(DB_DIR, 'vpn_client.db'))
-            self.db_cursor = self.db_conn.cursor()
-            
-            # Create basic tables
-            self.db_cursor.execute('''
-                CREATE TABLE IF NOT EXISTS connection_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    server_name TEXT,
-                    config_type TEXT,
-                    duration INTEGER,
-                    success BOOLEAN
-                )
-            ''')
-            
-            self.db_conn.commit()
-            self.logger.info("Database initialized")
-            
-        except Exception as e:
-            self.logger.error(f"Database setup failed: {e}")
+            return json.loads(self.user_prefs['tunnel_command'])
+        except (KeyError, TypeError, JSONDecodeError):
+            binary = 'sing-box' if self.tunnel_format() == 'sing-box' else 'xray'
+            return [binary, 'run', '-c', '{config}']
 
     def load_user_preferences(self):
         """Load user preferences"""
@@ -871,11 +7009,12 @@ class AdvancedVPNClient:
     def save_user_preference(self, key, value):
         """Save user preference"""
         try:
-            self.db_cursor.execute(
-                "INSERT OR REPLACE INTO user_preferences (key, value) VALUES (?, ?)",
-                (key, value)
-            )
-            self.db_conn.commit()
+            with self.db_lock:
+                self.db_cursor.execute(
+                    "INSERT OR REPLACE INTO user_preferences (key, value) VALUES (?, ?)",
+                    (key, value)
+                )
+                self.db_conn.commit()
             self.user_prefs[key] = value
         except Exception as e:
             self.logger.error(f"Failed to save preference: {e}")
@@ -883,10 +7022,671 @@ class AdvancedVPNClient:
     def load_data(self):
         """Load initial data"""
         self.preset_servers = [
-            {"name": "USA - New York Premium", "address": "nyc.example.com", "ping": 28, "load": 45, "type": "premium"},
-            {"name": "Germany - Frankfurt Secure", "address": "fra.example.com", "ping": 35, "load": 32, "type": "secure"},
-            {"name": "UK - London Streaming", "address": "lon.example.com", "ping": 42, "load": 28, "type": "streaming"},
+            {"name": "USA - New York Premium", "address": "nyc.example.com", "type": "premium"},
+            {"name": "Germany - Frankfurt Secure", "address": "fra.example.com", "type": "secure"},
+            {"name": "UK - London Streaming", "address": "lon.example.com", "type": "streaming"},
         ]
+        
+        # Built on first search or shortly after the window is up (see ensure_search_index)
+        self.index_lock = Lock()
+        self.index_ready = Event()
+
+    def ensure_search_index(self):
+        """Restore the search index from the snapshot, or build it, once"""
+        with self.index_lock:
+            if self.index_ready.is_set():
+                return
+            started = time.perf_counter()
+            state = self.snapshot.get('search_index') if self.snapshot_fresh else None
+            with self.configs_lock:
+                configs = list(self.configs)
+            entries = {('server', server['name']): server for server in self.preset_servers}
+            entries.update((self.config_key(config), config) for config in configs)
+            restored = state is not None and self.search_index.restore_state(state, entries)
+            if not restored:
+                for key, entry in entries.items():
+                    self.search_index.add(key, entry)
+            self.index_ready.set()
+            self.logger.info(f"Search index {'restored' if restored else 'built'} "
+                             f"in {time.perf_counter() - started:.2f}s")
+
+    def config_key(self, config):
+        """Stable search index key for an imported config"""
+        return ('config', config.get('hash') or config.get('name'))
+
+    def index_config(self, config):
+        """Add an imported config to the search index"""
+        self.search_index.add(self.config_key(config), config)
+
+    def unindex_config(self, config):
+        """Remove a config from the search index"""
+        self.search_index.remove(self.config_key(config))
+
+    def search_servers(self, query, page_size=50):
+        """Return the first page of servers/configs matching query"""
+        self.ensure_search_index()
+        return self.search_index.first_page(query, page_size)
+
+    # === QR CODES ===
+    def show_share_dialog(self, config=None):
+        """Show a config as a QR code (cached after the first render)"""
+        if not QRCODE_AVAILABLE:
+            self.show_notification("qrcode is not installed", "error")
+            return
+        if config is None:
+            with self.configs_lock:
+                config = self.current_config or (self.configs[0] if self.configs else None)
+        if config is None:
+            self.show_notification("No config to share", "warning")
+            return
+        
+        png = self.qr_codec.render(config)
+        if png is None:
+            self.show_notification("Config is too long for a QR code", "warning")
+            return
+        
+        dialog = ctk.CTkToplevel(self.app)
+        dialog.title(f"Share - {config['name']}")
+        dialog.transient(self.app)
+        
+        image = Image.open(io.BytesIO(png))
+        qr_image = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
+        ctk.CTkLabel(dialog, text="", image=qr_image).pack(padx=20, pady=(20, 10))
+        ctk.CTkLabel(dialog, text=config['name'], font=("Arial", 14, "bold")).pack(pady=(0, 10))
+        
+        def copy_link():
+            self.app.clipboard_clear()
+            self.app.clipboard_append(config['uri'])
+            self.show_notification("Link copied", "success")
+        
+        ctk.CTkButton(dialog, text="Copy Link", fg_color=self.colors["secondary"],
+                      command=copy_link).pack(fill="x", padx=20, pady=(0, 20))
+
+    def export_qr_codes(self, configs=None, directory=None):
+        """Export configs as PNG QR codes, one folder per subscription"""
+        if not QRCODE_AVAILABLE:
+            self.show_notification("qrcode is not installed", "error")
+            return
+        if configs is None:
+            with self.configs_lock:
+                configs = list(self.configs)
+        if not configs:
+            self.show_notification("No configs to export", "warning")
+            return
+        directory = directory or filedialog.askdirectory(title="Export QR codes to")
+        if not directory:
+            return
+        
+        def export_async():
+            try:
+                groups = {}
+                for config in configs:
+                    source = config.get('subscription')
+                    folder = re.sub(r'[^\w.-]+', '_', urlsplit(source).netloc) if source else 'manual'
+                    groups.setdefault(folder, []).append(config)
+                
+                written = skipped = 0
+                started = time.perf_counter()
+                for folder, group in groups.items():
+                    w, s = self.qr_codec.export(group, os.path.join(directory, folder))
+                    written += w
+                    skipped += s
+                
+                self.logger.info(f"QR export: {written} images in {time.perf_counter() - started:.2f}s")
+                message = f"Exported {written} QR codes" + (f", {skipped} too long" if skipped else "")
+                self.show_notification(message, "success")
+            except Exception as e:
+                self.logger.error(f"QR export failed: {e}")
+                self.show_notification(f"QR export failed: {e}", "error")
+        
+        threading.Thread(target=export_async, daemon=True).start()
+
+    def export_subscription_qr(self, url, directory=None):
+        """Export every config of one subscription as QR codes"""
+        if self.config_store:
+            self.export_qr_codes(self.config_store.by_subscription(url), directory)
+
+    # === TUNNEL TUNING ===
+    def tuning_for(self, config):
+        """Tuned parameters for config on the current network, or None"""
+        if self.tuning_store is None:
+            return None
+        try:
+            return self.tuning_store.get(config['hash'], self.network_id)
+        except Exception as e:
+            self.logger.error(f"Tuning lookup failed: {e}")
+            return None
+
+    def tune_server(self, config=None):
+        """Run MTU discovery and the parameter grid for config (default: the current server)"""
+        config = config or self.current_config or self.pick_server()
+        if config is None:
+            self.show_notification("No server to tune", "warning")
+            return False
+        if self.tuning_store is None:
+            self.show_notification("Tuning store unavailable", "error")
+            return False
+        url = self.user_prefs.get('throughput_url')
+        tester = ThroughputTester(url) if url else ThroughputTester()
+        tuner = TunnelTuner(self.tunnel_command(), self.converter, self.tuning_store, tester,
+                            self.tunnel_format(), echo_port=int(self.user_prefs.get('udp_echo_port', '7')),
+                            resolver=self.dns_cache)
+        network = self.network_id
+        self.show_notification(f"Tuning {config['name']}...", "info")
+        
+        def tune_async():
+            try:
+                started = time.perf_counter()
+                result = tuner.tune(config, network, stop_event=self.events['scan_stop'])
+                self.logger.info(f"Tuned {config['name']} on {network} in {time.perf_counter() - started:.0f}s: "
+                                 f"{result['best']} at {format_rate(result['throughput_bps'])}")
+                if result['best']:
+                    self.show_notification(
+                        f"Tuned {config['name']}: path MTU {result['path_mtu']}, "
+                        f"{format_rate(result['throughput_bps'])}", "success")
+                elif not result['results']:
+                    self.show_notification(f"{config['name']}: nothing to tune in {tuner.tunnel_format} format "
+                                           f"(tunable: {TunnelTuner.TUNABLE})", "info")
+                else:
+                    self.show_notification(f"Tuning {config['name']} failed: no throughput", "warning")
+            except Exception as e:
+                self.logger.error(f"Tuning failed: {e}")
+                self.show_notification(f"Tuning failed: {e}", "error")
+        
+        threading.Thread(target=tune_async, name='tunnel-tuner', daemon=True).start()
+        return True
+
+    def export_runnable_configs(self, fmt=None, directory=None):
+        """Convert every config into runnable xray / sing-box files"""
+        fmt = fmt or self.tunnel_format()
+        with self.configs_lock:
+            configs = list(self.configs)
+        if not configs:
+            self.show_notification("No configs to export", "warning")
+            return
+        directory = directory or filedialog.askdirectory(title=f"Export {fmt} configs to")
+        if not directory:
+            return
+        
+        def export_async():
+            try:
+                started = time.perf_counter()
+                tunings = self.tuning_store.for_network(self.network_id) if self.tuning_store else None
+                written, skipped = self.converter.export(configs, fmt, directory, tunings=tunings)
+                self.logger.info(f"Exported {written} {fmt} configs in {time.perf_counter() - started:.2f}s")
+                message = f"Exported {written} {fmt} configs" + (f", {skipped} unsupported" if skipped else "")
+                self.show_notification(message, "success")
+            except Exception as e:
+                self.logger.error(f"Config export failed: {e}")
+                self.show_notification(f"Config export failed: {e}", "error")
+        
+        threading.Thread(target=export_async, daemon=True).start()
+
+    def import_qr_images(self, paths=None):
+        """Import configs from QR code images"""
+        if not PYZBAR_AVAILABLE:
+            self.show_notification("pyzbar is required to read QR codes", "error")
+            return
+        paths = paths or filedialog.askopenfilenames(
+            title="Import QR codes",
+            filetypes=[("Images", "*.png *.jpg *.jpeg *.bmp *.gif *.webp"), ("All files", "*.*")]
+        )
+        if not paths:
+            return
+        
+        def import_async():
+            try:
+                configs = QRCodec.decode_files(list(paths))
+                added = self.add_configs(configs, source="QR images")
+                self.show_notification(
+                    f"QR import: {len(added)} new configs from {len(paths)} images",
+                    "success" if added else "warning"
+                )
+            except Exception as e:
+                self.logger.error(f"QR import failed: {e}")
+                self.show_notification(f"QR import failed: {e}", "error")
+        
+        threading.Thread(target=import_async, daemon=True).start()
+
+    # === CONNECTION MANAGEMENT ===
+    def record_connection(self, config, success, duration=0):
+        """Append a session to connection_history (memory and database)"""
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'server_name': config.get('name'),
+            'config_type': config.get('protocol'),
+            'duration': int(duration),
+            'success': bool(success),
+        }
+        self.connection_history.append(entry)
+        del self.connection_history[:-500]
+        if config.get('hash'):
+            self.load_balancer.observe_session(config['hash'], success)
+        
+        try:
+            with self.db_lock:
+                self.db_cursor.execute(
+                    "INSERT INTO connection_history (server_name, config_type, duration, success) "
+                    "VALUES (?, ?, ?, ?)",
+                    (entry['server_name'], entry['config_type'], entry['duration'], entry['success'])
+                )
+                self.db_conn.commit()
+        except Exception as e:
+            self.logger.error(f"Failed to record connection: {e}")
+
+    def _end_session(self, success):
+        if self.current_config and self.connected_since:
+            self.record_connection(self.current_config, success, time.time() - self.connected_since)
+        self.connected_since = None
+
+    def _health_probe(self):
+        """One cheap request through the tunnel's SOCKS port"""
+        host, _, port = self.user_prefs.get('health_probe', '1.1.1.1:443').rpartition(':')
+        config = self.current_config
+        try:
+            latency = socks5_probe(self.active_socks_port, host, int(port))
+        except Exception:
+            if config:
+                self.load_balancer.observe_loss(config['hash'])
+            raise
+        if config:
+            self.load_balancer.observe_latency(config['hash'], latency)
+        if self.rule_engine:
+            self.rule_engine.update(latency=latency)
+        return latency
+
+    def _on_tunnel_failure(self, reason):
+        """Watchdog callback: record the failure and fail over to the next server"""
+        failed = self.current_config
+        self._end_session(False)
+        self.show_notification(f"Connection lost ({reason}), switching server...", "warning")
+        
+        standby = self.fast_switcher.standby
+        if standby and failed and standby['config']['hash'] == failed['hash']:
+            self.fast_switcher.discard()
+        if self.switch_server():
+            return True
+        # connect_config kept the dead process as "previous"; drop it so the UI shows disconnected
+        with self.connection_lock:
+            if self.vpn_process is not None and not self.vpn_process.alive():
+                self.vpn_process.stop()
+                self.vpn_process = None
+                self.is_connected = False
+                if self.socks_front:
+                    self.socks_front.retarget(None)
+        self.update_connection_status()
+        self.show_notification("Failover failed: reconnect manually", "error")
+        return False
+
+    def rank_configs(self, exclude=None):
+        """Alive configs the tunnel can run, ordered by load balancer score (best first)"""
+        with self.configs_lock:
+            configs = list(self.configs)
+        
+        fmt = self.tunnel_format()
+        alive = []
+        for config in configs:
+            if exclude and config['hash'] == exclude:
+                continue
+            if not self.converter.can_run(config, fmt):
+                continue
+            verdict = self.validator.cached(config['hash'])
+            if verdict is not None and not verdict['ok']:
+                continue
+            if verdict and verdict['latency_ms'] is not None and config['hash'] not in self.load_balancer.stats:
+                self.load_balancer.observe_latency(config['hash'], verdict['latency_ms'])
+            alive.append(config)
+        return self.load_balancer.rank(alive)
+
+    def pick_server(self, exclude=None):
+        """Power-of-two-choices pick among the top-ranked configs, so users do not all pile onto one"""
+        candidates = int(self.user_prefs.get('balancer_candidates', '8'))
+        return self.load_balancer.choose(self.rank_configs(exclude=exclude)[:candidates])
+
+    def connect_config(self, config):
+        """Connect to config, reusing the pre-warmed standby when it matches"""
+        started = time.perf_counter()
+        
+        with self.connection_lock:
+            previous = self.vpn_process
+            standby = self.fast_switcher.take(config) if self.fast_switch_enabled else None
+            
+            try:
+                if standby and standby['process'] and standby['process'].alive():
+                    # Already running on the spare port: only swap over
+                    tunnel, mode = standby['process'], 'warm'
+                else:
+                    if previous is not None:
+                        port = previous.socks_port
+                    elif self.socks_front:
+                        # Behind the front: any internal port the held standby is not using
+                        held = self.fast_switcher.standby
+                        port = TUNNEL_SOCKS_PORT + (2 if held and held['port'] == TUNNEL_SOCKS_PORT + 1 else 1)
+                    else:
+                        port = TUNNEL_SOCKS_PORT
+                    if standby:
+                        path, port, mode = standby['path'], standby['port'], 'rendered'
+                    else:
+                        path = self.converter.render_file(config, self.tunnel_format(), socks_port=port,
+                                                          routing_rules=self.split_tunnel_rules(),
+                                                          tuning=self.tuning_for(config))
+                        mode = 'cold'
+                    if previous is not None:
+                        previous.stop()
+                        previous = None
+                    tunnel = TunnelProcess(self.tunnel_command(), config, path,
+                                           socks_port=port, output=self.process_output).start()
+                    if not tunnel.wait_ready():
+                        tunnel.stop()
+                        raise RuntimeError("tunnel did not come up")
+                
+                if self.socks_front:
+                    self.socks_front.retarget(tunnel.socks_port)
+                if previous is not None:
+                    previous.stop()
+                if self.connected_since:
+                    self._end_session(True)
+                
+                self.vpn_process = tunnel
+                self.current_config = config
+                self.is_connected = True
+                self.active_socks_port = tunnel.socks_port
+                
+            except Exception as e:
+                self.vpn_process = previous
+                self.is_connected = previous is not None and previous.alive()
+                if self.socks_front:
+                    self.socks_front.retarget(previous.socks_port if previous is not None else None)
+                self.record_connection(config, False)
+                self.logger.error(f"Connect to {config['name']} failed: {e}")
+                self.show_notification(f"Connection failed: {e}", "error")
+                self.update_connection_status()
+                return False
+        
+        elapsed = self.fast_switcher.record(mode, started)
+        self.connected_since = time.time()
+        self.watchdog.start()
+        self.show_notification(f"Connected: {config['name']} ({elapsed:.0f} ms)", "success")
+        self.update_connection_status()
+        
+        if self.fast_switch_enabled:
+            threading.Thread(target=self.prepare_standby, daemon=True).start()
+        return True
+
+    def prepare_standby(self):
+        """Warm up the next-best server for fast failover"""
+        current = self.current_config['hash'] if self.current_config else None
+        for candidate in self.rank_configs(exclude=current)[:3]:
+            try:
+                if self.fast_switcher.prepare(candidate, active_port=self.active_socks_port):
+                    return
+            except Exception as e:
+                self.logger.warning(f"Standby preparation failed for {candidate['name']}: {e}")
+
+    def switch_server(self, config=None):
+        """Switch to config, or to the standby / next-best server"""
+        if config is None:
+            standby = self.fast_switcher.standby
+            if standby:
+                config = standby['config']
+            else:
+                current = self.current_config['hash'] if self.current_config else None
+                config = self.pick_server(exclude=current)
+                if config is None:
+                    self.show_notification("No server to switch to", "warning")
+                    return False
+        return self.connect_config(config)
+
+    def connect_best(self):
+        """Connect to a best-ranked config chosen by the load balancer"""
+        config = self.pick_server()
+        if config is None:
+            self.show_notification(f"No configs the {self.tunnel_format()} tunnel can run", "warning")
+            return False
+        return self.connect_config(config)
+
+    def disconnect(self):
+        """Tear down the active tunnel"""
+        self.watchdog.stop()
+        self._end_session(True)
+        with self.connection_lock:
+            if self.socks_front:
+                self.socks_front.retarget(None)
+            if self.vpn_process is not None:
+                self.vpn_process.stop()
+            self.vpn_process = None
+            self.is_connected = False
+        self.update_connection_status()
+
+    # === MULTI-TUNNEL MODE ===
+    def start_multi_tunnel(self, count=None, configs=None):
+        """Run several best-ranked configs as concurrent tunnels (blocking, call off the UI thread)"""
+        count = count or int(self.user_prefs.get('multi_tunnel_count', '4'))
+        if self.tunnel_pool is None:
+            self.tunnel_pool = TunnelPool(self.tunnel_command(), self.converter, self.tunnel_format(),
+                                          probe=self._tunnel_pool_probe, on_change=self._on_tunnel_change,
+                                          tuning_provider=self.tuning_for)
+        
+        running = {slot.config['hash'] for slot in self.tunnel_pool.slots.values()}
+        candidates = [c for c in (configs or self.rank_configs()) if c['hash'] not in running]
+        rules = self.split_tunnel_rules()
+        started = 0
+        for config in candidates[:max(0, count - len(running))]:
+            try:
+                self.tunnel_pool.add(config, rules)
+                started += 1
+            except Exception as e:
+                self.logger.error(f"Tunnel for {config['name']} failed to start: {e}")
+        
+        self.show_notification(f"Multi-tunnel: {len(self.tunnel_pool)} tunnels ({started} new)",
+                               "success" if started else "warning")
+        return self.tunnel_pool.snapshot()
+
+    def stop_multi_tunnel(self):
+        if self.tunnel_pool is not None:
+            self.tunnel_pool.stop()
+            self.tunnel_pool = None
+            self.show_notification("Multi-tunnel stopped", "info")
+        return []
+
+    def toggle_multi_tunnel(self):
+        if self.tunnel_pool is not None:
+            self.stop_multi_tunnel()
+        else:
+            threading.Thread(target=self.start_multi_tunnel, daemon=True).start()
+
+    def _tunnel_pool_probe(self, slot):
+        host, _, port = self.user_prefs.get('health_probe', '1.1.1.1:443').rpartition(':')
+        try:
+            latency = socks5_probe(slot.port, host, int(port))
+        except Exception:
+            self.load_balancer.observe_loss(slot.config['hash'])
+            raise
+        self.load_balancer.observe_latency(slot.config['hash'], latency)
+        return latency
+
+    def _on_tunnel_change(self, slot):
+        """Tunnel pool callback (supervisor thread)"""
+        self.logger.info(f"Tunnel {slot.config['name']} on port {slot.port}: {slot.state}")
+        self._publish('tunnel', **slot.snapshot())
+
+    def update_connection_status(self):
+        """Reflect is_connected in the sidebar"""
+        self._publish('connection', **self.connection_state())
+        if self.is_connected and self.current_config:
+            text, color = f"● {self.current_config['name'][:24]}", self.colors["success"]
+        else:
+            text, color = "● OFFLINE", self.colors["danger"]
+        try:
+            self.app.after(0, lambda: self.status_indicator.configure(text=text, text_color=color))
+        except Exception:
+            pass
+
+    # === KILL SWITCH ===
+    def kill_switch_endpoints(self):
+        """Resolved (ip, proto, port) endpoints of every known server.
+
+        A host that fails to re-resolve keeps its last good addresses, so a
+        DNS hiccup never drops a server out of the allow-list.
+        """
+        with self.configs_lock:
+            configs = list(self.configs)
+        endpoints = [e for config in configs for e in KillSwitch.endpoints_of(config)]
+        addresses = self.dns_cache.resolve_many(host for host, _, _ in endpoints)
+        known = self.kill_switch_addresses
+        for host, resolved in addresses.items():
+            if resolved:
+                known[host] = resolved
+        for host in set(known) - set(addresses):
+            del known[host]
+        return [(ip, proto, port) for host, proto, port in endpoints for ip in known.get(host, ())]
+
+    def set_kill_switch(self, enabled, notify=True):
+        """Install or remove the kill switch in the background (pref kill_switch)"""
+        def apply_async():
+            try:
+                if enabled:
+                    self.kill_switch.enable(self.kill_switch_endpoints())
+                else:
+                    self.kill_switch.disable()
+                self.save_user_preference('kill_switch', '1' if enabled else '0')
+                self._publish('killswitch', **self.kill_switch.status())
+                if notify:
+                    status = self.kill_switch.status()
+                    if self.kill_switch.dry_run:
+                        message = f"Kill switch dry run written to {self.kill_switch.output}"
+                    elif enabled:
+                        message = f"Kill switch on: {status['endpoints']} endpoints ({status['last_apply_ms']:.0f} ms)"
+                    else:
+                        message = "Kill switch off"
+                    self.show_notification(message, "success")
+            except Exception as e:
+                self.logger.error(f"Kill switch failed: {e}")
+                if notify:
+                    self.show_notification(f"Kill switch failed: {e}", "error")
+        
+        threading.Thread(target=apply_async, name='kill-switch', daemon=True).start()
+        return True
+
+    def toggle_kill_switch(self):
+        self.set_kill_switch(not self.kill_switch.enabled)
+
+    def refresh_kill_switch(self):
+        """Swap in the endpoint sets after the server list changed"""
+        if not self.kill_switch.enabled:
+            return
+        
+        def refresh_async():
+            try:
+                self.kill_switch.update_endpoints(self.kill_switch_endpoints())
+            except Exception as e:
+                self.logger.error(f"Kill switch endpoint update failed: {e}")
+        
+        threading.Thread(target=refresh_async, name='kill-switch', daemon=True).start()
+
+    # === CONTROL API ===
+    def setup_control_server(self):
+        """Serve the local JSON-RPC control API (pref control_api = 0 turns it off)"""
+        self.control_server = None
+        if self.user_prefs.get('control_api', '1') != '1':
+            return
+        server = ControlServer(self.user_prefs.get('control_socket', CONTROL_SOCKET))
+        server.register('status', self.connection_state, blocking=False)
+        server.register('stats', self._rpc_stats, blocking=False)
+        server.register('configs.list', self._rpc_list_configs, blocking=False)
+        server.register('import', self._rpc_import)
+        server.register('connect', self._rpc_connect)
+        server.register('disconnect', self._rpc_disconnect)
+        server.register('switch', lambda: self.switch_server())
+        server.register('validate', self._rpc_validate, blocking=False)
+        server.register('tunnels.list', lambda: self.tunnel_pool.snapshot() if self.tunnel_pool else [],
+                        blocking=False)
+        server.register('tunnels.start', self.start_multi_tunnel)
+        server.register('probe', lambda: self.probe_servers(notify=False))
+        server.register('governor', self.governor.snapshot, blocking=False)
+        server.register('http.metrics', self.http.host_metrics, blocking=False)
+        server.register('killswitch', lambda enabled=None: self.kill_switch.status() if enabled is None
+                        else self.set_kill_switch(bool(enabled), notify=False))
+        server.register('route', self.route_for_domain)
+        server.register('tune', lambda target=None: self.tune_server(self.resolve_rule_target(target)
+                                                                     if target else None))
+        server.register('tunnels.stop', self.stop_multi_tunnel)
+        try:
+            self.control_server = server.start()
+        except Exception as e:
+            self.logger.warning(f"Control API disabled: {e}")
+
+    def _publish(self, event, **data):
+        """Push an event to control API subscribers"""
+        server = getattr(self, 'control_server', None)
+        if server is not None:
+            server.publish(event, **data)
+
+    def connection_state(self):
+        config = self.current_config if self.is_connected else None
+        return {
+            'connected': bool(self.is_connected),
+            'config': self._public_config(config) if config else None,
+            'since': self.connected_since,
+            'socks_port': self.socks_front.port if self.socks_front else self.active_socks_port,
+        }
+
+    @staticmethod
+    def _public_config(config):
+        return {key: config.get(key) for key in
+                ('hash', 'name', 'protocol', 'address', 'port', 'alive', 'latency_ms', 'subscription')}
+
+    def _rpc_stats(self, seconds=60):
+        rates = {}
+        for metric in TimeSeriesStore.METRICS:
+            times, values = self.traffic_data.latest(metric, seconds)
+            rates[metric] = [[float(t), float(v)] for t, v in zip(times, values)]
+        return rates
+
+    def _rpc_list_configs(self, offset=0, limit=100, query=None):
+        with self.configs_lock:
+            configs = list(self.configs)
+        if query:
+            needle = query.lower()
+            configs = [c for c in configs if needle in c['name'].lower() or needle in c['address'].lower()]
+        return {
+            'total': len(configs),
+            'configs': [self._public_config(c) for c in configs[offset:offset + limit]],
+        }
+
+    def _rpc_import(self, text):
+        """Subscription URL (kept fresh by the updater) or pasted share links"""
+        text = text.strip()
+        if text.startswith(('http://', 'https://')) and not any(c.isspace() for c in text):
+            if not getattr(self, 'subscription_updater', None):
+                raise RuntimeError("Config store unavailable")
+            self.subscription_updater.add(text)
+            return {'subscription': text}
+        configs = [c for c in map(parse_config_link, iter_share_links(text)) if c]
+        added = self.add_configs(configs, source="control api")
+        return {'found': len(configs), 'added': len(added)}
+
+    def _rpc_connect(self, target='best'):
+        config = self.resolve_rule_target(target)
+        if config is None:
+            raise RuntimeError(f"No server for {target}")
+        if not self.connect_config(config):
+            raise RuntimeError(f"Connect to {config['name']} failed")
+        return self.connection_state()
+
+    def _rpc_disconnect(self):
+        if self.is_connected:
+            self.disconnect()
+        return self.connection_state()
+
+    def _rpc_validate(self, hashes=None):
+        configs = None
+        if hashes:
+            wanted = set(hashes)
+            with self.configs_lock:
+                configs = [c for c in self.configs if c['hash'] in wanted]
+        self.validate_configs(configs, notify=False)
+        return True
 
     # === UI CREATION ===
     def create_ui(self):
@@ -901,6 +7701,7 @@ class AdvancedVPNClient:
         
         # Initialize tabs
         self.create_quick_connect_tab()
+        self.create_speed_tab()
         self.create_tools_tab()
         self.create_dependencies_tab()
         
@@ -947,6 +7748,7 @@ class AdvancedVPNClient:
         
         nav_buttons = [
             ("🚀 Quick Connect", self.show_quick_connect),
+            ("📈 Speed", self.show_speed),
             ("🛠️ Tools", self.show_tools),
             ("📦 Dependencies", self.show_dependency_manager),
         ]
@@ -979,9 +7781,10 @@ class AdvancedVPNClient:
         )
         self.status_indicator.pack(anchor="w")
         
+        cached_ip = self.ip_info.get('ip')
         self.ip_label = ctk.CTkLabel(
             status_frame,
-            text="IP: Loading...",
+            text=f"IP: {cached_ip} (refreshing)" if cached_ip else "IP: Loading...",
             font=("Arial", 10),
             text_color=self.colors["text_secondary"]
         )
@@ -1046,6 +7849,104 @@ class AdvancedVPNClient:
             command=self.import_config
         )
         import_btn.pack(side="right")
+        
+        self.create_server_search(self.quick_connect_frame)
+
+    def create_server_search(self, parent):
+        """Create search-as-you-type list over servers and configs"""
+        search_card = ctk.CTkFrame(
+            parent,
+            corner_radius=10,
+            fg_color=self.colors["card_bg"]
+        )
+        search_card.pack(fill="both", expand=True, pady=10)
+        
+        content_frame = ctk.CTkFrame(search_card, fg_color="transparent")
+        content_frame.pack(fill="both", expand=True, padx=20, pady=15)
+        
+        self.search_entry = ctk.CTkEntry(
+            content_frame,
+            placeholder_text="Search by name, country, protocol or #tag...",
+            height=35,
+            font=("Arial", 12)
+        )
+        self.search_entry.pack(fill="x", pady=(0, 10))
+        self.search_entry.bind('<KeyRelease>', lambda event: self.refresh_search_results())
+        
+        self.search_results = ctk.CTkTextbox(content_frame, font=("Arial", 12))
+        self.search_results.pack(fill="both", expand=True)
+        
+        self.refresh_search_results()
+
+    def refresh_search_results(self):
+        """Render the first result page for the current query"""
+        try:
+            results = self.search_servers(self.search_entry.get())
+            
+            lines = []
+            for entry in results:
+                details = entry.get('protocol') or entry.get('type') or ''
+                lines.append(f"{entry.get('name', '?')}    {details}")
+            
+            self.search_results.configure(state="normal")
+            self.search_results.delete("1.0", "end")
+            self.search_results.insert("1.0", "\n".join(lines) or "No matches")
+            self.search_results.configure(state="disabled")
+            
+        except Exception as e:
+            self.logger.error(f"Search failed: {e}")
+
+    def create_speed_tab(self, window=600):
+        """Create speed tab with the live bandwidth graph"""
+        self.speed_frame = ctk.CTkFrame(self.main_content, fg_color="transparent")
+        
+        title = ctk.CTkLabel(
+            self.speed_frame,
+            text="Speed",
+            font=("Arial", 24, "bold")
+        )
+        title.pack(anchor="w", pady=(0, 20))
+        
+        graph_card = ctk.CTkFrame(
+            self.speed_frame,
+            corner_radius=10,
+            fg_color=self.colors["card_bg"]
+        )
+        graph_card.pack(fill="x", padx=5, pady=5)
+        
+        ctk.CTkLabel(
+            graph_card,
+            text="Bandwidth (last 10 minutes)",
+            font=("Arial", 16, "bold")
+        ).pack(anchor="w", padx=15, pady=10)
+        
+        graph = BandwidthGraph(graph_card, window=window, width=window, bg=self.colors["card_bg"],
+                               colors=(("rx", self.colors["success"]), ("tx", self.colors["secondary"])))
+        graph.pack(padx=15, pady=(0, 15))
+        self.speed_widgets['graph'] = graph
+        
+        # Backfill from history, then follow the live stats pipeline
+        times, rx = self.traffic_data.latest('rx_bps', window)
+        _, tx = self.traffic_data.latest('tx_bps', window)
+        if len(times) == len(tx):
+            graph.load(times, {'rx': rx, 'tx': tx})
+        self.poll_stats()
+
+    def poll_stats(self, interval_ms=250):
+        """Drain sampler output into the speed widgets (UI thread)"""
+        if self.events['stats_stop'].is_set():
+            return
+        graph = self.speed_widgets.get('graph')
+        while not self.stats_queue.empty():
+            timestamp, rx_bps, tx_bps = self.stats_queue.get_nowait()
+            if graph:
+                graph.push(timestamp, rx=rx_bps, tx=tx_bps)
+        
+        now = time.monotonic()
+        if graph and now - self.last_stats_update >= 60:
+            self.last_stats_update = now
+            self.logger.debug(f"Bandwidth graph CPU share: {graph.cpu_share() * 100:.3f}%")
+        self.app.after(interval_ms, self.poll_stats)
 
     def create_tools_tab(self):
         """Create tools tab"""
@@ -1082,6 +7983,42 @@ class AdvancedVPNClient:
         
         self.add_tool_button(tools_card, "Test Connection", 
                            lambda: self.test_connection())
+        
+        self.add_tool_button(tools_card, "Validate Configs", 
+                           lambda: self.validate_configs())
+        
+        self.add_tool_button(tools_card, "Connect Best Server", 
+                           lambda: threading.Thread(target=self.connect_best, daemon=True).start())
+        
+        self.add_tool_button(tools_card, "Fast Switch", 
+                           lambda: threading.Thread(target=self.switch_server, daemon=True).start())
+        
+        self.add_tool_button(tools_card, "Disconnect", 
+                           lambda: self.disconnect())
+        
+        self.add_tool_button(tools_card, "Share Config (QR)", 
+                           lambda: self.show_share_dialog())
+        
+        self.add_tool_button(tools_card, "Export QR Codes", 
+                           lambda: self.export_qr_codes())
+        
+        self.add_tool_button(tools_card, "Import QR Images", 
+                           lambda: self.import_qr_images())
+        
+        self.add_tool_button(tools_card, "Export Runnable Configs", 
+                           lambda: self.export_runnable_configs())
+        
+        self.add_tool_button(tools_card, "Multi-Tunnel Mode", 
+                           lambda: self.toggle_multi_tunnel())
+        
+        self.add_tool_button(tools_card, "Kill Switch", 
+                           lambda: self.toggle_kill_switch())
+        
+        self.add_tool_button(tools_card, "Probe Loss / Jitter", 
+                           lambda: self.probe_servers())
+        
+        self.add_tool_button(tools_card, "Auto-Tune MTU / Buffers", 
+                           lambda: self.tune_server())
 
     def create_dependencies_tab(self):
         """Create dependencies tab placeholder"""
@@ -1112,7 +8049,7 @@ class AdvancedVPNClient:
     def test_connection(self):
         """Test internet connection"""
         try:
-            response = requests.get('https://www.google.com', timeout=5)
+            response = self.http.get('https://www.google.com', timeout=5)
             if response.status_code == 200:
                 self.show_notification("Internet connection: OK", "success")
             else:
@@ -1123,8 +8060,9 @@ class AdvancedVPNClient:
     def load_ip_info(self):
         """Load public IP information"""
         try:
-            response = requests.get('https://api.ipify.org', timeout=5)
+            response = self.http.get('https://api.ipify.org', timeout=5)
             ip = response.text
+            self.ip_info = {'ip': ip, 'checked': time.time()}
             self.app.after(0, lambda: self.ip_label.configure(text=f"IP: {ip}"))
         except:
             self.app.after(0, lambda: self.ip_label.configure(text="IP: Unavailable"))
@@ -1143,13 +8081,20 @@ class AdvancedVPNClient:
                 return
                 
             self.show_notification(f"Importing from: {url}", "info")
-            # Actual import logic would go here
+            
+            if not getattr(self, 'subscription_updater', None):
+                self.show_notification("Config store unavailable", "error")
+                return
+            
+            # Fetched and kept fresh on the updater thread
+            self.subscription_updater.add(url)
             
         except Exception as e:
             self.show_notification(f"Import failed: {str(e)}", "error")
 
     def show_notification(self, message, type_="info"):
         """Show notification message"""
+        self._publish('notification', message=message, level=type_)
         try:
             colors = {
                 "success": self.colors["success"],
@@ -1194,6 +8139,13 @@ class AdvancedVPNClient:
             self.quick_connect_frame.pack(fill="both", expand=True)
         self.highlight_nav_button("🚀 Quick Connect")
 
+    def show_speed(self):
+        """Show speed tab"""
+        self.hide_all_tabs()
+        if self.speed_frame:
+            self.speed_frame.pack(fill="both", expand=True)
+        self.highlight_nav_button("📈 Speed")
+
     def show_tools(self):
         """Show tools tab"""
         self.hide_all_tabs()
@@ -1203,7 +8155,7 @@ class AdvancedVPNClient:
 
     def hide_all_tabs(self):
         """Hide all tabs"""
-        frames = [self.quick_connect_frame, self.tools_frame, self.deps_frame]
+        frames = [self.quick_connect_frame, self.speed_frame, self.tools_frame, self.deps_frame]
         for frame in frames:
             if frame:
                 try:
@@ -1213,6 +8165,7 @@ class AdvancedVPNClient:
 
     def highlight_nav_button(self, button_text):
         """Highlight active navigation button"""
+        self.active_tab = button_text
         for text, btn in self.nav_buttons.items():
             if text == button_text:
                 btn.configure(fg_color=("gray60", "gray30"))
@@ -1263,9 +8216,52 @@ class AdvancedVPNClient:
             for event in self.events.values():
                 event.set()
                 
+            if getattr(self, 'subscription_updater', None):
+                self.subscription_updater.stop()
+            if getattr(self, 'governor', None):
+                self.governor.stop()
+            if getattr(self, 'control_server', None):
+                self.control_server.stop()
+            if getattr(self, 'qr_codec', None):
+                self.qr_codec.close()
+            if getattr(self, 'converter', None):
+                self.converter.close()
+            if getattr(self, 'http', None):
+                self.http.close()
+            if getattr(self, 'traffic_data', None):
+                self.traffic_data.save()
+            
+            # Stop tunnels
+            if getattr(self, 'fast_switcher', None):
+                self.fast_switcher.discard()
+            if getattr(self, 'socks_front', None):
+                self.socks_front.stop()
+            if getattr(self, 'tunnel_pool', None):
+                self.tunnel_pool.stop()
+            if self.vpn_process is not None:
+                self.vpn_process.stop()
+            # Quitting the client should not leave the machine offline
+            if getattr(self, 'kill_switch', None) and self.kill_switch.enabled:
+                try:
+                    self.kill_switch.disable()
+                except Exception as e:
+                    self.logger.error(f"Kill switch removal failed: {e}")
+                
+            if getattr(self, 'snapshot', None) and hasattr(self, 'index_ready'):
+                try:
+                    self.save_snapshot()
+                except Exception as e:
+                    self.logger.error(f"Session snapshot failed: {e}")
+            
             # Close database
             if hasattr(self, 'db_conn'):
                 self.db_conn.close()
+            if getattr(self, 'config_store', None):
+                self.config_store.close()
+            if getattr(self, 'rule_engine', None):
+                self.rule_engine.close()
+            if getattr(self, 'tuning_store', None):
+                self.tuning_store.close()
                 
             self.logger.info("Application cleanup completed")
             
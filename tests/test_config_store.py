@@ -0,0 +1,68 @@
+"""ConfigStore.apply_delta: subscription refreshes touch only what changed"""
+import pytest
+
+from main import ConfigStore, parse_config_link
+
+
+def link(user, host='198.51.100.1', name='Node'):
+    return parse_config_link(f"vless://{user}@{host}:443?type=tcp#{name}")
+
+
+def hashes(configs):
+    return sorted(config['hash'] for config in configs)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ConfigStore(str(tmp_path / 'configs.db'))
+    yield store
+    store.conn.close()
+
+
+def stored(store, subscription):
+    rows = store.conn.execute("SELECT hash FROM configs WHERE subscription = ?", (subscription,)).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def test_first_sync_adds_everything(store):
+    configs = [link('a', name='One'), link('b', name='Two')]
+    added, removed, changed = store.apply_delta('sub', configs)
+    assert hashes(added) == hashes(configs) and removed == [] and changed == []
+    assert stored(store, 'sub') == hashes(configs)
+
+
+def test_resync_reports_only_differences(store):
+    store.apply_delta('sub', [link('a', name='One'), link('b', name='Two'), link('c', name='Three')])
+    new_two = link('b2', name='Two')            # same node, new credentials
+    added, removed, changed = store.apply_delta(
+        'sub', [link('a', name='One'), new_two, link('d', name='Four')])
+    assert hashes(added) == hashes([link('d', name='Four')])
+    assert hashes(removed) == hashes([link('c', name='Three')])
+    assert [(old['hash'], new['hash']) for old, new in changed] == \
+        [(link('b', name='Two')['hash'], new_two['hash'])]
+    assert stored(store, 'sub') == hashes([link('a', name='One'), new_two, link('d', name='Four')])
+
+
+def test_unchanged_payload_is_a_no_op(store):
+    configs = [link('a', name='One')]
+    store.apply_delta('sub', configs)
+    assert store.apply_delta('sub', [link('a', name='One')]) == ([], [], [])
+
+
+def test_duplicate_names_are_kept_apart(store):
+    added, _, _ = store.apply_delta('sub', [link('a'), link('b')])
+    assert len(added) == 2
+    assert sorted(config['node_key'] for config in added)[1].endswith('#2')
+
+
+def test_change_into_a_link_owned_elsewhere_is_a_removal(store):
+    store.apply_delta('other', [link('shared', host='198.51.100.9', name='X')])
+    old = link('mine', host='198.51.100.9', name='X')
+    store.apply_delta('sub', [old])
+
+    added, removed, changed = store.apply_delta('sub', [link('shared', host='198.51.100.9', name='X')])
+    # The old row is deleted and the new link stays with 'other': callers must drop old
+    assert added == [] and changed == []
+    assert hashes(removed) == [old['hash']]
+    assert stored(store, 'sub') == []
+    assert stored(store, 'other') == hashes([link('shared', host='198.51.100.9', name='X')])
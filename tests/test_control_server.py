@@ -0,0 +1,120 @@
+"""ControlServer socket handling: stale sockets, live instances, permissions"""
+import json
+import os
+import socket
+import stat
+import time
+
+import pytest
+
+from main import ControlClient, ControlServer, ensure_private_dir
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'control.sock')
+
+
+def test_socket_is_created_private(path):
+    umask = os.umask(0o022)
+    os.umask(umask)
+    server = ControlServer(path).start()
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) & 0o077 == 0
+        assert os.listdir(os.path.dirname(path)) == ['control.sock']      # staging dir is gone
+        assert os.umask(umask) == umask                                     # process umask untouched
+        client = ControlClient(path, timeout=5)
+        assert client.call('ping') == 'pong'
+        client.close()
+    finally:
+        server.stop()
+    assert not os.path.exists(path)
+
+
+def test_stale_socket_is_replaced(path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()                       # bound, never listening: connect is refused
+    server = ControlServer(path).start()
+    try:
+        client = ControlClient(path, timeout=5)
+        assert client.call('ping') == 'pong'
+        client.close()
+    finally:
+        server.stop()
+
+
+def test_refuses_to_take_over_a_live_socket(path):
+    first = ControlServer(path).start()
+    try:
+        second = ControlServer(path)
+        with pytest.raises(RuntimeError, match='listening'):
+            second.start()
+        second.stop()
+        # The first instance keeps its socket and still answers
+        client = ControlClient(path, timeout=5)
+        assert client.call('ping') == 'pong'
+        client.close()
+    finally:
+        first.stop()
+
+
+def test_refuses_to_remove_something_that_is_not_a_socket(path):
+    with open(path, 'w') as f:
+        f.write('keep me')
+    server = ControlServer(path)
+    with pytest.raises(RuntimeError, match='not a socket'):
+        server.start()
+    server.stop()
+    with open(path) as f:
+        assert f.read() == 'keep me'
+
+
+def test_private_dir_is_created_0700_and_checked(tmp_path):
+    directory = str(tmp_path / 'run')
+    ensure_private_dir(directory)
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    ensure_private_dir(directory)       # existing and ours: fine
+
+    os.chmod(directory, 0o755)
+    with pytest.raises(PermissionError):
+        ensure_private_dir(directory)
+    target = tmp_path / 'elsewhere'
+    target.mkdir(mode=0o700)
+    link = str(tmp_path / 'link')
+    os.symlink(target, link)
+    with pytest.raises(PermissionError):
+        ensure_private_dir(link)
+
+
+def test_event_burst_never_drops_a_reply(path):
+    server = ControlServer(path).start()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(10)
+    try:
+        sock.connect(path)
+        sock.sendall(b'{"jsonrpc": "2.0", "id": 1, "method": "subscribe", "params": {}}\n')
+        time.sleep(0.1)
+        # A few large events fill the socket buffers and stall the sender
+        # while the client reads nothing; the backlog is still short
+        for _ in range(10):
+            server.publish('big', padding='x' * (256 << 10))
+        time.sleep(0.3)
+        sock.sendall(b'{"jsonrpc": "2.0", "id": 2, "method": "ping"}\n')
+        time.sleep(0.2)
+        # Now more events than the backlog holds arrive behind the queued reply
+        for _ in range(ControlServer.QUEUE_SIZE * 2):
+            server.publish('small')
+        time.sleep(0.3)
+
+        reader = sock.makefile('rb')
+        replies = {}
+        while 2 not in replies:
+            message = json.loads(reader.readline())
+            if 'id' in message:
+                replies[message['id']] = message.get('result')
+        assert replies == {1: True, 2: 'pong'}
+        assert server.stats['dropped'] > 0
+    finally:
+        sock.close()
+        server.stop()
@@ -0,0 +1,74 @@
+"""DNSCache lookups with a fake dnspython resolver"""
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from main import DNSCache
+
+pytestmark = pytest.mark.skipif(not main.DNSPYTHON_AVAILABLE, reason="dnspython not installed")
+
+
+class Answer(list):
+    def __init__(self, addresses, ttl):
+        super().__init__(SimpleNamespace(to_text=lambda a=a: a) for a in addresses)
+        self.rrset = SimpleNamespace(ttl=ttl)
+
+
+class FakeResolver:
+    def __init__(self, answers, delay=0.0):
+        self.answers = answers      # rdtype -> Answer or an exception to raise
+        self.delay = delay
+        self.calls = []
+
+    def resolve(self, host, rdtype):
+        self.calls.append(rdtype)
+        time.sleep(self.delay)
+        answer = self.answers.get(rdtype, main.dns.resolver.NoAnswer())
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def make_cache(answers, delay=0.0):
+    cache = DNSCache()
+    cache.resolver = FakeResolver(answers, delay)
+    return cache, cache.resolver
+
+
+def test_aaaa_timeout_keeps_a_answer():
+    cache, _ = make_cache({'A': Answer(['198.51.100.7'], 60), 'AAAA': main.dns.exception.Timeout()})
+    assert cache.resolve('server.example') == ['198.51.100.7']
+    assert cache.stats()['errors'] == 0
+
+
+def test_no_nameservers_on_a_keeps_aaaa_answer():
+    cache, _ = make_cache({'A': main.dns.resolver.NoNameservers(), 'AAAA': Answer(['2001:db8::7'], 30)})
+    assert cache.resolve('server.example') == ['2001:db8::7']
+    assert cache.cache['server.example'][0] - time.monotonic() <= 30
+
+
+def test_families_are_queried_in_parallel():
+    cache, resolver = make_cache({'A': Answer(['198.51.100.7'], 60), 'AAAA': Answer(['2001:db8::7'], 60)},
+                                 delay=0.2)
+    started = time.monotonic()
+    assert cache.resolve('server.example') == ['198.51.100.7', '2001:db8::7']
+    assert time.monotonic() - started < 0.35
+    assert sorted(resolver.calls) == ['A', 'AAAA']
+
+
+def test_falls_back_to_system_lookup_when_dns_has_nothing():
+    cache, _ = make_cache({'A': main.dns.resolver.NXDOMAIN(), 'AAAA': main.dns.resolver.NXDOMAIN()})
+    # localhost comes from /etc/hosts, which only getaddrinfo consults
+    assert '127.0.0.1' in cache.resolve('localhost')
+
+
+def test_unknown_host_is_negatively_cached():
+    cache, _ = make_cache({'A': main.dns.resolver.NXDOMAIN(), 'AAAA': main.dns.resolver.NXDOMAIN()})
+    with pytest.raises(socket.gaierror):
+        cache.resolve('does-not-exist.invalid')
+    with pytest.raises(socket.gaierror):
+        cache.resolve('does-not-exist.invalid')
+    assert cache.stats()['negative_hits'] == 1
@@ -0,0 +1,65 @@
+"""Split-tunnel domain routing: compiled matcher feeds the rendered rules and follows list changes"""
+import logging
+import os
+from threading import Lock
+
+import pytest
+
+from main import AdvancedVPNClient, DomainMatcher
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache = str(tmp_path / 'domains')
+    compile_ = DomainMatcher.compile.__func__
+    monkeypatch.setattr(DomainMatcher, 'compile', classmethod(lambda cls, rules: compile_(cls, rules, cache)))
+    return cache
+
+
+class Routes:
+    """The client's domain routing methods on a minimal state"""
+
+    domain_routes = AdvancedVPNClient.domain_routes
+    route_for_domain = AdvancedVPNClient.route_for_domain
+    split_tunnel_domains = AdvancedVPNClient.split_tunnel_domains
+
+    def __init__(self, source):
+        self.user_prefs = {'split_tunnel_domains': source}
+        self.domain_routes_cache = None
+        self.domain_lock = Lock()
+        self.logger = logging.getLogger('KingzVPNPro')
+
+
+def test_minimal_rules_drop_shadowed_and_duplicate_domains(cache_dir):
+    rules = {'direct': ['example.com', 'www.example.com', 'full:api.example.com', 'example.com',
+                        'other.org', 'keyword:ads', 'full:other.net']}
+    matcher = DomainMatcher.compile(rules)
+    try:
+        assert matcher.parent_outbound('a.b.example.com') == 'direct'
+        assert matcher.parent_outbound('example.com') is None
+        assert DomainMatcher.to_xray_rules(rules, matcher) == [
+            {'type': 'field', 'outboundTag': 'direct',
+             'domain': ['domain:example.com', 'domain:other.org', 'keyword:ads', 'full:other.net']}]
+        assert len(DomainMatcher.to_xray_rules(rules)[0]['domain']) == 7
+    finally:
+        matcher.close()
+
+
+def test_routes_follow_list_changes(tmp_path, cache_dir):
+    source = tmp_path / 'direct.txt'
+    source.write_text("example.com\n")
+    routes = Routes(str(source))
+    assert routes.route_for_domain('www.example.com') == 'direct'
+    assert routes.route_for_domain('other.org') == 'proxy'
+    first = routes.domain_routes()[0]
+
+    source.write_text("other.org\nsub.other.org\n")
+    os.utime(source, ns=(1, 1))                 # a distinct stamp even within the mtime granularity
+    assert routes.route_for_domain('www.example.com') == 'proxy'
+    assert routes.route_for_domain('other.org') == 'direct'
+    assert first.mm.closed
+    assert routes.domain_routes()[1][0]['domain'] == ['domain:other.org']
+
+    source.unlink()
+    assert routes.domain_routes() == (None, [])
+    assert routes.route_for_domain('other.org') == 'proxy'
@@ -0,0 +1,137 @@
+"""ResourceGovernor driven by a fake sample() and a fake clock"""
+import pytest
+
+from main import ResourceGovernor
+
+
+class FakeMetrics:
+    def __init__(self, **reading):
+        self.reading = dict(cpu_percent=10.0, process_percent=5.0, battery_percent=None,
+                            on_battery=False, metered=False)
+        self.reading.update(reading)
+
+    def set(self, **reading):
+        self.reading.update(reading)
+
+    def sample(self):
+        return dict(self.reading)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def make_governor(metrics, **kwargs):
+    clock = FakeClock()
+    governor = ResourceGovernor(metrics=metrics, clock=clock, sleep=clock.sleep, **kwargs)
+    return governor, clock
+
+
+def test_unconstrained_machine_runs_at_full_factor():
+    governor, _ = make_governor(FakeMetrics())
+    assert governor.update() == 1.0
+    assert governor.level == 'normal' and governor.heavy_ok and governor.reasons == ()
+    assert governor.budget(8) == 8 and governor.stretch(30) == 30
+
+
+def test_busy_machine_caps_factor_and_defers_heavy_work():
+    governor, _ = make_governor(FakeMetrics(cpu_percent=95.0))
+    governor.update()
+    assert governor.factor == ResourceGovernor.BUSY_CEILING
+    assert governor.reasons == ('busy',) and governor.level == 'minimal'
+    assert not governor.heavy_allowed()
+    assert governor.budget(8) == 2 and governor.stretch(30, maximum=60) == 60
+
+
+@pytest.mark.parametrize('battery, ceiling, reason', [
+    (80, ResourceGovernor.BATTERY_CEILING, 'battery'),
+    (10, ResourceGovernor.LOW_BATTERY_CEILING, 'low battery'),
+])
+def test_battery_sets_the_ceiling(battery, ceiling, reason):
+    governor, _ = make_governor(FakeMetrics(on_battery=True, battery_percent=battery))
+    governor.update()
+    assert governor.ceiling == ceiling and governor.factor == ceiling
+    assert governor.reasons == (reason,)
+
+
+def test_metered_link_caps_rate():
+    metrics = FakeMetrics(metered=True)
+    governor, _ = make_governor(metrics, net_cap_bps=1e6, metered_cap_bps=256e3)
+    governor.update()
+    assert governor.rate_bps == 256e3 and 'metered' in governor.reasons
+    metrics.set(metered=False)
+    governor.update()
+    assert governor.rate_bps == 1e6
+
+
+def test_own_cpu_over_cap_decreases_multiplicatively_then_recovers_additively():
+    metrics = FakeMetrics(process_percent=60.0)
+    governor, _ = make_governor(metrics, cpu_cap=15.0)
+    governor.update()
+    assert governor.factor == pytest.approx(0.5)          # halving at most per reading
+    assert governor.reasons == ('cpu cap',)
+    governor.update()
+    assert governor.factor == pytest.approx(0.25)
+
+    metrics.set(process_percent=1.0)
+    factors = [governor.update() for _ in range(3)]
+    assert factors == pytest.approx([0.35, 0.45, 0.55])    # bounded additive increase
+    assert governor.heavy_ok
+
+
+def test_increase_stops_short_of_the_cpu_cap():
+    metrics = FakeMetrics(process_percent=60.0)
+    governor, _ = make_governor(metrics, cpu_cap=15.0)
+    governor.update()                                       # factor 0.5
+    metrics.set(process_percent=14.0)
+    # Headroom 0.5 * (15/14 - 1) is smaller than the usual step
+    assert governor.update() == pytest.approx(0.5 * 15 / 14)
+
+
+def test_on_change_fires_only_when_level_or_reasons_change():
+    metrics = FakeMetrics()
+    governor, _ = make_governor(metrics)
+    seen = []
+    governor.on_change = seen.append
+    governor.update()
+    assert seen == []
+    metrics.set(cpu_percent=95.0)
+    governor.update()
+    governor.update()
+    assert [snapshot['reasons'] for snapshot in seen] == [['busy']]
+    metrics.set(cpu_percent=10.0)
+    governor.update()
+    assert seen[-1]['reasons'] == [] and seen[-1]['level'] == 'reduced'      # 0.25 + one step
+
+
+def test_spend_sleeps_to_hold_the_rate():
+    governor, clock = make_governor(FakeMetrics(), net_cap_bps=8000)     # 1000 bytes/s
+    governor.update()
+    assert governor.spend(500)
+    assert clock.slept == [pytest.approx(0.5)]
+    for _ in range(4):
+        governor.spend(1000)
+    assert clock.now == pytest.approx(4.5)
+    assert governor.snapshot()['spent_bytes'] == 4500
+
+
+def test_spend_is_free_without_a_cap():
+    governor, clock = make_governor(FakeMetrics())
+    governor.update()
+    assert governor.spend(10 ** 9) and clock.slept == []
+
+
+def test_defer_heavy_gives_up_after_max_wait():
+    governor = ResourceGovernor(metrics=FakeMetrics(cpu_percent=95.0), interval=0.01)
+    governor.update()
+    assert governor.defer_heavy(max_wait=0.05) is False
+    assert governor.deferred == 1
@@ -0,0 +1,147 @@
+"""HTTPClient against a local TLS server: keep-alive, resumption, retry budget, per-host exemptions"""
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from requests.exceptions import SSLError
+
+from main import HTTPClient, RetryBudget
+
+pytestmark = pytest.mark.skipif(shutil.which('openssl') is None, reason="needs the openssl CLI")
+
+BODY = b"vless://00000000-0000-0000-0000-000000000000@127.0.0.1:443#test\n"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.hits += 1
+        status, body = (503, b"unavailable") if self.path.startswith('/down') else (200, BODY)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class TLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cert, key):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(cert, key)
+        self.connections = 0
+        self.hits = 0
+
+    def get_request(self):
+        sock, addr = super().get_request()
+        self.connections += 1
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self.context.wrap_socket(sock, server_side=True), addr
+
+
+@pytest.fixture(scope='module')
+def certs(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('certs')
+
+    def openssl(*args):
+        subprocess.run(['openssl', *args], cwd=workdir, check=True, capture_output=True)
+
+    openssl('req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=Test CA',
+            '-keyout', 'ca.key', '-out', 'ca.pem')
+    openssl('req', '-newkey', 'rsa:2048', '-nodes', '-subj', '/CN=localhost',
+            '-keyout', 'server.key', '-out', 'server.csr')
+    (workdir / 'san.ext').write_text("subjectAltName=DNS:localhost\n")
+    openssl('x509', '-req', '-in', 'server.csr', '-CA', 'ca.pem', '-CAkey', 'ca.key', '-CAcreateserial',
+            '-days', '1', '-extfile', 'san.ext', '-out', 'server.pem')
+    return str(workdir / 'ca.pem'), str(workdir / 'server.pem'), str(workdir / 'server.key')
+
+
+@pytest.fixture
+def server(certs):
+    _, cert, key = certs
+    server = TLSServer(cert, key)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def clients():
+    made = []
+
+    def make(**kwargs):
+        client = HTTPClient(**kwargs)
+        made.append(client)
+        return client
+
+    yield make
+    for client in made:
+        client.close()
+
+
+def url(server, path='/sub', host='localhost'):
+    return f"https://{host}:{server.server_address[1]}{path}"
+
+
+def test_keep_alive_reuses_one_connection(server, certs, clients):
+    client = clients(cafile=certs[0])
+    for _ in range(5):
+        response = client.get(url(server))
+        assert response.status_code == 200 and response.content == BODY
+    assert server.connections == 1
+    metrics = client.host_metrics()['localhost']
+    assert metrics['requests'] == 5 and metrics['connections'] == 1 and metrics['reused'] == 4
+    assert metrics['tls_full'] == 1 and metrics['statuses'] == {200: 5}
+
+
+def test_new_connection_resumes_the_tls_session(server, certs, clients):
+    client = clients(cafile=certs[0])
+    client.get(url(server))
+    client.adapter.poolmanager.clear()
+    client.get(url(server))
+    metrics = client.host_metrics()['localhost']
+    assert server.connections == 2
+    assert metrics['tls_full'] == 1 and metrics['tls_resumed'] == 1
+
+
+def test_retry_budget_caps_retries_across_calls(server, certs, clients):
+    client = clients(cafile=certs[0], attempts=3, backoff=0.001, budget=RetryBudget(ratio=0.1, reserve=2))
+    for _ in range(5):
+        assert client.get(url(server, '/down')).status_code == 503
+    # Unbudgeted this would be 5 calls x 3 attempts
+    assert server.hits == 7
+    assert client.host_metrics()['localhost']['retries'] == 2
+
+
+def test_non_idempotent_requests_are_not_retried(server, certs, clients):
+    client = clients(cafile=certs[0], backoff=0.001)
+    assert client.post(url(server, '/down')).status_code == 503
+    assert server.hits == 1 and client.host_metrics()['localhost']['retries'] == 0
+
+
+def test_certificate_errors_are_not_retried(server, clients):
+    client = clients(backoff=0.001)          # system CAs: the test CA is unknown
+    with pytest.raises(SSLError):
+        client.get(url(server))
+    metrics = client.host_metrics()['localhost']
+    assert metrics['retries'] == 0 and metrics['failures'] == 1
+    assert server.connections == 1
+
+
+def test_insecure_exemption_is_per_host(server, clients):
+    client = clients(backoff=0.001, attempts=1, insecure_hosts=('localhost',))
+    assert client.get(url(server)).content == BODY
+    with pytest.raises(SSLError):
+        client.get(url(server, host='127.0.0.1'))
@@ -0,0 +1,58 @@
+"""KillSwitch compilation: resolver allow-list and endpoint sets"""
+from types import SimpleNamespace
+from threading import Lock
+
+import pytest
+
+from main import AdvancedVPNClient, KillSwitch
+
+
+def test_system_resolvers_skips_loopback_and_duplicates(tmp_path):
+    stub = tmp_path / 'stub.conf'
+    stub.write_text("nameserver 127.0.0.53\noptions edns0\n")
+    upstream = tmp_path / 'upstream.conf'
+    upstream.write_text("# comment\nnameserver 192.0.2.53\nnameserver fe80::1%eth0\nnameserver 192.0.2.53\n")
+    assert KillSwitch.system_resolvers((str(stub), str(upstream), str(tmp_path / 'missing'))) == \
+        ['192.0.2.53', 'fe80::1']
+
+
+def test_compile_allows_dns_to_resolvers():
+    switch = KillSwitch(dry_run=True, resolvers=['192.0.2.53', '2001:db8::53'])
+    script = switch.compile([('198.51.100.1', 'tcp', 443)])
+    assert '198.51.100.1 . tcp . 443' in script
+    for element in ('192.0.2.53 . udp . 53', '192.0.2.53 . tcp . 53', '2001:db8::53 . udp . 53'):
+        assert element in script
+
+
+def test_update_endpoints_keeps_resolvers():
+    switch = KillSwitch(dry_run=True, resolvers=['192.0.2.53'])
+    switch.enable([('198.51.100.1', 'tcp', 443)])
+    script = switch.update_endpoints([('198.51.100.2', 'udp', 8443)])
+    assert '198.51.100.2 . udp . 8443' in script
+    assert '192.0.2.53 . udp . 53' in script
+    assert '198.51.100.1' not in script
+
+
+def test_compile_rejects_hostnames():
+    with pytest.raises(ValueError):
+        KillSwitch(dry_run=True, resolvers=[]).compile([('example.com', 'tcp', 443)])
+
+
+def test_endpoints_keep_last_good_addresses():
+    answers = {'a.example': ['198.51.100.1'], 'b.example': ['198.51.100.2']}
+    client = SimpleNamespace(
+        configs=[{'address': 'a.example', 'port': 443, 'protocol': 'vless'},
+                 {'address': 'b.example', 'port': 443, 'protocol': 'hysteria2'}],
+        configs_lock=Lock(),
+        dns_cache=SimpleNamespace(resolve_many=lambda hosts: {host: answers.get(host) for host in hosts}),
+        kill_switch_addresses={},
+    )
+    endpoints = AdvancedVPNClient.kill_switch_endpoints
+    assert endpoints(client) == [('198.51.100.1', 'tcp', 443), ('198.51.100.2', 'udp', 443)]
+
+    answers['a.example'] = None             # re-resolution failed or negatively cached
+    assert ('198.51.100.1', 'tcp', 443) in endpoints(client)
+
+    client.configs = client.configs[1:]     # server removed: its addresses are forgotten
+    assert endpoints(client) == [('198.51.100.2', 'udp', 443)]
+    assert 'a.example' not in client.kill_switch_addresses
@@ -0,0 +1,46 @@
+"""AutoConnectRuleEngine: incremental evaluation and edge-triggered firing"""
+import pytest
+
+from main import AutoConnectRuleEngine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = AutoConnectRuleEngine(str(tmp_path / 'rules.db'))
+    yield engine
+    engine.close()
+
+
+def test_switch_between_listed_ssids_does_not_refire(engine):
+    engine.add_rule('trusted', {'ssid': ['Home', 'Office']}, action='disconnect')
+    assert engine.update(ssid='Home').name == 'trusted'
+    assert engine.update(ssid='Office') is None
+    assert engine.update(ssid='Cafe') is None
+    assert engine.update(ssid='Office').name == 'trusted'
+
+
+def test_fires_only_when_all_conditions_hold(engine):
+    engine.add_rule('wifi at home', {'ssid': ['Home'], 'interface': ['wlan*']})
+    assert engine.update(ssid='Home', interface='eth0') is None
+    assert engine.update(interface='wlan0').name == 'wifi at home'
+    assert engine.update(interface='wlan1') is None
+
+
+def test_latency_thresholds_fire_on_crossing(engine):
+    engine.add_rule('slow', {'latency_above': 250}, action='switch')
+    assert engine.update(latency=100) is None
+    assert engine.update(latency=300).name == 'slow'
+    assert engine.update(latency=400) is None
+    assert engine.update(latency=100) is None
+    assert engine.update(latency=260).name == 'slow'
+
+
+def test_highest_priority_rule_wins(engine):
+    engine.add_rule('low', {'ssid': ['Cafe*']}, priority=1)
+    engine.add_rule('high', {'ssid': ['Cafe']}, action='switch', priority=5)
+    assert engine.update(ssid='Cafe').name == 'high'
+
+
+def test_unknown_condition_is_rejected(engine):
+    with pytest.raises(ValueError):
+        engine.add_rule('dest', {'destination': ['youtube.com']})
@@ -0,0 +1,73 @@
+"""ServerSearchIndex: incremental narrowing, tags and removal"""
+from main import ServerSearchIndex
+
+
+def names(index, query):
+    return sorted(entry['name'] for entry in index.first_page(query))
+
+
+def make_index():
+    index = ServerSearchIndex()
+    index.add('a', {'name': 'USA Node 1', 'country': 'USA', 'tags': ['premium']})
+    index.add('b', {'name': 'USA Node 2', 'country': 'USA', 'tags': ['free']})
+    index.add('c', {'name': 'Germany Node 3', 'country': 'Germany', 'tags': ['premium']})
+    return index
+
+
+def test_tag_narrows_previous_result():
+    index = make_index()
+    assert names(index, 'us') == ['USA Node 1', 'USA Node 2']
+    assert names(index, 'us #premium') == ['USA Node 1']
+    assert names(index, 'us #premium node') == ['USA Node 1']
+
+
+def test_tag_prefix_does_not_stick_while_typing():
+    index = make_index()
+    assert names(index, '#prem') == []
+    assert names(index, '#premium') == ['Germany Node 3', 'USA Node 1']
+    assert names(index, 'tag:free') == ['USA Node 2']
+
+
+def test_text_narrowing_matches_fresh_search():
+    index = make_index()
+    names(index, 'node')
+    narrowed = names(index, 'node 3')
+    index._last_query = None
+    assert narrowed == names(index, 'node 3') == ['Germany Node 3']
+
+
+def test_remove_drops_explicit_tags():
+    index = ServerSearchIndex()
+    index.add('x', {'name': 'Zed', 'tags': ['entry-tag']}, tags=['zz'])
+    assert names(index, '#zz') == ['Zed']
+    assert names(index, '#entry-tag') == []
+    assert index.remove('x')
+    assert 'zz' not in index.tags
+    assert not index.doc_tags and not index.trigrams and not index.prefixes
+
+
+def test_replace_reindexes_tags():
+    index = make_index()
+    index.add('a', {'name': 'USA Node 1', 'country': 'USA', 'tags': ['free']})
+    assert names(index, '#premium') == ['Germany Node 3']
+    assert names(index, '#free') == ['USA Node 1', 'USA Node 2']
+
+
+def test_typing_char_by_char_matches_fresh_search():
+    entries = [
+        {'name': 'Frankfurt Premium', 'country': 'Germany', 'tags': ['premium']},
+        {'name': 'Amsterdam 1', 'country': 'Netherlands', 'tags': ['free']},
+        {'name': 'Stockholm', 'country': 'Sweden', 'tags': ['free']},
+        {'name': 'Furth', 'country': 'Germany', 'tags': []},
+    ]
+    typed = ServerSearchIndex()
+    for i, entry in enumerate(entries):
+        typed.add(i, entry)
+    for query in ('fur', 'ste', 'frankfurt prem', 'ger fur', 'st #free', 'tag:free am'):
+        for end in range(1, len(query) + 1):
+            fresh = ServerSearchIndex()
+            for i, entry in enumerate(entries):
+                fresh.add(i, entry)
+            assert names(typed, query[:end]) == names(fresh, query[:end]), query[:end]
+        typed._last_query = None
+    assert names(typed, 'f') and names(typed, 'fu') and names(typed, 'fur') == ['Frankfurt Premium', 'Furth']
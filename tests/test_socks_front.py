@@ -0,0 +1,99 @@
+"""SocksFront: fixed front port relaying to a switchable backend"""
+import socket
+import threading
+
+import pytest
+
+from main import SocksFront
+
+
+def echo_server(tag):
+    """Backend that answers every line with tag + line"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+
+    def serve(conn):
+        with conn:
+            for line in conn.makefile('rb'):
+                conn.sendall(tag + line)
+
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def ask(port, line=b'ping\n'):
+    with socket.create_connection(('127.0.0.1', port), timeout=2) as sock:
+        sock.sendall(line)
+        return sock.makefile('rb').readline()
+
+
+@pytest.fixture
+def front():
+    front = SocksFront(free_port()).start()
+    yield front
+    front.stop()
+
+
+def test_retarget_keeps_the_front_port(front):
+    first, second = echo_server(b'a:'), echo_server(b'b:')
+    try:
+        front.retarget(first.getsockname()[1])
+        assert ask(front.port) == b'a:ping\n'
+        assert front.retarget(second.getsockname()[1]) == first.getsockname()[1]
+        assert ask(front.port) == b'b:ping\n'
+        assert front.stats['connections'] == 2
+    finally:
+        first.close()
+        second.close()
+
+
+def test_open_connection_stays_on_its_backend(front):
+    first, second = echo_server(b'a:'), echo_server(b'b:')
+    try:
+        front.retarget(first.getsockname()[1])
+        with socket.create_connection(('127.0.0.1', front.port), timeout=2) as sock:
+            reader = sock.makefile('rb')
+            sock.sendall(b'one\n')
+            assert reader.readline() == b'a:one\n'
+            front.retarget(second.getsockname()[1])
+            sock.sendall(b'two\n')
+            assert reader.readline() == b'a:two\n'
+    finally:
+        first.close()
+        second.close()
+
+
+def closed_at_once(port):
+    with socket.create_connection(('127.0.0.1', port), timeout=2) as sock:
+        try:
+            return sock.recv(1) == b''
+        except ConnectionResetError:
+            return True
+
+
+def test_no_backend_refuses(front):
+    front.retarget(None)
+    assert closed_at_once(front.port)
+    front.retarget(free_port())             # nothing listening there
+    assert closed_at_once(front.port)
+    assert front.stats['refused'] == 2
+
+
+def test_port_in_use_fails_to_start(front):
+    with pytest.raises(RuntimeError):
+        SocksFront(front.port).start()
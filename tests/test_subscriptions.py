@@ -0,0 +1,118 @@
+"""SubscriptionUpdater against a local HTTP server: conditional requests, deltas and error backoff"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event
+
+import pytest
+
+from main import ConfigStore, HTTPClient, SubscriptionUpdater
+
+ONE = "vless://00000000-0000-0000-0000-000000000001@198.51.100.1:443?type=tcp#One"
+TWO = "vless://00000000-0000-0000-0000-000000000002@198.51.100.2:443?type=tcp#Two"
+TWO_NEW = "vless://00000000-0000-0000-0000-00000000000f@198.51.100.2:443?type=tcp#Two"
+THREE = "trojan://secret@198.51.100.3:443#Three"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.status != 200:
+            status, body, headers = server.status, b"broken", {}
+        elif self.headers.get('If-None-Match') == server.etag:
+            status, body, headers = 304, b"", {'ETag': server.etag}
+        else:
+            status, body, headers = 200, server.payload.encode(), {'ETag': server.etag}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.requests = []
+    server.status = 200
+    server.etag = '"v1"'
+    server.payload = f"{ONE}\n{TWO}\n"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def updater(tmp_path):
+    store = ConfigStore(str(tmp_path / 'configs.db'))
+    deltas, errors = [], []
+    session = HTTPClient(timeout=5, attempts=1)
+    updater = SubscriptionUpdater(store, Event(), on_delta=lambda *delta: deltas.append(delta),
+                                  on_error=lambda url, e: errors.append(url), session=session)
+    updater.deltas, updater.errors = deltas, errors
+    yield updater
+    session.close()
+    store.conn.close()
+
+
+def names(configs):
+    return sorted(config['name'] for config in configs)
+
+
+def subscribe(updater, server, interval=3600):
+    url = f"http://127.0.0.1:{server.server_address[1]}/sub"
+    updater.add(url, interval=interval, refresh_now=False)
+    return updater.subs[url]
+
+
+def test_etag_makes_unchanged_refreshes_free(server, updater):
+    sub = subscribe(updater, server)
+    delay = updater.refresh(sub)
+    assert 0.9 * 3600 <= delay <= 1.1 * 3600
+    (url, added, removed, changed), = updater.deltas
+    assert names(added) == ['One', 'Two'] and removed == [] and changed == []
+    assert sub['etag'] == '"v1"'
+
+    updater.refresh(sub)
+    assert server.requests[-1].get('If-None-Match') == '"v1"'
+    assert len(updater.deltas) == 1 and sub['failures'] == 0
+
+
+def test_changed_payload_applies_only_the_delta(server, updater):
+    sub = subscribe(updater, server)
+    updater.refresh(sub)
+    server.payload, server.etag = f"{ONE}\n{TWO_NEW}\n{THREE}\n", '"v2"'
+    updater.refresh(sub)
+    _, added, removed, changed = updater.deltas[-1]
+    assert names(added) == ['Three'] and removed == []
+    assert [(old['uri'], new['uri']) for old, new in changed] == [(TWO, TWO_NEW)]
+    assert sub['etag'] == '"v2"'
+
+    # Same bytes under a new ETag: fetched, but no delta
+    server.etag = '"v3"'
+    updater.refresh(sub)
+    assert len(updater.deltas) == 2
+
+
+def test_errors_back_off_exponentially_up_to_the_interval(server, updater):
+    sub = subscribe(updater, server, interval=100)
+    server.status = 500
+    delays = [updater.refresh(sub) for _ in range(4)]
+    base = SubscriptionUpdater.BACKOFF_BASE
+    for delay, expected in zip(delays, (base, 2 * base, 100, 100)):
+        assert 0.9 * expected <= delay <= 1.1 * expected
+    assert sub['failures'] == 4 and len(updater.errors) == 4 and updater.deltas == []
+
+    server.status = 200
+    updater.refresh(sub)
+    assert sub['failures'] == 0 and len(updater.deltas) == 1
+    saved = {s['url']: s for s in updater.store.subscriptions()}[sub['url']]
+    assert saved['failures'] == 0 and saved['etag'] == '"v1"'
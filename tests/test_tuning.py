@@ -0,0 +1,91 @@
+"""TunnelTuner grid: packet sizes account for encapsulation, and every point renders differently"""
+import json
+
+from main import TunnelTuner, ir_from_link, ir_from_ovpn, parse_config_link, render_ir
+
+OVPN = "client\ndev tun\nproto udp\nremote 198.51.100.1 1194\ntun-mtu 1500\nmssfix 1450\n"
+VLESS = "vless://id@198.51.100.1:443?type=tcp#Tuned"
+
+
+def tuner(fmt):
+    return TunnelTuner(command=[], converter=None, store=None, tunnel_format=fmt)
+
+
+def test_xray_grid_fits_outer_tcp_and_renders_distinct_configs():
+    config = parse_config_link(VLESS)
+    grid = list(tuner('xray').grid(1400, config))
+    assert len(grid) == 4
+    for params in grid:
+        assert set(params) == {'format', 'mssfix', 'sndbuf', 'rcvbuf'}
+        assert params['mssfix'] == 0 or params['mssfix'] + 20 + 20 <= 1400
+    rendered = {render_ir(ir_from_link(VLESS), 'xray', tuning=params) for params in grid}
+    assert len(rendered) == len(grid)
+
+
+def test_xray_buffers_are_socket_buffers_not_a_window_clamp():
+    tuning = {'format': 'xray', 'mssfix': 1360, 'sndbuf': 524288, 'rcvbuf': 524288}
+    outbound = json.loads(render_ir(ir_from_link(VLESS), 'xray', tuning=tuning))['outbounds'][0]
+    sockopt = outbound['streamSettings']['sockopt']
+    assert sockopt['tcpMaxSeg'] == 1360 and 'tcpWindowClamp' not in sockopt
+    # setsockopt(SOL_SOCKET, SO_SNDBUF / SO_RCVBUF) on Linux
+    assert {(o['level'], o['opt'], o['value']) for o in sockopt['customSockopt']} == \
+        {('1', '7', '524288'), ('1', '8', '524288')}
+
+
+def test_xray_kcp_grid_sizes_the_kcp_mtu_from_the_path():
+    link = "vless://id@198.51.100.1:443?type=kcp#Kcp"
+    grid = list(tuner('xray').grid(1400, parse_config_link(link)))
+    assert {params['kcp_mtu'] for params in grid} == {1350, 1400 - 20 - 8}
+    assert len(grid) == 4
+    stream = json.loads(render_ir(ir_from_link(link), 'xray', tuning=grid[-1]))['outbounds'][0]['streamSettings']
+    assert stream['kcpSettings']['mtu'] == grid[-1]['kcp_mtu']
+    # A narrow path never gets a larger KCP mtu than it carries
+    assert {params['kcp_mtu'] for params in tuner('xray').grid(1300, parse_config_link(link))} == {1300 - 28}
+
+
+def test_singbox_tuic_grid_tries_congestion_controllers():
+    link = "tuic://00000000-0000-0000-0000-000000000000:pw@198.51.100.1:443#Tuic"
+    grid = list(tuner('sing-box').grid(1400, parse_config_link(link)))
+    assert [params['congestion'] for params in grid] == list(TunnelTuner.TUIC_CONGESTION)
+    outbound = json.loads(render_ir(ir_from_link(link), 'sing-box', tuning=grid[1]))['outbounds'][0]
+    assert outbound['congestion_control'] == 'cubic'
+
+
+def test_xray_grid_uses_ipv6_header():
+    grid = list(tuner('xray').grid(1400, parse_config_link(VLESS), ip_version=6))
+    assert max(params['mssfix'] for params in grid) == 1400 - 40 - 20
+
+
+def test_openvpn_grid_leaves_room_for_encapsulation():
+    config = {'name': 'ovpn', 'ovpn': OVPN}
+    grid = list(tuner('ovpn').grid(1400, config))
+    fitted = [params for params in grid if params['tun_mtu'] != TunnelTuner.OPENVPN_DEFAULT_MTU]
+    assert fitted
+    for params in fitted:
+        # inner packet + OpenVPN header + UDP + IPv4 must fit the path
+        assert params['tun_mtu'] + TunnelTuner.OPENVPN_HEADER + 8 + 20 <= 1400
+    for params in grid:
+        assert params['mssfix'] in (0, 1400 - 20 - 8)
+    rendered = {render_ir(ir_from_ovpn(OVPN, 'ovpn'), 'ovpn', tuning=params) for params in grid}
+    assert len(rendered) == len(grid)
+
+
+def test_openvpn_over_tcp_only_tunes_buffers():
+    config = {'name': 'ovpn', 'ovpn': OVPN.replace('proto udp', 'proto tcp-client')}
+    grid = list(tuner('ovpn').grid(1400, config))
+    assert grid and all(set(params) == {'format', 'sndbuf', 'rcvbuf'} for params in grid)
+
+
+def test_nothing_to_tune_for_singbox_tcp_or_other_udp_transports():
+    assert list(tuner('sing-box').grid(1400, parse_config_link(VLESS))) == []
+    hysteria = parse_config_link("hysteria2://pw@198.51.100.1:443#udp")
+    assert list(tuner('xray').grid(1400, hysteria)) == []
+    assert list(tuner('sing-box').grid(1400, hysteria)) == []
+
+
+def test_render_ignores_tuning_for_another_format():
+    tuning = {'format': 'ovpn', 'tun_mtu': 1300, 'mssfix': 1372, 'sndbuf': 0, 'rcvbuf': 0}
+    outbound = json.loads(render_ir(ir_from_link(VLESS), 'xray', tuning=tuning))['outbounds'][0]
+    assert 'sockopt' not in outbound.get('streamSettings', {})
+    text = render_ir(ir_from_ovpn(OVPN, 'ovpn'), 'ovpn', tuning=tuning)
+    assert 'tun-mtu 1300' in text and 'tun-mtu 1500' not in text and 'mssfix 1372' in text
@@ -0,0 +1,57 @@
+"""UDPProbeEngine: loss is only reported when the echo service answers"""
+import socket
+
+import pytest
+
+from main import UDPEchoServer, UDPProbeEngine
+
+
+class DroppingEcho(UDPEchoServer):
+    """Echoes every other packet"""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = 0
+
+    def reply(self, data, addr):
+        self.seen += 1
+        if self.seen % 2:
+            super().reply(data, addr)
+
+
+def engine():
+    return UDPProbeEngine(count=10, interval=0.005, timeout=0.3)
+
+
+def test_echo_measures_rtt_without_loss():
+    echo = UDPEchoServer().start()
+    try:
+        result = engine().probe('127.0.0.1', echo.port)
+    finally:
+        echo.stop()
+    assert result['error'] is None and result['loss'] == 0 and result['received'] == 10
+    assert result['rtt_ms'] is not None
+
+
+def test_partial_replies_are_loss():
+    echo = DroppingEcho().start()
+    try:
+        result = engine().probe('127.0.0.1', echo.port)
+    finally:
+        echo.stop()
+    assert result['error'] is None and result['loss'] == pytest.approx(0.5)
+
+
+def test_silently_dropped_train_is_no_echo_service():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sink:
+        sink.bind(('127.0.0.1', 0))            # bound, never replies, no ICMP either
+        result = engine().probe('127.0.0.1', sink.getsockname()[1])
+    assert result['received'] == 0
+    assert result['error'] == "no echo service"
+
+
+def test_refused_train_is_no_echo_service():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]           # closed again below: ICMP port unreachable
+    assert engine().probe('127.0.0.1', port)['error'] == "no echo service"
@@ -0,0 +1,142 @@
+"""HealthWatchdog failover behaviour with fake liveness and probes"""
+import time
+from threading import Event
+
+from main import HealthWatchdog
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def make_watchdog(on_failure, is_alive=lambda: True, probe=lambda: 10.0):
+    return HealthWatchdog(Event(), probe=probe, on_failure=on_failure, is_alive=is_alive,
+                          counters=lambda: (0, 0), tick=0.01, min_interval=0.01, max_interval=0.05)
+
+
+def test_failed_failover_disarms_instead_of_looping():
+    calls = []
+    watchdog = make_watchdog(on_failure=lambda reason: calls.append(reason) or False, is_alive=lambda: False)
+    watchdog.start()
+    try:
+        assert wait_for(lambda: calls)
+        time.sleep(0.3)                     # ~30 ticks with the tunnel still dead
+        assert calls == ["tunnel process exited"]
+        assert not watchdog.armed
+        assert watchdog.stats['failed_failovers'] == 1
+    finally:
+        watchdog.stop()
+
+
+def test_raising_failover_counts_as_failed():
+    calls = []
+
+    def on_failure(reason):
+        calls.append(reason)
+        raise RuntimeError("no servers")
+
+    watchdog = make_watchdog(on_failure=on_failure, is_alive=lambda: False)
+    watchdog.start()
+    try:
+        assert wait_for(lambda: calls)
+        time.sleep(0.2)
+        assert len(calls) == 1 and not watchdog.armed
+    finally:
+        watchdog.stop()
+
+
+def test_start_rearms_after_failed_failover():
+    calls = []
+    watchdog = make_watchdog(on_failure=lambda reason: calls.append(reason) or False, is_alive=lambda: False)
+    watchdog.start()
+    try:
+        assert wait_for(lambda: not watchdog.armed)
+        watchdog.start()                    # next successful connect
+        assert wait_for(lambda: len(calls) == 2)
+        time.sleep(0.2)
+        assert len(calls) == 2
+    finally:
+        watchdog.stop()
+
+
+def test_successful_failover_stays_armed():
+    alive = {'value': False}
+    calls = []
+
+    def on_failure(reason):
+        calls.append(reason)
+        alive['value'] = True
+        return True
+
+    watchdog = make_watchdog(on_failure=on_failure, is_alive=lambda: alive['value'])
+    watchdog.start()
+    try:
+        assert wait_for(lambda: calls)
+        assert watchdog.armed
+        alive['value'] = False              # the new tunnel dies too
+        assert wait_for(lambda: len(calls) == 2)
+    finally:
+        watchdog.stop()
+
+
+def test_probe_failures_trigger_failover_after_threshold():
+    calls = []
+
+    def probe():
+        raise ConnectionError("SOCKS connect failed")
+
+    watchdog = make_watchdog(on_failure=lambda reason: calls.append(reason) or False, probe=probe)
+    watchdog.start()
+    try:
+        assert wait_for(lambda: calls)
+        assert calls[0].startswith("probe failed")
+        assert watchdog.stats['probe_failures'] >= watchdog.failure_threshold
+    finally:
+        watchdog.stop()
+
+
+def test_start_right_after_stop_keeps_a_thread_running():
+    alive = {'value': True}
+    calls = []
+    watchdog = HealthWatchdog(Event(), probe=lambda: 10.0, on_failure=lambda reason: calls.append(reason) or False,
+                              is_alive=lambda: alive['value'], counters=lambda: (0, 0),
+                              tick=0.2, min_interval=0.01, max_interval=0.05)
+    watchdog.start()
+    try:
+        time.sleep(0.05)                    # the old thread is now inside wait(tick)
+        watchdog.stop()                     # disconnect ...
+        watchdog.start()                    # ... and reconnect before it wakes
+        time.sleep(0.3)
+        assert watchdog.thread.is_alive()
+        alive['value'] = False
+        assert wait_for(lambda: calls)
+    finally:
+        watchdog.stop()
+
+
+def test_failover_reconnect_from_the_loop_keeps_one_thread():
+    alive = {'value': False}
+    calls = []
+    threads = set()
+
+    def on_failure(reason):
+        calls.append(reason)
+        threads.add(watchdog.thread)
+        watchdog.start()                    # connect_config re-arms from inside the loop
+        alive['value'] = True
+        return True
+
+    watchdog = make_watchdog(on_failure=on_failure, is_alive=lambda: alive['value'])
+    watchdog.start()
+    try:
+        assert wait_for(lambda: calls)
+        alive['value'] = False
+        assert wait_for(lambda: len(calls) == 2)
+        assert len(threads) == 1 and watchdog.thread.is_alive()
+    finally:
+        watchdog.stop()
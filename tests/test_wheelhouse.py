@@ -0,0 +1,63 @@
+"""DependencyManager wheelhouse: a rebuild locks exactly the resolved closure"""
+import glob
+import os
+import shutil
+import sys
+
+import pytest
+
+from main import DependencyManager
+
+BUNDLED = sorted(glob.glob(os.path.join(os.path.dirname(os.__file__), '**', '*.whl'), recursive=True)
+                 + glob.glob(os.path.join(sys.base_prefix, '**', '_bundled', '*.whl'), recursive=True))
+SETUPTOOLS = [path for path in BUNDLED if os.path.basename(path).startswith('setuptools-')]
+
+pytestmark = pytest.mark.skipif(not SETUPTOOLS, reason="needs a bundled setuptools wheel")
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """A local package index (find-links directory); pip never touches the network"""
+    index = tmp_path / 'index'
+    index.mkdir()
+    monkeypatch.setenv('PIP_NO_INDEX', '1')
+    monkeypatch.setenv('PIP_FIND_LINKS', str(index))
+    return index
+
+
+def manager(tmp_path):
+    deps = DependencyManager()
+    deps.wheelhouse = str(tmp_path / 'wheelhouse')
+    deps.required_packages = {'setuptools': 'setuptools'}
+    deps.get_install_command = lambda: [sys.executable, '-m', 'pip']
+    return deps
+
+
+def test_rebuild_drops_stale_wheels_from_the_lock(tmp_path, index):
+    current = SETUPTOOLS[-1]
+    shutil.copy(current, index)
+    deps = manager(tmp_path)
+    os.makedirs(deps.wheelhouse)
+    # A previous build left an older version behind
+    stale = os.path.join(deps.wheelhouse, 'setuptools-1.0.0-py3-none-any.whl')
+    shutil.copy(current, stale)
+
+    ok, failures = deps.build_wheelhouse()
+    assert ok and failures == []
+    assert sorted(os.listdir(deps.wheelhouse)) == sorted([os.path.basename(current), 'requirements.lock'])
+    locked = deps.read_wheelhouse_lock()
+    assert [(name, version) for name, version, _, _ in locked] == \
+        [('setuptools', os.path.basename(current).split('-')[1])]
+    assert deps.verify_wheelhouse() == []
+
+
+def test_failed_build_leaves_the_wheelhouse_alone(tmp_path, index):
+    deps = manager(tmp_path)
+    deps.required_packages = {'no-such-package-kingzvpn': 'x'}
+    os.makedirs(deps.wheelhouse)
+    kept = os.path.join(deps.wheelhouse, os.path.basename(SETUPTOOLS[-1]))
+    shutil.copy(SETUPTOOLS[-1], kept)
+
+    ok, failures = deps.build_wheelhouse()
+    assert not ok and failures[0][0] == 'no-such-package-kingzvpn'
+    assert os.listdir(deps.wheelhouse) == [os.path.basename(kept)]       # no staging left either